@@ -0,0 +1,35 @@
+import argparse, time
+from login import LoginCredential
+
+'''Benchmark for batch account creation: hashes the same batch of passwords with
+LoginCredential.hash_passwords at different worker counts and prints accounts/second.
+
+    python bench_hashing.py --accounts 2000 --workers 1,2,4,8
+    python bench_hashing.py --processes --iters 100000'''
+
+def run(accounts, worker_counts, iters, use_processes):
+    passwords = [f"pw{i}" for i in range(accounts)]
+    lc = LoginCredential("login.csv", iters=iters)
+    pool = "processes" if use_processes else "threads"
+    print(f"=== PBKDF2 batch hashing ({accounts} accounts, {iters} iterations, {pool}) ===")
+    results = []
+    base = None
+    for workers in worker_counts:
+        t0 = time.perf_counter()
+        hashes = lc.hash_passwords(passwords, workers=workers, use_processes=use_processes)
+        t1 = time.perf_counter()
+        assert len(hashes) == accounts
+        rate = accounts / (t1 - t0)
+        base = base or rate
+        results.append((workers, rate))
+        print(f"workers={workers:<3} {rate:10.1f} accounts/s  (x{rate / base:.2f})")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="accounts/second against worker count")
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated worker counts")
+    parser.add_argument("--iters", type=int, default=1000)
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    args = parser.parse_args()
+    run(args.accounts, [int(w) for w in args.workers.split(",")], args.iters, args.processes)
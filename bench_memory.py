@@ -0,0 +1,129 @@
+import argparse, csv, gc, json, os, shutil, sys, tempfile, time, tracemalloc
+from gen_dataset import generate
+from records import CredentialRecord, StudentRecord
+from safe_io import iter_snapshot
+from student_index import StudentIndex
+
+'''Memory benchmark for a roster held in memory. Generates a data set (gen_dataset.py), then
+loads the students and the login rows in each representation and reports the memory still
+allocated afterwards (tracemalloc), per row and relative to DictReader dicts:
+ - dicts:   list(csv.DictReader) / csv_to_json, what most readers hand around
+ - lists:   list(csv.reader)
+ - records: the __slots__ records with interned values (records.py)
+ - the student index (student_index.py) built from lists and from records, and the records
+   index once its sorted secondary indexes exist; this is what an indexed Student holds
+
+    python bench_memory.py --students 1000000
+    python bench_memory.py --students 200000 --json memory.json --min-ratio 1.5   # exit 1 below 1.5x
+
+--min-ratio is checked against the index of records, not the bare record list: the index adds
+the id and email maps on top of the records. At 200k students (Python 3.11) the records alone
+are about 1.85x smaller than dicts (337 B/row), the index of records 1.54x (406 B/row) and the
+index with its sorted indexes 1.37x (455 B/row); the id and email maps share the records' strings.
+
+--hash-mode defaults to "pool" (64 salt/hash pairs cycled over the accounts) rather than one
+shared pair, which is closer to real credentials without running PBKDF2 per account.'''
+
+def _reader(path):
+    f = open(path, "r", newline="", encoding="utf-8")
+    reader = csv.reader(f)
+    next(reader, None)
+    return f, reader
+
+def load_dicts(path):
+    return list(iter_snapshot(path, dicts=True))
+
+def load_lists(path):
+    f, reader = _reader(path)
+    with f:
+        return list(reader)
+
+def loader(record_class):
+    def load(path):
+        f, reader = _reader(path)
+        with f:
+            return [record_class.pack_row(row) for row in reader]
+    return load
+
+def index_lists(path):
+    index = StudentIndex()
+    index.compact = False  # keep the csv lists, as before records
+    f, reader = _reader(path)
+    with f:
+        for row in reader:
+            index.put(row)
+    return index
+
+def index_records(path):
+    return StudentIndex.load(path)
+
+# the index after the first ranking/email query, with its sorted secondary indexes
+def index_sorted(path):
+    index = StudentIndex.load(path)
+    index.build_sorted()
+    return index
+
+# (table, name, loader); the first entry of a table is the baseline its ratios are taken against
+CASES = [
+    ("students", "dicts", load_dicts),
+    ("students", "lists", load_lists),
+    ("students", "records", loader(StudentRecord)),
+    ("students", "index of lists", index_lists),
+    ("students", "index of records", index_records),
+    ("students", "index + sorted", index_sorted),
+    ("login", "dicts", load_dicts),
+    ("login", "lists", load_lists),
+    ("login", "records", loader(CredentialRecord)),
+]
+
+def measure(fn, path):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    data = fn(path)
+    seconds = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = len(data)
+    del data
+    return {"bytes": current, "peak": peak, "rows": rows, "seconds": seconds}
+
+def run(students=1000000, seed=1, hash_mode="pool", log=print):
+    tmp = tempfile.mkdtemp()
+    try:
+        t0 = time.perf_counter()
+        paths = generate(os.path.join(tmp, "data"), students, seed=seed, hash_mode=hash_mode)
+        log(f"[{students} students] data set written in {time.perf_counter() - t0:.1f}s")
+        results = {}
+        for table, name, fn in CASES:
+            r = measure(fn, paths[table])
+            base = results.setdefault(table, {}).get("dicts", r)
+            r["per_row"] = r["bytes"] / max(r["rows"], 1)
+            r["ratio"] = base["bytes"] / r["bytes"] if r["bytes"] else None
+            results[table][name] = r
+            log(f"  {table:<9}{name:<18}{r['bytes'] / 1e6:10.1f} MB {r['per_row']:8.0f} B/row "
+                f"{r['ratio']:6.2f}x smaller than dicts  (load {r['seconds']:.2f}s)")
+        return {"meta": {"students": students, "seed": seed, "hash_mode": hash_mode,
+                         "python": sys.version.split()[0], "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+                "results": results}
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CheckMyGrade in-memory roster footprint")
+    parser.add_argument("--students", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--hash-mode", choices=["shared", "pool", "unique"], default="pool")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--min-ratio", type=float, help="exit 1 if the index of student records is not this many times smaller than dicts")
+    args = parser.parse_args()
+    report = run(args.students, args.seed, args.hash_mode)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.min_ratio:
+        ratio = report["results"]["students"]["index of records"]["ratio"]
+        if ratio < args.min_ratio:
+            print(f"The student index is only {ratio:.2f}x smaller than dicts (wanted {args.min_ratio}x).")
+            sys.exit(1)
+        print(f"The student index is {ratio:.2f}x smaller than dicts.")
@@ -0,0 +1,59 @@
+import argparse, os, random, shutil, tempfile, time
+from storage import CsvStorage, SqliteStorage
+
+'''Compares the csv and sqlite storage backends on the students table:
+bulk insert, point lookups by id and by email, single-row updates and deletes.
+
+    python bench_storage.py --rows 20000 --ops 200'''
+
+def rows(n):
+    for i in range(n):
+        yield {"student_id": str(i), "email_address": f"student{i}@example.edu", "first_name": f"FN{i}",
+               "last_name": f"LN{i}", "courses": f"C{i % 50:03d}", "grade": "B", "marks": str(i % 101)}
+
+def timed(fn, count):
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    return elapsed, count / elapsed if elapsed else float("inf")
+
+def bench(storage, n, ops, seed=1):
+    repo = storage.students
+    rnd = random.Random(seed)
+    ids = [str(rnd.randrange(n)) for _ in range(ops)]
+    results = {}
+    results["bulk insert"] = timed(lambda: repo.insert(rows(n)), n)
+    results["get by id"] = timed(lambda: [repo.get(i) for i in ids], ops)
+    results["get by email"] = timed(lambda: [repo.find_one("email_address", f"student{i}@example.edu") for i in ids], ops)
+    results["update"] = timed(lambda: [repo.update(i, {"grade": "A"}) for i in ids[:ops // 4]], ops // 4)
+    results["delete"] = timed(lambda: [repo.delete([i]) for i in ids[:ops // 4]], ops // 4)
+    return results
+
+def run(n, ops):
+    tmp = tempfile.mkdtemp()
+    try:
+        backends = {
+            "csv": CsvStorage(*(os.path.join(tmp, f) for f in ("students.csv", "professors.csv", "courses.csv", "login.csv"))),
+            "sqlite": SqliteStorage(os.path.join(tmp, "grades.db")),
+        }
+        print(f"=== Storage benchmark ({n} students, {ops} lookups) ===")
+        print(f"{'operation':<14}" + "".join(f"{name:>23}" for name in backends))
+        results = {name: bench(storage, n, ops) for name, storage in backends.items()}
+        for op in results["csv"]:
+            line = f"{op:<14}"
+            for name in backends:
+                elapsed, rate = results[name][op]
+                line += f"{elapsed:9.4f}s {rate:10.0f}/s"
+            print(line)
+        for storage in backends.values():
+            storage.close()
+        return results
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="csv vs sqlite storage backend")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+    run(args.rows, args.ops)
@@ -0,0 +1,179 @@
+import argparse, contextlib, csv, json, math, os, platform, random, shutil, statistics, sys, tempfile, time
+from student import Student
+from professor import Professor
+from login import LoginCredential
+from grade_scale import GradeScale
+from grade_columns import ColumnarGradeScale
+from user import User
+from gen_dataset import generate
+
+'''Benchmark suite for the hot operations at growing table sizes. For every size a fresh data
+set is written to a temp directory, each operation is run --repeat times and the median, min,
+max and standard deviation (seconds per call) are recorded. The summary prints the medians per
+size and the growth exponent between sizes (~0 constant, ~1 linear, ~2 quadratic).
+The data sets come from gen_dataset.py. Student operations run on the plain csv Student and,
+as "(indexed)", on Student(indexed=True, log_writes=True); the grade report on GradeScale and,
+as "(columnar)", on ColumnarGradeScale. The default sizes stop at 100k rows; pass
+--sizes 1000,10000,100000,1000000 for the large run.
+
+    python bench_suite.py --sizes 1000,10000 --repeat 5 --json results.json
+    python bench_suite.py --json results.json --save-baseline baseline.json
+    python bench_suite.py --baseline baseline.json --tolerance 0.25    # exit 1 on regression
+
+Accounts in the data set share one precomputed hash (password "pw"), so building a million
+rows does not take a million PBKDF2 runs.'''
+
+SIZES = [1000, 10000, 100000]
+COURSES = 50
+PROFESSORS = 100
+
+# name -> setup(paths, n, rnd) returning a zero-argument callable that is timed once per repeat
+def _operations():
+    plain = lambda path: Student(path)
+    # the index and its sorted indexes are built here, in setup, so the timed calls see the warm path
+    def indexed(path):
+        students = Student(path, indexed=True, log_writes=True)
+        students.top_students(1)
+        return students
+    def add(make):
+        def setup(paths, n, rnd):
+            students, ids = make(paths["students"]), iter(range(n + 1, 2 * n + 2))
+            return lambda: students.add_new_student(paths["login"], User(str(next(ids)), "new@example.edu", "New", "Student", "student"), "pw", "C001", "B", 80)
+        return setup
+    def update(make):
+        def setup(paths, n, rnd):
+            students = make(paths["students"])
+            return lambda: students.update_student_record(User(str(rnd.randint(1, n)), "", "", "", "student"), grade="A", marks=95)
+        return setup
+    def delete(make):
+        def setup(paths, n, rnd):
+            students, ids = make(paths["students"]), iter(rnd.sample(range(1, n + 1), min(n, 1000)))
+            return lambda: students.delete_new_student(str(next(ids)))
+        return setup
+    def grades(make):
+        def setup(paths, n, rnd):
+            students = make(paths["students"])
+            return lambda: students.check_my_grades(str(rnd.randint(1, n)))
+        return setup
+    def top_students(paths, n, rnd):
+        students = indexed(paths["students"])
+        return lambda: students.top_students(10, f"C{rnd.randint(1, COURSES):03d}")
+    def login_cold(paths, n, rnd):
+        # a new process / LoginCredential: builds the email index, then one PBKDF2
+        return lambda: LoginCredential(paths["login"]).login(f"student{rnd.randint(1, n)}@example.edu", "pw")
+    def login_warm(paths, n, rnd):
+        lc = LoginCredential(paths["login"])
+        lc.get_credential("student1@example.edu")
+        return lambda: lc.login(f"student{rnd.randint(1, n)}@example.edu", "pw")
+    def course_details(paths, n, rnd):
+        profs = Professor(paths["professors"])
+        return lambda: profs.show_course_details_by_professor(paths["professors"], paths["courses"], f"P{rnd.randint(1, PROFESSORS)}")
+    def grade_report(scale):
+        def setup(paths, n, rnd):
+            def run():
+                gs = scale()
+                gs.sync_students(paths["students"])
+                gs.display_grade_report("course")
+            return run
+        return setup
+    def rows(paths):
+        with open(paths["students"], "r", newline="", encoding="utf-8") as f:
+            return list(csv.reader(f))[1:]
+    def sort_marks(paths, n, rnd):
+        data = rows(paths)
+        return lambda: sorted(data, key=lambda r: int(r[6]) if r[6].lstrip("-").isdigit() else -1)
+    def sort_email(paths, n, rnd):
+        data = rows(paths)
+        return lambda: sorted(data, key=lambda r: r[1].lower())
+    return {"add_new_student": add(plain), "add_new_student (indexed)": add(indexed),
+            "update_student_record": update(plain), "update_student_record (indexed)": update(indexed),
+            "delete_new_student": delete(plain), "delete_new_student (indexed)": delete(indexed),
+            "check_my_grades": grades(plain), "check_my_grades (indexed)": grades(indexed),
+            "top_students (indexed)": top_students, "login (cold)": login_cold, "login (warm)": login_warm,
+            "show_course_details_by_professor": course_details,
+            "display_grade_report": grade_report(GradeScale), "display_grade_report (columnar)": grade_report(ColumnarGradeScale),
+            "sort by marks": sort_marks, "sort by email": sort_email}
+
+OPERATIONS = _operations()
+
+def measure(fn, repeat):
+    times = []
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+    return {"median": statistics.median(times), "min": min(times), "max": max(times),
+            "stdev": statistics.pstdev(times), "runs": repeat}
+
+def run(sizes=SIZES, repeat=5, ops=None, seed=1, log=print):
+    ops = ops or list(OPERATIONS)
+    results = {op: {} for op in ops}
+    for n in sizes:
+        tmp = tempfile.mkdtemp()
+        try:
+            t0 = time.perf_counter()
+            fixture = generate(os.path.join(tmp, "data"), n, PROFESSORS, COURSES, seed)
+            log(f"[{n} rows] data set written in {time.perf_counter() - t0:.1f}s")
+            for op in ops:
+                # every operation starts from the same files
+                work = os.path.join(tmp, "work")
+                shutil.rmtree(work, ignore_errors=True)
+                os.mkdir(work)
+                paths = {k: shutil.copy(p, work) for k, p in fixture.items()}
+                results[op][str(n)] = r = measure(OPERATIONS[op](paths, n, random.Random(seed)), repeat)
+                log(f"  {op:<34} median {r['median'] * 1000:10.3f} ms  (min {r['min'] * 1000:.3f}, max {r['max'] * 1000:.3f})")
+        finally:
+            shutil.rmtree(tmp)
+    return {"meta": {"sizes": list(sizes), "repeat": repeat, "seed": seed, "python": platform.python_version(),
+                     "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+def summary(report):
+    sizes = [str(n) for n in report["meta"]["sizes"]]
+    print("=== median ms per call ===")
+    print(f"{'operation':<34}" + "".join(f"{s:>12}" for s in sizes) + "   growth")
+    for op, by_size in report["results"].items():
+        medians = [by_size.get(s, {}).get("median") for s in sizes]
+        line = f"{op:<34}" + "".join(f"{m * 1000:12.3f}" if m is not None else f"{'-':>12}" for m in medians)
+        # exponent k in time ~ n^k between consecutive sizes
+        exps = [math.log(b / a) / math.log(int(s2) / int(s1))
+                for (s1, a), (s2, b) in zip(zip(sizes, medians), zip(sizes[1:], medians[1:])) if a and b]
+        print(line + "   " + " ".join(f"n^{k:.2f}" for k in exps))
+
+# Returns [(op, size, baseline median, current median)] for every median that grew by more than tolerance.
+def regressions(report, baseline, tolerance=0.25):
+    out = []
+    for op, by_size in report["results"].items():
+        for size, r in by_size.items():
+            base = baseline.get("results", {}).get(op, {}).get(size)
+            if base and r["median"] > base["median"] * (1 + tolerance):
+                out.append((op, size, base["median"], r["median"]))
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CheckMyGrade benchmark suite")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ops", help="comma separated subset of: " + ", ".join(OPERATIONS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+    report = run([int(s) for s in args.sizes.split(",")], args.repeat,
+                 args.ops.split(",") if args.ops else None, args.seed)
+    summary(report)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for op, size, before, now in found:
+            print(f"REGRESSION {op} @ {size}: {before * 1000:.3f} ms -> {now * 1000:.3f} ms (+{(now / before - 1) * 100:.0f}%)")
+        if found:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}.")
@@ -4,19 +4,31 @@ from student import Student
 from professor import Professor
 from course import Course
 from grade_scale import GradeScale
+from grade_stream import iter_grade_rows, stream_grade_report
+from grade_sketch import CourseDistributions
 from user import User
+from storage import CsvStorage, SqliteStorage
+from integrity import Integrity, POLICIES
+from enrolment import EnrolmentStore
+import metrics
 
 ######## FILES #################
 login_file = 'login.csv'
 student_file = 'students.csv'
 professor_file = 'professors.csv'
 course_file = 'courses.csv'
+enrolment_file = 'enrolments.csv'
+# Set CHECKMYGRADE_DB to a sqlite database (see `python storage.py migrate`) to use it instead of the csv files
+database_file = os.environ.get("CHECKMYGRADE_DB")
+# Set CHECKMYGRADE_METRICS=1 to record per-operation timings and I/O from startup (admin menu 17)
+if os.environ.get("CHECKMYGRADE_METRICS") == "1":
+    metrics.enable()
 
 # Login details
 if not os.path.exists(login_file):
     with open(login_file, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow(["Email", "Password","Salt","Role"])
+        writer.writerow(["Email", "Password","Salt","Role","Iterations"])
 
 # Student
 students_file = "students.csv"
@@ -40,6 +52,20 @@ if not os.path.exists(courses_file):
         writer.writerow(["course_id", "course_name", "credits", "description"])
 
 ################## MENUS ################################
+# Shows a listing one page at a time (see listing.py); only the rows of the page are read.
+def page_through(show, page_size=20):
+    text = input("Filter as column=value[,column=value] (Enter for all): ").strip()
+    filters = {}
+    for part in text.split(","):
+        if "=" in part:
+            col, value = part.split("=", 1)
+            filters[col.strip()] = value.strip()
+    cursor = 0
+    while True:
+        cursor = show(cursor, page_size, filters)
+        if cursor is None or input("Enter for the next page, q to stop: ").strip().lower() == "q":
+            return
+
 def menu_admin(students: Student, profs: Professor, courses: Course, grades: GradeScale):
     while True:
             print(
@@ -59,12 +85,15 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
                 "13) Add grade\n"
                 "14) Delete grade\n"
                 "15) Modify grade\n"
+                "16) Stream grade report from file (large rosters)\n"
+                "17) Performance metrics\n"
+                "18) Enrol student in a course\n"
                 "0) Logout\n"
             )
             #-------STUDENT---------------------
             choice = input("Choose: ").strip()
             if choice == "1":
-                students.display_records()
+                page_through(students.display_page)
             elif choice == "2":
                 id = input("Enter student id: ").strip()
                 first = input("Enter first name: ").strip()
@@ -95,7 +124,7 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
                 students.update_student_record(u, grade=grade, marks=marks)
             # -----------------------------PROFESSOR --------------------------
             elif choice == "5":
-                profs.display_professors()
+                page_through(profs.display_page)
             elif choice == "6":
                 id = input("Enter Professor id: ").strip()
                 first = input("Enter first name: ").strip()
@@ -121,7 +150,7 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
 
             # ---------- COURSES --------------------------------------
             elif choice == "9":
-                courses.display_courses()
+                page_through(courses.display_page)
             elif choice == "10":
                 id = input("Enter course id: ").strip()
                 name = input("Enter course name: ").strip()
@@ -130,7 +159,11 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
                 courses.add_new_course(id, name, credits, description)
             elif choice == "11":
                 id = input("Enter course id to delete: ").strip()
-                courses.delete_new_course(id)
+                policy = input(f"If students or professors still have it ({'/'.join(POLICIES)}) [restrict]: ").strip() or "restrict"
+                if policy in POLICIES:
+                    courses.delete_new_course(id, policy)
+                else:
+                    print("Invalid choice.")
 
             # ---------- Grades -----------------------------------
             elif choice == "12":
@@ -142,10 +175,8 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
                 else:
                     print("Invalid choice. Defaulting to student_id.")
                     sort = "student_id"
-                with open(student_file, newline="") as f:
-                    for row in csv.DictReader(f):
-                        marks_num = float(row["marks"].replace(",", "").strip()) # had some trouble here and learnt that csv fields are always read as strings, even if the value is otherwise. 
-                        grades.add_grade(row["student_id"], row["courses"], marks_num)
+                # only rows changed since the last view are applied, so repeated reports don't double-count
+                grades.sync_students(students.repo or student_file, students.enrolments)
                 grades.display_grade_report(sort)
 
             elif choice == "13":
@@ -175,6 +206,33 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
                 else:
                     if grades.modify_grade(student_id, course, new_grade):
                         print("Grade updated.")
+
+            elif choice == "16":
+                order = input("View report grouped by:\n1. student_id\n2. course\nChoose 1 or 2: ").strip()
+                stream_grade_report(iter_grade_rows(students.repo or student_file, students.enrolments), "course" if order == "2" else "student_id")
+
+            elif choice == "17":
+                metrics.display()
+                action = input("1. Turn on  2. Turn off  3. Reset  4. Save Prometheus text  5. Save JSON  (Enter to go back): ").strip()
+                if action == "1":
+                    print("Instrumentation on." if metrics.enable() else "Already on.")
+                elif action == "2":
+                    print("Instrumentation off." if metrics.disable() else "Already off.")
+                elif action == "3":
+                    metrics.reset()
+                    print("Counters cleared.")
+                elif action in ("4", "5"):
+                    path = input("Save to file: ").strip() or ("metrics.prom" if action == "4" else "metrics.json")
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(metrics.to_prometheus() if action == "4" else metrics.to_json())
+                    print(f"Saved to {path}")
+
+            elif choice == "18":
+                student_id = input("Enter student ID: ").strip()
+                course = input("Enter course id: ").strip()
+                grade = input("Enter grade if any: ").strip() or None
+                marks_raw = input("Enter marks if any (press Enter to skip): ").strip()
+                students.enrol_in_course(student_id, course, grade, int(marks_raw) if marks_raw else None)
                     
             elif choice == "0":
                 return
@@ -182,7 +240,8 @@ def menu_admin(students: Student, profs: Professor, courses: Course, grades: Gra
             else:
                 print("Invalid choice.")
 
-def menu_student(students: Student):
+# With a session the user's own rows are already loaded; without one we ask for the id.
+def menu_student(students: Student, session=None):
     while True:
         print(
             "\n[STUDENT MENU]\n"
@@ -192,30 +251,78 @@ def menu_student(students: Student):
         )
         choice = input("Choose: ").strip()
         if choice == "1":
-            s_id = input("Enter your id: ").strip()
-            students.check_my_grades(s_id)
+            if session is not None:
+                session.print_grades()
+                if session.user_id is not None and students.repo is None:
+                    students.print_class_rank(session.user_id)
+            else:
+                s_id = input("Enter your id: ").strip()
+                students.check_my_grades(s_id)
         elif choice == "2":
-            s_id = input("Enter your id: ").strip()
-            students.check_my_marks(s_id)
+            if session is not None:
+                session.print_marks()
+            else:
+                s_id = input("Enter your id: ").strip()
+                students.check_my_marks(s_id)
         elif choice == "0":
             return
         else:
             print("Invalid choice.")
 
-def menu_professor(profs: Professor, courses: Course):
+def menu_professor(profs: Professor, courses: Course, session=None, students: Student = None):
     while True:
         print(
             "\n[PROFESSOR MENU]\n"
             "1) My course details\n"
             "2) List all courses\n"
+            "3) Class distribution\n"
+            "4) Top students in a course\n"
+            "5) Students in a marks range\n"
+            "6) Course roster\n"
+            "7) Who teaches a course\n"
+            "8) All my students\n"
             "0) Logout\n"
         )
         choice = input("Choose: ").strip()
         if choice == "1":
-            p_id = input("Enter Professor ID to search: ").strip()
-            profs.show_course_details_by_professor(professors_file, course_file, p_id)
+            if session is not None:
+                session.print_course_details()
+            else:
+                p_id = input("Enter Professor ID to search: ").strip()
+                profs.show_course_details_by_professor(professors_file, course_file, p_id)
         elif choice == "2":
             courses.display_courses()
+        elif choice == "3":
+            own = session.records[0].get("course_id") if session is not None and session.records else ""
+            cid = own or input("Enter course id: ").strip()
+            # one pass over the marks, constant memory per course
+            source = students.repo if students is not None and students.repo is not None else student_file
+            CourseDistributions.from_rows(iter_grade_rows(source, profs.enrolments)).display_distribution(cid)
+        elif choice in ("4", "5") and students is not None:
+            own = session.records[0].get("course_id") if session is not None and session.records else ""
+            cid = own or input("Enter course id: ").strip()
+            try:
+                if choice == "4":
+                    rows = students.top_students(int(input("How many: ").strip() or 10), cid)
+                else:
+                    rows = students.students_in_range(float(input("From marks: ").strip()), float(input("To marks: ").strip()), cid)
+            except ValueError:
+                print("Invalid number.")
+                continue
+            if not rows:
+                print(f"No marks recorded for {cid}.")
+            for i, row in enumerate(rows, 1):
+                print(f"{i:>3}. {row['student_id']} {row['first_name']} {row['last_name']}: {row['marks']}")
+        elif choice in ("6", "7"):
+            own = session.records[0].get("course_id") if session is not None and session.records else ""
+            cid = (own if choice == "6" else "") or input("Enter course id: ").strip()
+            if choice == "6":
+                profs.show_course_roster(student_file, course_file, cid)
+            else:
+                profs.show_course_teachers(course_file, cid)
+        elif choice == "8":
+            p_id = (session.user_id if session is not None else None) or input("Enter Professor ID: ").strip()
+            profs.show_my_students(student_file, course_file, p_id)
         elif choice == "0":
             return
         else:
@@ -223,10 +330,21 @@ def menu_professor(profs: Professor, courses: Course):
 
 ############## MAIN #################################
 def main():
-    login = LoginCredential(login_file)
-    students = Student(student_file)
-    profs = Professor(professor_file)
-    courses = Course(course_file)
+    storage = SqliteStorage(database_file) if database_file else None
+    # every (student, course) pair; seeded from the students table on first run (see enrolment.py)
+    new_store = not os.path.exists(enrolment_file)
+    enrolments = EnrolmentStore(enrolment_file)
+    if new_store:
+        enrolments.import_students(storage.students.all() if storage is not None else student_file)
+    # foreign-key checks and cascading deletes across the four tables (see integrity.py)
+    integrity = Integrity(storage or CsvStorage(student_file, professor_file, course_file, login_file), enrolments=enrolments)
+    # hashing cost tuned to this host once and saved (see login.py); new accounts are hashed at
+    # it and cheaper rows are rehashed to it as their users log in
+    iters = LoginCredential.configured_iterations(login_file)
+    login = LoginCredential(login_file, iters=iters, storage=storage)
+    students = Student(student_file, storage=storage, integrity=integrity, enrolments=enrolments, iters=iters)
+    profs = Professor(professor_file, storage=storage, integrity=integrity, iters=iters, enrolments=enrolments)
+    courses = Course(course_file, storage=storage, integrity=integrity)
     grades = GradeScale()
     
 
@@ -244,7 +362,8 @@ def main():
         email = input("Email: ").strip()
         password = input("Password: ").strip()
 
-        role = login.login(email, password)
+        session = login.login(email, password, students, profs, courses)
+        role = session.role if session else None
         if not role:
             print("Invalid credentials.")
         else:
@@ -253,9 +372,9 @@ def main():
         if role == "admin":
             menu_admin(students, profs, courses, grades)
         elif role == "student":
-            menu_student(students)
+            menu_student(students, session)
         elif role == "professor":
-            menu_professor(profs, courses)
+            menu_professor(profs, courses, session, students)
         else:
             menu_student(students)
 
@@ -1,56 +1,65 @@
-import csv
+from listing import print_page
+from records import CourseRecord
+from storage import COURSE_HEADER, CsvRepository
 
 class Course:
-    def __init__(self, file_path):
+    record = CourseRecord  # repeated columns of the rows it reads are interned (see records.py)
+
+    # All reads and writes go through a repository (see storage.py): storage.courses when a
+    # storage is given, otherwise a CsvRepository over file_path.
+    # integrity (see integrity.py) handles the students and professors of a deleted course
+    def __init__(self, file_path, storage=None, integrity=None):
         self.file = file_path
+        self.storage = storage
+        self.integrity = integrity
+        self.repo = storage.courses if storage is not None else CsvRepository(file_path, COURSE_HEADER, "course_id", CourseRecord)
+
+    # writers hold the repository's lock for the whole read-check-write cycle (for the csv file
+    # that is <file>.lock, see safe_io.py)
+    def _write_lock(self):
+        return self.repo.lock()
+
+    # course_id -> row for every id in course_ids, in one scan (the first row of an id wins)
+    def find_courses(self, course_ids):
+        wanted = {str(c) for c in course_ids}
+        return {row["course_id"]: row for row in reversed(self.repo.find_many("course_id", wanted))}
+
+    # ---- paged listing (see listing.py) ----
+    def list_courses(self, cursor=0, size=20, filters=None):
+        return self.repo.page(cursor, size, filters)
+
+    def display_page(self, cursor=0, size=20, filters=None):
+        rows, next_cursor = self.list_courses(cursor, size, filters)
+        print_page(rows, next_cursor)
+        return next_cursor
 
     def display_courses(self):
-        with open(self.file, 'r', newline='') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                            print(row)
+        # csv: a lock-free snapshot, a concurrent rewrite or append is never seen half done
+        print(self.repo.columns)
+        for row in self.repo.all():
+            print(list(row.values()))
 
     def add_new_course(self, course_id, name, credits, desc=None):
-        exists = False
-        with open(self.file, "r", newline="", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                header = next(reader, None)
-
-                id_idx = 0
-                if header and "course_id" in header:
-                    id_idx = header.index("course_id")
-
-                for row in reader:
-                    if row and row[id_idx] == str(course_id):
-                            exists = True
-                            break
-                    
-        if exists:
-                print(f"Course with ID: {course_id} already exists. No record added.")
+        with self._write_lock():
+            exists = self.repo.get(course_id) is not None
+            if exists:
+                    print(f"Course with ID: {course_id} already exists. No record added.")
+                    return False
+            self.repo.insert([{"course_id": course_id, "course_name": name, "credits": credits, "description": desc if desc is not None else ""}])
+            print(f"Course: {name} added successfully!")
+
+    # policy: "restrict", "cascade" or "set_null" (see integrity.py); only used with integrity
+    def delete_new_course(self, course_id, policy=None):
+         if self.integrity is not None:
+            counts = self.integrity.delete_courses([course_id], policy)
+            if counts is None:
                 return False
-        with open(self.file, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([course_id, name, credits, desc if desc is not None else ""])
-                    print(f"Course: {name} added successfully!")
-
-    def delete_new_course(self, course_id):
-         with open(self.file, 'r', newline='', encoding='utf-8') as f:
-            rows = list(csv.reader(f))
-
-            idx_to_delete = None
-            for i in range(1, len(rows)):
-                if rows[i] and rows[i][0] == str(course_id):
-                    idx_to_delete = i
-                    break
-
-            if idx_to_delete is None:
-                print(f"No course found with ID {course_id}. Delete aborted.")
-                return False 
-
-            # Remove the row and write back
-            del rows[idx_to_delete]
-            with open(self.file, 'w', newline='', encoding='utf-8') as f:
-                csv.writer(f).writerows(rows)
-
-            print("Course deleted successfully!")
-            return True
\ No newline at end of file
+            print(f"Course deleted successfully! ({counts.get('students', 0)} students, "
+                  f"{counts.get('professors', 0)} professors and {counts.get('login', 0)} logins removed; "
+                  f"{counts.get('students unlinked', 0) + counts.get('professors unlinked', 0)} rows unlinked)")
+            return True
+         if not self.repo.delete([course_id]):
+            print(f"No course found with ID {course_id}. Delete aborted.")
+            return False
+         print("Course deleted successfully!")
+         return True
@@ -0,0 +1,230 @@
+import csv, os, sys
+from array import array
+from file_cache import file_signature
+from safe_io import atomic_write, iter_snapshot, write_lock
+from records import split_course_ids
+
+'''Normalised enrolments: one row per (student_id, course_id) with that course's grade and
+marks, in enrolments.csv. A student in five courses is five short rows here and still a
+single identity row in students.csv.
+In memory the course ids are interned to small integers (course number = position in
+course_ids) and the table is held as
+    (student_id, course number) -> (grade, marks)
+    student_id -> array of course numbers      (per-student posting list)
+    course number -> [student_id]              (per-course posting list)
+so a student's whole transcript, or a course's roster, is one dictionary probe plus the size
+of the answer, and memory grows with enrolments rather than with copies of identity rows.
+The store reloads when the file's signature changes. New enrolments and changed grades/marks
+are appended, so an update costs one short write; when a pair appears more than once its last
+row wins. Removals rewrite the file once per call, and so does an append that leaves more than
+twice as many rows in the file as there are enrolments, which drops the superseded ones. All
+writes hold the file's write lock (see safe_io.py).
+The students table stays the identity table and may be written without the store, so readers
+combine the two through expand() (see Student.enrolled_rows): relations.py rosters, ranking,
+GradeScale.sync_students, grade_stream and the server's /me views all take the store.'''
+
+ENROLMENT_HEADER = ["student_id", "course_id", "grade", "marks"]
+
+class EnrolmentStore:
+    def __init__(self, path="enrolments.csv"):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(ENROLMENT_HEADER)
+        self.signature = None
+        self._load()
+
+    # ---- interning / in-memory tables ----
+    def _reset(self):
+        self.course_ids = []   # course number -> course_id
+        self.course_no = {}    # course_id -> course number
+        self.records = {}      # (student_id, course number) -> (grade, marks)
+        self.by_student = {}   # student_id -> array("I") of course numbers
+        self.by_course = []    # course number -> [student_id]
+        self.file_rows = 0     # data rows in the file, superseded ones included
+
+    def _intern(self, course_id):
+        no = self.course_no.get(course_id)
+        if no is None:
+            no = self.course_no[course_id] = len(self.course_ids)
+            self.course_ids.append(course_id)
+            self.by_course.append([])
+        return no
+
+    def _put(self, student_id, course_id, grade, marks):
+        sid = sys.intern(str(student_id))
+        no = self._intern(str(course_id))
+        if (sid, no) not in self.records:
+            self.by_student.setdefault(sid, array("I")).append(no)
+            self.by_course[no].append(sid)
+        self.records[(sid, no)] = (sys.intern(grade or ""), "" if marks is None else str(marks))
+
+    def _remove(self, student_id, no):
+        if self.records.pop((student_id, no), None) is None:
+            return False
+        courses = self.by_student[student_id]
+        courses.remove(no)
+        if not courses:
+            del self.by_student[student_id]
+        self.by_course[no].remove(student_id)
+        return True
+
+    def _load(self):
+        self._reset()
+        for row in iter_snapshot(self.path, dicts=True):
+            if row.get("student_id") and row.get("course_id"):
+                self._put(row["student_id"], row["course_id"], row.get("grade"), row.get("marks"))
+                self.file_rows += 1
+        self.signature = file_signature(self.path)
+
+    def _fresh(self):
+        if file_signature(self.path) != self.signature:
+            self._load()
+        return self
+
+    def _rows(self):
+        for (sid, no), (grade, marks) in self.records.items():
+            yield [sid, self.course_ids[no], grade, marks]
+
+    def _rewrite(self):
+        with atomic_write(self.path) as f:
+            writer = csv.writer(f)
+            writer.writerow(ENROLMENT_HEADER)
+            writer.writerows(self._rows())
+        self.file_rows = len(self.records)
+
+    # the signature the in-memory tables were loaded at, after reloading them if it moved on;
+    # for caches built over the store
+    def current_signature(self):
+        return self._fresh().signature
+
+    # ---- lookups ----
+    def __len__(self):
+        return len(self._fresh().records)
+
+    def get(self, student_id, course_id):
+        self._fresh()
+        no = self.course_no.get(str(course_id))
+        return None if no is None else self.records.get((str(student_id), no))
+
+    # [(course_id, grade, marks)] in enrolment order
+    def courses_of(self, student_id):
+        self._fresh()
+        sid = str(student_id)
+        return [(self.course_ids[no], *self.records[(sid, no)]) for no in self.by_student.get(sid, ())]
+
+    # (course_id, grade, marks) for every course of a students row: its enrolments here, then
+    # courses named on the row that the store does not hold yet. The row holds the latest write,
+    # possibly by a writer without the store, so the courses it names keep the row's grade and
+    # marks. fresh=False skips the reload check, for callers going through many rows.
+    def merged_courses(self, row, fresh=True):
+        if fresh:
+            self._fresh()
+        sid = str(row["student_id"])
+        own = split_course_ids(row.get("courses"))
+        out = []
+        for no in self.by_student.get(sid, ()):
+            cid = self.course_ids[no]
+            out.append((cid, row.get("grade"), row.get("marks")) if cid in own else (cid, *self.records[(sid, no)]))
+        listed = {cid for cid, _, _ in out}
+        return out + [(cid, row.get("grade"), row.get("marks")) for cid in own if cid not in listed]
+
+    # students rows -> one row per enrolled course, with that course in `courses` and its grade
+    # and marks; a student with no enrolments here passes through unchanged
+    def expand(self, rows):
+        self._fresh()
+        for row in rows:
+            if str(row["student_id"]) in self.by_student:
+                for cid, grade, marks in self.merged_courses(row, fresh=False):
+                    yield dict(row, courses=cid, grade=grade, marks=marks)
+            else:
+                yield row
+
+    # [(student_id, grade, marks)] in enrolment order
+    def roster(self, course_id):
+        self._fresh()
+        no = self.course_no.get(str(course_id))
+        if no is None:
+            return []
+        return [(sid, *self.records[(sid, no)]) for sid in self.by_course[no]]
+
+    # ---- writes ----
+    # entries: [(student_id, course_id, grade, marks)]; an existing pair gets the new grade/marks.
+    # Returns the number of entries written.
+    def enrol_many(self, entries):
+        entries = [(str(s), str(c), g or "", "" if m is None else str(m)) for s, c, g, m in entries]
+        if not entries:
+            return 0
+        with write_lock(self.path):
+            self._fresh()
+            for entry in entries:
+                self._put(*entry)
+            self.file_rows += len(entries)
+            if self.file_rows > 2 * len(self.records) + 1000:
+                self._rewrite()  # mostly superseded rows by now
+            else:
+                with open(self.path, "a", newline="", encoding="utf-8") as f:
+                    csv.writer(f).writerows(entries)
+            self.signature = file_signature(self.path)
+        return len(entries)
+
+    def enrol(self, student_id, course_id, grade=None, marks=None):
+        return self.enrol_many([(student_id, course_id, grade, marks)]) == 1
+
+    # Drops every enrolment of the given students and every enrolment in the given courses,
+    # with one rewrite. A course's posting list goes as a whole and every other posting list
+    # touched is rebuilt once, so the cost is linear in the enrolments removed plus the lists
+    # they sat in. Returns the number removed.
+    def remove(self, student_ids=(), course_ids=()):
+        with write_lock(self.path):
+            self._fresh()
+            removed = 0
+            dropped, touched = set(), set()  # course numbers emptied; students who lost one of them
+            for cid in {str(c) for c in course_ids}:
+                no = self.course_no.get(cid)
+                if no is None or not self.by_course[no]:
+                    continue
+                for sid in self.by_course[no]:
+                    del self.records[(sid, no)]
+                touched.update(self.by_course[no])
+                removed += len(self.by_course[no])
+                self.by_course[no] = []
+                dropped.add(no)
+            for sid in touched:
+                left = array("I", (no for no in self.by_student[sid] if no not in dropped))
+                if left:
+                    self.by_student[sid] = left
+                else:
+                    del self.by_student[sid]
+            sids, affected = {str(s) for s in student_ids}, set()
+            for sid in sids:
+                for no in self.by_student.pop(sid, ()):
+                    del self.records[(sid, no)]
+                    affected.add(no)
+                    removed += 1
+            for no in affected:
+                self.by_course[no] = [sid for sid in self.by_course[no] if sid not in sids]
+            if removed:
+                self._rewrite()
+                self.signature = file_signature(self.path)
+        return removed
+
+    def unenrol(self, student_id, course_id):
+        with write_lock(self.path):
+            self._fresh()
+            no = self.course_no.get(str(course_id))
+            if no is None or not self._remove(str(student_id), no):
+                return False
+            self._rewrite()
+            self.signature = file_signature(self.path)
+        return True
+
+    # Seeds the store from the courses/grade/marks columns of a students.csv-style file or an
+    # iterable of student dicts (each id in a ';' separated courses value becomes one
+    # enrolment). Returns the count.
+    def import_students(self, source):
+        entries = []
+        for row in (iter_snapshot(source, dicts=True) if isinstance(source, str) else source):
+            for cid in split_course_ids(row.get("courses")):
+                entries.append((row["student_id"], cid, row.get("grade"), row.get("marks")))
+        return self.enrol_many(entries)
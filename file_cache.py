@@ -0,0 +1,17 @@
+import os
+
+'''Small helper for the in-memory caches. A cache remembers the signature of the
+file(s) it was built from and reloads only when the signature changes.
+The signature is (mtime in ns, size) for each path; a missing file gives None.'''
+
+
+def file_signature(*paths):
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            sig.append(None)
+        else:
+            sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
@@ -0,0 +1,135 @@
+import argparse, csv, hashlib, itertools, os, random, time
+from login import CREDENTIAL_HEADER, LoginCredential
+from student_index import STUDENT_HEADER
+from storage import PROFESSOR_HEADER, COURSE_HEADER
+
+'''Synthetic data set generator. Writes students.csv, professors.csv, courses.csv and login.csv
+in the app's layouts, streaming rows straight to disk so memory stays flat at any size. The same
+seed and options always give byte-identical files (except login.csv in "unique" mode, whose
+salts are random).
+ - every professor teaches an existing course, and students only enrol in courses that have a
+   professor; every student and professor has exactly one login row, and all emails are unique
+ - enrolment can be skewed: course popularity follows a Zipf law with exponent --skew
+   (0 = uniform)
+ - marks are "normal" (--mean/--sd, clipped to 0..100), "uniform" or "bimodal"; the letter
+   grade is derived from the marks
+ - passwords: "shared" hashes the password once and reuses salt and hash for every account,
+   "pool" cycles through --pool precomputed salt/hash pairs, and "unique" runs PBKDF2 per
+   account (realistic, and by far the slowest). Every account's password is --password.
+
+    python gen_dataset.py out/ --students 1000000 --seed 7 --skew 1.1 --marks bimodal'''
+
+BUFFER = 1 << 20
+CHUNK = 10000
+
+def letter(marks):
+    for cutoff, grade in ((90, "A"), (80, "B"), (70, "C"), (60, "D")):
+        if marks >= cutoff:
+            return grade
+    return "F"
+
+def course_ids(n):
+    return [f"C{i:03d}" for i in range(1, n + 1)]
+
+def course_weights(n, skew):
+    # cumulative Zipf weights: course k is picked with probability ~ 1 / k**skew
+    return list(itertools.accumulate(1.0 / (k ** skew) for k in range(1, n + 1)))
+
+def draw_marks(rnd, dist, mean, sd):
+    if dist == "uniform":
+        return rnd.randint(0, 100)
+    if dist == "bimodal":
+        m = rnd.gauss(mean - 20, sd / 2) if rnd.random() < 0.5 else rnd.gauss(mean + 15, sd / 2)
+    else:
+        m = rnd.gauss(mean, sd)
+    return min(100, max(0, round(m)))
+
+class Hasher:
+    def __init__(self, mode, password, iters, pool, rnd):
+        self.mode, self.password, self.iters = mode, password, iters
+        size = 1 if mode == "shared" else pool
+        if mode == "unique":
+            self.pairs = None
+        else:
+            # salts come from the seeded generator, so the files stay reproducible
+            self.pairs = []
+            for _ in range(size):
+                salt = bytes(rnd.getrandbits(8) for _ in range(16))
+                self.pairs.append((salt.hex(), hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iters).hex()))
+
+    def rows(self, accounts, workers=1):
+        # accounts: [(email, role)] -> login.csv rows
+        if self.pairs is None:
+            pairs = LoginCredential(os.devnull, iters=self.iters).hash_passwords([self.password] * len(accounts), workers)
+        else:
+            pairs = itertools.islice(itertools.cycle(self.pairs), len(accounts))
+        return ([email, pwd_hash, salt, role, self.iters] for (email, role), (salt, pwd_hash) in zip(accounts, pairs))
+
+def generate(directory, students=1000, professors=100, courses=50, seed=1, skew=0.0, marks="normal",
+             mean=72.0, sd=12.0, hash_mode="shared", password="pw", iters=1000, pool=64, workers=1):
+    os.makedirs(directory, exist_ok=True)
+    rnd = random.Random(seed)
+    paths = {name: os.path.join(directory, f"{name}.csv") for name in ("students", "professors", "courses", "login")}
+    hasher = Hasher(hash_mode, password, iters, pool, rnd)
+    cids = course_ids(courses)
+    taught = cids[:professors] if 0 < professors < courses else cids
+    cum = course_weights(len(taught), skew)
+
+    with open(paths["courses"], "w", newline="", encoding="utf-8", buffering=BUFFER) as f:
+        w = csv.writer(f)
+        w.writerow(COURSE_HEADER)
+        w.writerows([cid, f"Course {i}", str(3 + i % 3), f"Generated course {i}"] for i, cid in enumerate(cids, 1))
+
+    with open(paths["professors"], "w", newline="", encoding="utf-8", buffering=BUFFER) as pf, \
+         open(paths["login"], "w", newline="", encoding="utf-8", buffering=BUFFER) as lf:
+        pw, lw = csv.writer(pf), csv.writer(lf)
+        pw.writerow(PROFESSOR_HEADER)
+        lw.writerow(CREDENTIAL_HEADER)
+        ranks = ["Assistant", "Associate", "Full"]
+        accounts = []
+        for i in range(1, professors + 1):
+            email = f"prof{i}@example.edu"
+            pw.writerow([f"P{i}", email, f"Prof{i}", f"LN{i}", cids[(i - 1) % courses] if courses else "", ranks[i % 3]])
+            accounts.append((email, "professor"))
+        lw.writerows(hasher.rows(accounts, workers))
+
+        with open(paths["students"], "w", newline="", encoding="utf-8", buffering=BUFFER) as sf:
+            sw = csv.writer(sf)
+            sw.writerow(STUDENT_HEADER)
+            for start in range(1, students + 1, CHUNK):
+                ids = range(start, min(start + CHUNK, students + 1))
+                picks = rnd.choices(taught, cum_weights=cum, k=len(ids)) if taught else [""] * len(ids)
+                rows, accounts = [], []
+                for i, cid in zip(ids, picks):
+                    m = draw_marks(rnd, marks, mean, sd)
+                    email = f"student{i}@example.edu"
+                    rows.append([i, email, f"FN{i}", f"LN{i}", cid, letter(m), m])
+                    accounts.append((email, "student"))
+                sw.writerows(rows)
+                lw.writerows(hasher.rows(accounts, workers))
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="deterministic synthetic CheckMyGrade data")
+    parser.add_argument("directory")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--professors", type=int, default=100)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skew", type=float, default=0.0, help="Zipf exponent of course popularity")
+    parser.add_argument("--marks", choices=["normal", "uniform", "bimodal"], default="normal")
+    parser.add_argument("--mean", type=float, default=72.0)
+    parser.add_argument("--sd", type=float, default=12.0)
+    parser.add_argument("--hash-mode", choices=["shared", "pool", "unique"], default="shared")
+    parser.add_argument("--password", default="pw")
+    parser.add_argument("--iters", type=int, default=1000)
+    parser.add_argument("--pool", type=int, default=64, help="precomputed hashes for --hash-mode pool")
+    parser.add_argument("--workers", type=int, default=1, help="hashing threads for --hash-mode unique")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    paths = generate(args.directory, args.students, args.professors, args.courses, args.seed, args.skew, args.marks,
+                     args.mean, args.sd, args.hash_mode, args.password, args.iters, args.pool, args.workers)
+    size = sum(os.path.getsize(p) for p in paths.values())
+    elapsed = time.perf_counter() - t0
+    print(f"Wrote {args.students} students, {args.professors} professors, {args.courses} courses "
+          f"({size / 1e6:.1f} MB) to {args.directory} in {elapsed:.1f}s")
@@ -1,41 +1,297 @@
-from statistics import mean, median
+import csv, io, os, zlib
+from heapq import heapify, heappop, heappush
+from file_cache import file_signature
+from records import intern
+from safe_io import iter_snapshot
 '''The following code implements the required functionality for reports. 
-It stores all the grades in a list of dictionaries (basically a memory table). 
+It stores all the grades in a dictionary keyed by (student_id, course), one record dict per key (basically a memory table). 
 It performs the CRUD operations like add, delete and modify grade. 
 The statistics considered for the report are average, and median. 
 The class also has a helper function '_groupby' (internal method) that groups student_id and course, and validates. 
-Finally, the report is generated consisting of the stats (mean and median), and each row in the group. '''
+Finally, the report is generated consisting of the stats (mean and median), and each row in the group. 
+Alongside the records it keeps running aggregates (count, sum and two heaps for the median) for
+the whole table, per course and per student. The CRUD methods keep them up to date, so avg/med
+and the report stats are lookups instead of a pass over every record. 
+sync_students() loads grades from students.csv and, on later calls, applies only what changed. '''
+
+class RunningStats:
+    # The median comes from two heaps: `low` holds the lower half (negated, so its top is the
+    # largest) and `high` the upper half, with low never more than one longer. A removed grade
+    # is only noted in its heap's `gone` counts and popped once it reaches that heap's top, so
+    # add/remove are O(log n) and median() reads the two tops.
+    __slots__ = ("count", "total", "low", "high", "n_low", "n_high", "gone_low", "gone_high")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.low, self.high = [], []
+        self.n_low = self.n_high = 0  # live entries in each heap
+        self.gone_low = self.gone_high = None  # grade -> removed copies still in the heap, made on first use
+
+    def add(self, grade):
+        self.count += 1
+        self.total += grade
+        if not self.n_low or grade <= -self.low[0]:
+            heappush(self.low, -grade)
+            self.n_low += 1
+        else:
+            heappush(self.high, grade)
+            self.n_high += 1
+        self._balance()
+
+    # grade must be one that was added and not removed since
+    def remove(self, grade):
+        self.count -= 1
+        self.total -= grade
+        # every live grade in low is <= low's top <= every live grade in high
+        if self.n_low and grade <= -self.low[0]:
+            self.gone_low = self.gone_low or {}
+            self.gone_low[grade] = self.gone_low.get(grade, 0) + 1
+            self.n_low -= 1
+        else:
+            self.gone_high = self.gone_high or {}
+            self.gone_high[grade] = self.gone_high.get(grade, 0) + 1
+            self.n_high -= 1
+        self._balance()
+        if len(self.low) + len(self.high) > 2 * self.count + 64:
+            self._compact()
+
+    @staticmethod
+    def _prune(heap, gone, sign):
+        while heap and gone and gone.get(sign * heap[0]):
+            grade = sign * heappop(heap)
+            gone[grade] -= 1
+            if not gone[grade]:
+                del gone[grade]
+
+    def _balance(self):
+        self._prune(self.low, self.gone_low, -1)
+        self._prune(self.high, self.gone_high, 1)
+        if self.n_low > self.n_high + 1:
+            heappush(self.high, -heappop(self.low))
+            self.n_low -= 1
+            self.n_high += 1
+        elif self.n_high > self.n_low:
+            heappush(self.low, -heappop(self.high))
+            self.n_high -= 1
+            self.n_low += 1
+        else:
+            return
+        self._prune(self.low, self.gone_low, -1)
+        self._prune(self.high, self.gone_high, 1)
+
+    # drops removed grades that are buried in the heaps, so they stay O(live grades)
+    def _compact(self):
+        for heap, gone, sign in ((self.low, self.gone_low, -1), (self.high, self.gone_high, 1)):
+            kept = []
+            for v in heap:
+                if gone and gone.get(sign * v):
+                    gone[sign * v] -= 1
+                else:
+                    kept.append(v)
+            heapify(kept)
+            heap[:] = kept
+        self.gone_low = self.gone_high = None
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def median(self):
+        if not self.count:
+            return None
+        if self.count % 2:
+            return -self.low[0]
+        return (-self.low[0] + self.high[0]) / 2
+
+'''Keeps a grade table in step with students.csv (student_id, courses, marks).
+The first sync reads the whole file. Later syncs return at once when the file signature is
+unchanged. When the bytes already consumed are unchanged only the appended bytes are parsed;
+that is checked without re-reading them: the file must be the same one (inode) and no shorter,
+and the crc32 of the last TAIL_BLOCK bytes before the offset must match. Student appends in
+place and rewrites through a temp file (safe_io.atomic_write), which gives a new inode.
+Otherwise the file is diffed against the rows seen last time. Either way only the differences
+are applied to the grade table.
+Note this reads the base csv; pending entries of a Student mutation log are not included.
+`path` may also be a storage repository (storage.py); it has no file to watch, so every sync
+diffs all of its rows.
+With an enrolment store (enrolment.py) every enrolled (student, course) is its own grade, read
+through EnrolmentStore.expand; a change to either the students or the store diffs them all.'''
+TAIL_BLOCK = 64 * 1024  # consumed bytes whose crc is checked before an append-only sync
+
+class StudentsSync:
+    def __init__(self, path, enrolments=None):
+        self.path = path
+        self.enrolments = enrolments
+        self.signature = None
+        self.header = None
+        self.offset = 0     # bytes consumed so far
+        self.inode = None   # inode of the file they were read from
+        self.crc = 0        # crc32 of the last TAIL_BLOCK of those bytes
+        # student_id, or (student_id, course) with enrolments -> (course, marks) as last applied
+        self.rows = {}
+
+    # the last TAIL_BLOCK consumed bytes, or None when the file is not the one consumed so far
+    # (replaced, truncated or its tail rewritten); leaves f at the offset
+    def _consumed_tail(self, f, inode):
+        if not self.offset or inode != self.inode or os.fstat(f.fileno()).st_size < self.offset:
+            return None
+        f.seek(max(0, self.offset - TAIL_BLOCK))
+        block = f.read(self.offset - f.tell())
+        return block if zlib.crc32(block) == self.crc else None
+
+    def apply(self, grades):
+        if self.enrolments is not None:
+            return self._apply_enrolled(grades)
+        if not isinstance(self.path, str):
+            rows = ((r["student_id"], r["courses"], r["marks"]) for r in self.path.all())
+            return self._apply_rows(grades, rows, full=True)
+        sig = file_signature(self.path)
+        if sig == self.signature:
+            return 0
+        with open(self.path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            tail = self._consumed_tail(f, inode)
+            full = tail is None
+            if full:
+                f.seek(0)
+                tail = b""
+            data = f.read()
+        if full:
+            chunk = data
+        else:
+            # only consume complete lines; a half-written last line is picked up next time
+            chunk = data[:data.rfind(b"\n") + 1]
+        reader = csv.reader(io.StringIO(chunk.decode("utf-8"), newline=""))
+        if full:
+            self.header = next(reader, None) or []
+        h = self.header or []
+        if not all(c in h for c in ("student_id", "courses", "marks")):
+            return 0
+        sid_i, course_i, marks_i = h.index("student_id"), h.index("courses"), h.index("marks")
+        rows = ((row[sid_i], row[course_i], row[marks_i]) for row in reader if len(row) > max(sid_i, course_i, marks_i))
+        changes = self._apply_rows(grades, rows, full)
+
+        self.offset = (0 if full else self.offset) + len(chunk)
+        self.inode = inode
+        self.crc = zlib.crc32(chunk[-TAIL_BLOCK:] if len(chunk) >= TAIL_BLOCK else tail[len(chunk) - TAIL_BLOCK:] + chunk)
+        self.signature = sig if len(chunk) == len(data) else None
+        return changes
+
+    def _apply_enrolled(self, grades):
+        watched = isinstance(self.path, str)
+        sig = (file_signature(self.path) if watched else None, self.enrolments.current_signature())
+        if watched and sig == self.signature:
+            return 0
+        source = iter_snapshot(self.path, dicts=True) if watched else self.path.all()
+        rows = ((r["student_id"], r["courses"], r["marks"]) for r in self.enrolments.expand(source))
+        changes = self._apply_rows(grades, rows, full=True)
+        self.signature = sig
+        return changes
+
+    # rows: (student_id, course, raw marks); full=True means ids not in rows were removed
+    def _apply_rows(self, grades, rows, full):
+        seen = {}
+        for sid, course, marks in rows:
+            seen[sid if self.enrolments is None else (sid, course)] = (intern(course), parse_marks(marks or ""))
+        changes = 0
+        for key, value in seen.items():
+            changes += self._apply_row(grades, key, value)
+        if full:
+            for key in [k for k in self.rows if k not in seen]:
+                changes += self._apply_row(grades, key, None)
+        return changes
+
+    def _apply_row(self, grades, key, value):
+        sid = key if self.enrolments is None else key[0]
+        prev = self.rows.get(key)
+        if prev == value:
+            return 0
+        if prev is not None and prev[1] is not None and (value is None or value[0] != prev[0] or value[1] is None):
+            grades.delete_grade(sid, prev[0])
+        if value is None:
+            del self.rows[key]
+        else:
+            self.rows[key] = value
+            if value[1] is not None:
+                grades.add_grade(sid, value[0], value[1])  # upsert
+        return 1
+
+def parse_marks(raw):
+    try:
+        return float(raw.replace(",", "").strip()) # csv fields are always read as strings
+    except ValueError:
+        return None
+
 class GradeScale:
     def __init__(self):
-        self.records = []
+        self.records = {}  # (student_id, course) -> record
+        self._syncs = {}   # (path, id of the enrolment store) -> StudentsSync
+        self._all = RunningStats()
+        self._stats = {"student_id": {}, "course": {}}  # group key -> RunningStats
+
+    # ---- running aggregates ----
+    def _track(self, r, grade, add=True):
+        groups = [self._all,
+                  self._stats["student_id"].setdefault(r["student_id"], RunningStats()),
+                  self._stats["course"].setdefault(r["course"], RunningStats())]
+        for stats in groups:
+            if add:
+                stats.add(grade)
+            else:
+                stats.remove(grade)
+        for by in ("student_id", "course"):
+            if not self._stats[by][r[by]].count:
+                del self._stats[by][r[by]]
+
+    def stats(self, by=None, key=None):
+        if by is None:
+            return self._all
+        if by == "student":
+            by = "student_id"
+        return self._stats[by].get(key)
 
     # ---- CRUD ----
+    # adding a grade for a (student_id, course) that already has one replaces it
     def add_grade(self, student_id, course, grade):
-        self.records.append({"student_id": student_id, "course": course, "grade": grade})
+        r = self.records.get((student_id, course))
+        if r is not None:
+            self._track(r, r["grade"], add=False)
+            r["grade"] = grade
+        else:
+            r = self.records[(student_id, course)] = {"student_id": student_id, "course": course, "grade": grade}
+        self._track(r, grade)
 
-    # basically rebuilding the records, excluding the matched record
     def delete_grade(self, student_id, course):
-        self.records = [
-            r for r in self.records
-            if not (r["student_id"] == student_id and r["course"] == course)
-        ]
+        r = self.records.pop((student_id, course), None)
+        if r is not None:
+            self._track(r, r["grade"], add=False)
 
     def modify_grade(self, student_id, course, new_grade):
-        for r in self.records:
-            if r["student_id"] == student_id and r["course"] == course:
-                r["grade"] = new_grade
-                return True
+        r = self.records.get((student_id, course))
+        if r is not None:
+            self._track(r, r["grade"], add=False)
+            r["grade"] = new_grade
+            self._track(r, new_grade)
+            return True
         print(f"'{student_id} - {course}' not found.")
         return False
 
+    # Brings the table in line with students.csv; returns how many rows changed since last time.
+    # enrolments: an EnrolmentStore whose enrolments count as grades too (see StudentsSync)
+    def sync_students(self, path, enrolments=None):
+        sync = self._syncs.get((path, id(enrolments)))
+        if sync is None:
+            sync = self._syncs[(path, id(enrolments))] = StudentsSync(path, enrolments)
+        return sync.apply(self)
+
     # ---- Stats ----
     def avg(self, course=None):
-        g = [r["grade"] for r in self.records if course is None or r["course"] == course]
-        return round(mean(g), 2) if g else None
+        s = self._all if course is None else self._stats["course"].get(course)
+        return round(s.mean(), 2) if s and s.count else None
 
     def med(self, course=None):
-        g = [r["grade"] for r in self.records if course is None or r["course"] == course]
-        return round(median(g), 2) if g else None
+        s = self._all if course is None else self._stats["course"].get(course)
+        return round(s.median(), 2) if s and s.count else None
 
     # ---- Reports ----
     def _group(self, by): 
@@ -44,7 +300,7 @@ class GradeScale:
         if by not in {"student_id", "course"}:
             raise ValueError("Group by must be 'student_id' or 'course'")
         groups = {}
-        for r in self.records:
+        for r in self.records.values():
             groups.setdefault(r[by], []).append(r)
         return groups
 
@@ -62,9 +318,9 @@ class GradeScale:
 
         for key in sorted(groups, key=lambda k: (str(k).lower(), str(k))):
             rows = groups[key]
-            grades = [r["grade"] for r in rows]
-            a = round(mean(grades), 2)
-            m = round(median(grades), 2)
+            s = self._stats[by][key]
+            a = round(s.mean(), 2)
+            m = round(s.median(), 2)
             print(f"{key} -> avg: {a}, med: {m}")
             for r in sorted(rows, key=lambda x: (str(x["student_id"]).lower(), x["course"].lower())):
                 print(f"  {r['student_id']} | {r['course']} | {r['grade']}")
\ No newline at end of file
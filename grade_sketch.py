@@ -0,0 +1,146 @@
+import json, math
+
+'''Streaming distribution analytics for marks. A GradeSketch summarises any number of marks in
+constant memory: count, mean and variance (Welford), min/max and a fixed-bin histogram over
+[lo, hi]. Quantiles are read off the histogram with linear interpolation inside a bin, so the
+error is at most one bin width (1 mark with the defaults). Marks outside [lo, hi] go into the
+edge bins. Sketches with the same bins merge exactly, so shards can be summarised separately
+and combined, and they round-trip through plain dicts / JSON.
+CourseDistributions keeps one sketch per course.'''
+class GradeSketch:
+    def __init__(self, lo=0.0, hi=100.0, bins=100):
+        self.lo, self.hi, self.bins = float(lo), float(hi), int(bins)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.min = None
+        self.max = None
+        self.counts = [0] * self.bins
+
+    def _bin(self, x):
+        i = int((x - self.lo) / (self.hi - self.lo) * self.bins)
+        return min(max(i, 0), self.bins - 1)
+
+    def add(self, x):
+        x = float(x)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.counts[self._bin(x)] += 1
+
+    def merge(self, other):
+        if (self.lo, self.hi, self.bins) != (other.lo, other.hi, other.bins):
+            raise ValueError("Sketches must use the same bins to be merged")
+        if not other.count:
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.mean += delta * other.count / n
+        self.count = n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        return self
+
+    # population standard deviation
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else None
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        width = (self.hi - self.lo) / self.bins
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= target:
+                x = self.lo + width * (i + (target - seen) / c)
+                return min(max(x, self.min), self.max)
+            seen += c
+        return self.max
+
+    # coarser view of the histogram: [(bin_lo, bin_hi, count)]
+    def histogram(self, bins=10):
+        step = max(1, self.bins // bins)
+        width = (self.hi - self.lo) / self.bins
+        return [(self.lo + i * width, self.lo + min(i + step, self.bins) * width, sum(self.counts[i:i + step]))
+                for i in range(0, self.bins, step)]
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        out = {"count": self.count, "mean": round(self.mean, 2), "std": round(self.std(), 2),
+               "min": self.min, "max": self.max}
+        for q in (0.10, 0.25, 0.50, 0.75, 0.90):
+            out[f"p{int(q * 100)}"] = round(self.quantile(q), 2)
+        return out
+
+    def to_dict(self):
+        return {"lo": self.lo, "hi": self.hi, "bins": self.bins, "count": self.count, "mean": self.mean,
+                "m2": self.m2, "min": self.min, "max": self.max, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["lo"], d["hi"], d["bins"])
+        s.count, s.mean, s.m2, s.min, s.max = d["count"], d["mean"], d["m2"], d["min"], d["max"]
+        s.counts = list(d["counts"])
+        return s
+
+
+class CourseDistributions:
+    def __init__(self, lo=0.0, hi=100.0, bins=100):
+        self.lo, self.hi, self.bins = lo, hi, bins
+        self.sketches = {}  # course -> GradeSketch
+
+    def add(self, course, grade):
+        s = self.sketches.get(course)
+        if s is None:
+            s = self.sketches[course] = GradeSketch(self.lo, self.hi, self.bins)
+        s.add(grade)
+
+    # rows: (student_id, course, grade), e.g. grade_stream.iter_grade_rows(path); one pass
+    @classmethod
+    def from_rows(cls, rows, **bins):
+        d = cls(**bins)
+        for _, course, grade in rows:
+            d.add(course, grade)
+        return d
+
+    @classmethod
+    def from_grade_scale(cls, grades, **bins):
+        return cls.from_rows(((r["student_id"], r["course"], r["grade"]) for r in grades.records.values()), **bins)
+
+    def merge(self, other):
+        for course, s in other.sketches.items():
+            if course in self.sketches:
+                self.sketches[course].merge(s)
+            else:
+                self.sketches[course] = GradeSketch.from_dict(s.to_dict())
+        return self
+
+    def to_json(self):
+        return json.dumps({c: s.to_dict() for c, s in self.sketches.items()})
+
+    @classmethod
+    def from_json(cls, text):
+        d = cls()
+        for course, sd in json.loads(text).items():
+            d.sketches[course] = GradeSketch.from_dict(sd)
+            d.lo, d.hi, d.bins = sd["lo"], sd["hi"], sd["bins"]
+        return d
+
+    def display_distribution(self, course):
+        s = self.sketches.get(course)
+        if s is None or not s.count:
+            print(f"No marks recorded for {course}.")
+            return False
+        print(f"=== Distribution for {course} ===")
+        print(", ".join(f"{k}: {v}" for k, v in s.summary().items()))
+        top = max(c for _, _, c in s.histogram()) or 1
+        for lo, hi, c in s.histogram():
+            print(f"  {lo:5.1f}-{hi:5.1f} | {'#' * round(30 * c / top):<30} {c}")
+        return True
@@ -0,0 +1,155 @@
+import csv, heapq, json, tempfile
+from grade_scale import parse_marks
+from safe_io import iter_snapshot
+from records import intern
+
+'''Streaming version of GradeScale.display_grade_report for grade archives that do not fit in
+memory. Rows come in through a generator and are external-sorted twice in the same pass: once in
+report order and once by (group, marks). Up to `memory_budget` rows are buffered (half per sort),
+sorted and, if more input follows, spilled to a temp file as a sorted run; the runs are k-way
+merged at most `fan_in` at a time, in several passes when there are more, so the number of open
+files stays bounded too.
+The (group, marks) order is written to one more temp file that is read twice per group: once to
+count and sum it, once up to the middle for the median. Each group's avg/median line is then
+printed, followed by its rows as the report-order merge yields them. Peak memory is the buffers,
+whatever the input or group size.
+The output is the same as display_grade_report for the same rows.'''
+
+MAX_FAN_IN = 64  # sorted runs merged (files open) at once
+
+def iter_grade_rows(path, enrolments=None):
+    # (student_id, course, grade) for every students.csv row that has numeric marks;
+    # path may also be a storage repository (storage.py). With an enrolment store (enrolment.py)
+    # every enrolled course of a student is its own row.
+    if not isinstance(path, str):
+        rows = path.all()
+    else:
+        # snapshot read: writers in other sessions neither block the report nor show up half done
+        rows = iter_snapshot(path, dicts=True)
+    yield from _grade_rows(enrolments.expand(rows) if enrolments is not None else rows)
+
+def _grade_rows(rows):
+    for row in rows:
+        grade = parse_marks(row.get("marks") or "")
+        if grade is not None:
+            yield row["student_id"], intern(row["courses"]), grade
+
+def _report_key(by):
+    g = 0 if by == "student_id" else 1
+    return lambda r: (str(r[g]).lower(), str(r[g]), str(r[0]).lower(), r[1].lower())
+
+def _spill(rows):
+    run = tempfile.TemporaryFile("w+", newline="", encoding="utf-8")
+    csv.writer(run).writerows((sid, course, repr(grade)) for sid, course, grade in rows)
+    run.seek(0)
+    return run
+
+def _read_run(run):
+    for sid, course, grade in csv.reader(run):
+        yield sid, course, float(grade)
+
+def _group_key(by):
+    g = 0 if by == "student_id" else 1
+    return lambda r: (str(r[g]).lower(), str(r[g]), r[2])
+
+class _RunSorter:
+    # External sort: rows are buffered up to `budget`, then sorted and spilled as a run.
+    def __init__(self, key, budget, fan_in=MAX_FAN_IN):
+        self.key, self.budget, self.fan_in = key, max(1, budget), max(2, fan_in)
+        self.runs, self.buf = [], []
+
+    def add(self, row):
+        self.buf.append(row)
+        if len(self.buf) >= self.budget:
+            self.buf.sort(key=self.key)
+            self.runs.append(_spill(self.buf))
+            self.buf = []
+
+    # the rows in order. While there are more runs than fit in one merge, each pass merges
+    # neighbouring groups of fan_in runs into one; runs stay in input order, so equal keys
+    # keep their input order as in a single sort.
+    def __iter__(self):
+        self.buf.sort(key=self.key)
+        while len(self.runs) + 1 > self.fan_in:
+            runs, self.runs = self.runs, []
+            for i in range(0, len(runs), self.fan_in):
+                batch = runs[i:i + self.fan_in]
+                try:
+                    self.runs.append(_spill(heapq.merge(*[_read_run(run) for run in batch], key=self.key)))
+                finally:
+                    for run in batch:
+                        run.close()
+        return heapq.merge(*[_read_run(run) for run in self.runs], self.buf, key=self.key)
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs, self.buf = [], []
+
+def sorted_rows(rows, by="student_id", memory_budget=100_000, fan_in=MAX_FAN_IN):
+    sorter = _RunSorter(_report_key(by), memory_budget, fan_in)
+    try:
+        for r in rows:
+            sorter.add(r)
+        yield from sorter
+    finally:
+        sorter.close()
+
+# (group, avg, median) per group, in report group order. rows_by_marks is sorted by (group,
+# marks); it goes to a temp file that is read twice per group, so no group is held in memory.
+def _group_stats(rows_by_marks, g):
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as f:
+        for r in rows_by_marks:
+            f.write(json.dumps([r[g], r[2]]) + "\n")
+        f.seek(0)
+        start, line = 0, f.readline()
+        while line:
+            group = json.loads(line)[0]
+            n = total = 0
+            while line:
+                other, grade = json.loads(line)
+                if other != group:
+                    break
+                n += 1
+                total += grade
+                end, line = f.tell(), f.readline()
+            # second pass, up to the middle of the group
+            f.seek(start)
+            for _ in range((n - 1) // 2):
+                f.readline()
+            lo = json.loads(f.readline())[1]
+            hi = lo if n % 2 else json.loads(f.readline())[1]
+            yield group, total / n, (lo + hi) / 2
+            f.seek(end)
+            start, line = end, f.readline()
+
+def stream_grade_report(rows, by="student_id", memory_budget=100_000, fan_in=MAX_FAN_IN):
+    if by == "student": # Just in case there are any aliases
+        by = "student_id"
+    if by not in {"student_id", "course"}:
+        raise ValueError("Group by must be 'student_id' or 'course'")
+    g = 0 if by == "student_id" else 1
+
+    ordered = _RunSorter(_report_key(by), memory_budget // 2, fan_in)
+    by_marks = _RunSorter(_group_key(by), memory_budget // 2, fan_in)
+    stats = _group_stats(by_marks, g)
+    try:
+        for r in rows:
+            ordered.add(r)
+            by_marks.add(r)
+        current = None
+        for r in ordered:
+            if current is None:
+                print(f"=== Grade Report (by {by}) ===")
+            if r[g] != current:
+                current = r[g]
+                _, avg, med = next(stats)  # the two sorts list the groups in the same order
+                print(f"{current} -> avg: {round(avg, 2)}, med: {round(med, 2)}")
+            print(f"  {r[0]} | {r[1]} | {r[2]}")
+        if current is None:
+            print("=== Grade Report ===")
+            print("(no records)")
+    finally:
+        stats.close()
+        ordered.close()
+        by_marks.close()
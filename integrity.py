@@ -0,0 +1,126 @@
+from records import split_course_ids
+
+'''Referential integrity between the four tables:
+    students.courses, professors.course_id  ->  courses.course_id
+    login.Email                             ->  the student's / professor's email_address
+Foreign-key checks on writes look ids up in key sets that are read once and kept until the
+table's signature changes, so checking a course id costs a set lookup, not a scan of courses.csv.
+Deletes remove everything that hangs off the deleted rows in one pass per table, however many
+ids the batch holds: delete_students/delete_professors also drop the accounts' login rows, and
+delete_courses applies a policy to the students and professors that still name the course:
+ - "restrict": nothing is deleted while the course is referenced
+ - "cascade": the course id is taken off their rows; students and professors left without any
+   course are deleted, together with their login rows
+ - "set_null": the course id is taken off their rows, the rows stay
+With an enrolment store (see enrolment.py) its (student, course) rows are covered as well:
+they count as references under "restrict" and are dropped with their student or course.
+Works on a storage object (see storage.py): CsvStorage for the csv files or SqliteStorage.
+Each delete runs in one storage transaction, so on sqlite its changes to every table commit
+together; the enrolment store is a file of its own and is updated once that has committed.
+Student, Professor and Course run their checks and deletes through one when created with
+integrity=...  A Student in log mode compacts its log before a delete goes through here.'''
+
+POLICIES = ("restrict", "cascade", "set_null")
+
+class Integrity:
+    def __init__(self, storage, course_policy="restrict", enrolments=None):
+        if course_policy not in POLICIES:
+            raise ValueError(f"Unknown delete policy {course_policy}; use one of {', '.join(POLICIES)}")
+        self.storage = storage
+        self.course_policy = course_policy
+        self.enrolments = enrolments
+        self._keys = {}  # (table, column) -> (signature, set of values)
+
+    def keys(self, table, column=None):
+        repo = getattr(self.storage, table)
+        column = column or repo.key
+        sig = repo.signature()
+        cached = self._keys.get((table, column))
+        if cached is None or cached[0] != sig:
+            cached = sig, {r[column] for r in repo.all() if r.get(column)}
+            self._keys[(table, column)] = cached
+        return cached[1]
+
+    # ids in a courses / course_id value that are not in the courses table
+    def missing_courses(self, value):
+        known = self.keys("courses")
+        return [c for c in split_course_ids(str(value) if value is not None else "") if c not in known]
+
+    def check_courses(self, value):
+        missing = self.missing_courses(value)
+        if missing:
+            print(f"Unknown course id(s): {', '.join(missing)}. No record written.")
+            return False
+        return True
+
+    # ---- deletes ----
+    def _delete_accounts(self, table, ids):
+        with self.storage.transaction():
+            rows = getattr(self.storage, table).pop_many(ids)
+            emails = [r["email_address"] for r in rows if r.get("email_address")]
+            if emails:
+                self.storage.login.delete(emails)
+        return len(rows), len(emails)
+
+    # Returns (rows deleted, login rows deleted).
+    def delete_students(self, student_ids):
+        student_ids = list(student_ids)
+        counts = self._delete_accounts("students", student_ids)
+        if self.enrolments is not None:
+            self.enrolments.remove(student_ids=student_ids)
+        return counts
+
+    def delete_professors(self, professor_ids):
+        return self._delete_accounts("professors", professor_ids)
+
+    # Returns {table: rows deleted / "<table> unlinked": rows edited}, or None when the policy
+    # refused or none of the courses exist.
+    def delete_courses(self, course_ids, policy=None):
+        policy = policy or self.course_policy
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown delete policy {policy}; use one of {', '.join(POLICIES)}")
+        with self.storage.transaction():
+            ids = {str(c) for c in course_ids} & self.keys("courses")
+            if not ids:
+                print(f"No course found with ID {', '.join(str(c) for c in course_ids)}. Delete aborted.")
+                return None
+            refs = (("students", "courses"), ("professors", "course_id"))
+            counts = {}
+            if policy == "restrict":
+                for table, column in refs:
+                    n = sum(1 for r in getattr(self.storage, table).all() if ids.intersection(split_course_ids(r.get(column))))
+                    if n:
+                        counts[table] = n
+                n = sum(len(self.enrolments.roster(c)) for c in ids) if self.enrolments is not None else 0
+                if n:
+                    counts["enrolments"] = n
+                if counts:
+                    held = " and ".join(f"{n} {table}" for table, n in counts.items())
+                    print(f"Course {', '.join(sorted(ids))} is still referenced by {held}. Delete aborted.")
+                    return None
+            else:
+                emails = []
+                for table, column in refs:
+                    def unlink(row, column=column):
+                        current = split_course_ids(row.get(column))
+                        left = [c for c in current if c not in ids]
+                        if len(left) == len(current):
+                            return row
+                        if not left and table == "students" and self.enrolments is not None:
+                            # still enrolled elsewhere: the row takes over the latest other enrolment
+                            other = [e for e in self.enrolments.courses_of(row["student_id"]) if e[0] not in ids][-1:]
+                            if other:
+                                row[column], row["grade"], row["marks"] = other[0]
+                                return row
+                        if not left and policy == "cascade":
+                            if row.get("email_address"):
+                                emails.append(row["email_address"])
+                            return None
+                        row[column] = ";".join(left)
+                        return row
+                    counts[table], counts[f"{table} unlinked"] = getattr(self.storage, table).rewrite(unlink)
+                counts["login"] = self.storage.login.delete(emails) if emails else 0
+            counts["courses"] = self.storage.courses.delete(ids)
+        if policy != "restrict" and self.enrolments is not None:
+            counts["enrolments"] = self.enrolments.remove(course_ids=ids)
+        return counts
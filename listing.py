@@ -0,0 +1,76 @@
+import csv, itertools
+
+'''Paged listings. A page is (rows, next_cursor): up to `size` rows as dicts that pass the
+filters, and the cursor to pass back for the following page (None after the last one).
+ - csv files: the cursor is the byte offset just past the last row returned. A page seeks there
+   and parses rows only until it has `size` matches, so the first page of a million-row file
+   costs the same as the first page of a ten-row one. A cursor stays valid as long as the file
+   is not rewritten; appended rows simply show up on later pages.
+ - anything else (a storage repository, the rows of an in-memory index): the cursor is the
+   number of source rows already consumed.
+filters maps a column to the value it must equal, or to a predicate called with the value,
+e.g. {"courses": "C101", "marks": lambda m: m and float(m) >= 90}.'''
+
+def matches(row, filters):
+    for col, want in (filters or {}).items():
+        value = row.get(col)
+        if callable(want):
+            try:
+                if not want(value):
+                    return False
+            except (TypeError, ValueError):
+                return False
+        elif value != str(want):
+            return False
+    return True
+
+def csv_page(path, cursor=0, size=20, filters=None):
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8")]), None)
+        if not header:
+            return [], None
+        if cursor:
+            f.seek(cursor)
+        pos = f.tell()
+        def lines():
+            nonlocal pos
+            for line in f:
+                pos += len(line)
+                yield line.decode("utf-8")
+        rows = []
+        for values in csv.reader(lines()):
+            if not values:
+                continue
+            row = dict(zip(header, values))
+            if matches(row, filters):
+                rows.append(row)
+                if len(rows) == size:
+                    # more to come only if the file continues past this row
+                    return rows, pos if f.peek(1) else None
+        return rows, None
+
+# rows: an iterable of dicts; the cursor counts rows consumed from it
+def iter_page(rows, cursor=0, size=20, filters=None):
+    out = []
+    consumed = cursor
+    it = itertools.islice(rows, cursor, None)
+    for row in it:
+        consumed += 1
+        if matches(row, filters):
+            out.append(row)
+            if len(out) == size:
+                return out, consumed if next(it, None) is not None else None
+    return out, None
+
+def print_page(rows, next_cursor=None):
+    if not rows:
+        print("No matching records.")
+        return
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(r.get(c) or "")) for r in rows)) for c in columns]
+    widths = [min(w, 30) for w in widths]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for r in rows:
+        print("  ".join(str(r.get(c) or "")[:w].ljust(w) for c, w in zip(columns, widths)))
+    print(f"({len(rows)} rows{', more available' if next_cursor is not None else ', end of list'})")
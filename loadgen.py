@@ -0,0 +1,101 @@
+import argparse, asyncio, json, time
+
+'''Load generator for server.py. Opens `concurrency` keep-alive connections and sends
+`requests` requests in total, then reports throughput and latency percentiles.
+
+    python loadgen.py --path /courses --email student1@example.edu --password pw -c 50 -n 5000
+    python loadgen.py --login --email student1@example.edu --password pw -c 20 -n 500
+
+--login measures POST /login itself (PBKDF2 bound); otherwise one login up front provides the
+token for the GET requests, or pass --token (e.g. the admin token).'''
+
+async def request(reader, writer, method, path, token=None, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: loadgen\r\nContent-Length: {len(data)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    writer.write((head + "\r\n").encode("latin-1") + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    payload = json.loads(await reader.readexactly(length)) if length else None
+    return status, payload
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+async def worker(host, port, jobs, latencies, errors, make_request):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while jobs:
+            jobs.pop()
+            t0 = time.perf_counter()
+            try:
+                status, _ = await request(reader, writer, *make_request())
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                errors.append("connection")
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append(time.perf_counter() - t0)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def run(host="127.0.0.1", port=8080, path="/courses", requests=1000, concurrency=10,
+              email=None, password=None, token=None, login=False):
+    credentials = {"email": email, "password": password}
+    if login:
+        make_request = lambda: ("POST", "/login", None, credentials)
+    else:
+        if token is None and email:
+            reader, writer = await asyncio.open_connection(host, port)
+            status, payload = await request(reader, writer, "POST", "/login", body=credentials)
+            writer.close()
+            if status != 200:
+                raise SystemExit(f"Login failed: {payload}")
+            token = payload["token"]
+        make_request = lambda: ("GET", path, token)
+
+    jobs = list(range(requests))
+    latencies, errors = [], []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(host, port, jobs, latencies, errors, make_request) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {"requests": len(latencies), "errors": len(errors), "seconds": elapsed,
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": 1000 * percentile(latencies, 0.50) if latencies else None,
+            "p99_ms": 1000 * percentile(latencies, 0.99) if latencies else None}
+
+def report(r, label):
+    print(f"=== {label} ===")
+    print(f"requests: {r['requests']}  errors: {r['errors']}  time: {r['seconds']:.2f}s")
+    if r["requests"]:
+        print(f"throughput: {r['rps']:.1f} req/s  p50: {r['p50_ms']:.2f} ms  p99: {r['p99_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load generator for server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/courses")
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--token")
+    parser.add_argument("--login", action="store_true", help="measure POST /login instead of GET --path")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.host, args.port, args.path, args.requests, args.concurrency,
+                             args.email, args.password, args.token, args.login))
+    report(result, f"{'POST /login' if args.login else 'GET ' + args.path}, concurrency {args.concurrency}")
@@ -1,71 +1,314 @@
 # login.py
-import csv, hashlib, hmac, os
+import csv, hashlib, hmac, os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from file_cache import file_signature
+from safe_io import atomic_write, write_lock
+from session import Session
+from records import CredentialRecord
+
+CREDENTIAL_HEADER = ["Email", "Password", "Salt", "Role", "Iterations"]
+LEGACY_ITERS = 1000  # cost of rows written before login.csv had an Iterations column
+
+def row_iterations(user):
+    return int(user.get("Iterations") or LEGACY_ITERS)
+
+# module level so a process pool can pickle it
+def _hash_one(job):
+    password, iters = job
+    salt_hex = os.urandom(16).hex()
+    hashed = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), iters)
+    return salt_hex, hashed.hex()
 
 class LoginCredential:
-    def __init__(self, file_path: str, iters: int = 1000):
+    # workers > 1 spreads batch hashing over a pool; pbkdf2_hmac releases the GIL so threads
+    # already use several cores, processes are there for builds where it does not
+    # login() looks accounts up in an email-keyed index of login.csv that is rebuilt only when
+    # the file's (mtime, size) changes, with the last `cache_size` resolved records kept in an LRU.
+    # iters is the current hashing cost (see configured_iterations); each row stores the cost it
+    # was hashed with, and a successful login on a row below it queues a rehash that is written back in batches of
+    # `rehash_batch` (or on logout/flush_rehashes).
+    # storage (see storage.py) keeps the credentials in storage.login instead of the csv file;
+    # lookups then go to its email index rather than the in-memory one.
+    # One instance can be shared by threads: the index, the LRU and the rehash queue are guarded
+    # by a lock, while the hashing itself runs outside it.
+    def __init__(self, file_path: str, iters: int = 1000, workers: int = 1, use_processes: bool = False, cache_size: int = 4096,
+                 rehash_batch: int = 100, storage=None):
         self.file = file_path
+        self.repo = storage.login if storage is not None else None
         self.iters = iters
+        self.workers = workers
+        self.use_processes = use_processes
+        self.cache_size = cache_size
+        self.rehash_batch = rehash_batch
+        self._header = None
+        self._by_email = None      # email -> csv row (a CredentialRecord for the standard layout)
+        self._signature = None
+        self._recent = OrderedDict()  # email -> credential dict, most recently used last
+        self._pending = {}  # email -> (hash_hex, salt_hex, iters, verified hash_hex, verified salt_hex) to write back
+        self._lock = threading.RLock()
 
 
-    def encrypt_password(self, password, salt_hex):
+    def encrypt_password(self, password, salt_hex, iters=None):
         salt = bytes.fromhex(salt_hex)
-        hashed = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, self.iters)
+        hashed = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iters or self.iters)
         return hashed.hex()
     
-    def decrypt_password(self, entered_password, salt_hex, hashed_hex):
+    def decrypt_password(self, entered_password, salt_hex, hashed_hex, iters=None):
         salt = bytes.fromhex(salt_hex)
-        re_hash = hashlib.pbkdf2_hmac("sha256", entered_password.encode("utf-8"), salt, self.iters)
+        re_hash = hashlib.pbkdf2_hmac("sha256", entered_password.encode("utf-8"), salt, iters or self.iters)
         return hmac.compare_digest(re_hash.hex(), hashed_hex)
+
+    # Picks the iteration count whose verification takes about target_ms on this host.
+    # The time of one hash grows linearly with the count, so a timed probe is scaled up.
+    @staticmethod
+    def calibrate_iterations(target_ms=50, minimum=LEGACY_ITERS):
+        iters = 1000
+        while True:
+            t0 = time.perf_counter()
+            hashlib.pbkdf2_hmac("sha256", b"calibration", b"\x00" * 16, iters)
+            elapsed = time.perf_counter() - t0
+            if elapsed >= 0.02:  # long enough for the timer to be trustworthy
+                break
+            iters *= 2
+        iters = int(iters * (target_ms / 1000.0) / elapsed)
+        return max(minimum, round(iters, -3) or 1000)
+
+    # The cost new hashes use: $CHECKMYGRADE_ITERS when set, else the value saved in
+    # <login_file>.iters, else calibrated to this host once and saved there. Calibration gives a
+    # slightly different count on every run, so it is not redone at each start.
+    @staticmethod
+    def configured_iterations(login_file, target_ms=50):
+        env = os.environ.get("CHECKMYGRADE_ITERS")
+        if env:
+            return int(env)
+        path = login_file + ".iters"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            pass
+        iters = LoginCredential.calibrate_iterations(target_ms)
+        with atomic_write(path) as f:
+            f.write(f"{iters}\n")
+        return iters
         
+    # Salts and hashes a batch of passwords, returning (salt_hex, hash_hex) in input order.
+    def hash_passwords(self, passwords, workers=None, use_processes=None):
+        workers = self.workers if workers is None else workers
+        use_processes = self.use_processes if use_processes is None else use_processes
+        jobs = [(p, self.iters) for p in passwords]
+        if workers <= 1 or len(jobs) < 2:
+            return [_hash_one(job) for job in jobs]
+        pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool(max_workers=workers) as ex:
+            # map keeps input order; chunks keep per-task overhead small next to the hash itself
+            return list(ex.map(_hash_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    # Hashes and appends many accounts in one pass over login.csv.
+    # entries: iterable of (email, password, role). Returns the number of rows written.
+    def add_credentials(self, entries):
+        entries = list(entries)
+        hashes = self.hash_passwords([password for _, password, _ in entries])
+        rows = []
+        for (email, _, role), (salt_hex, pwd_hash) in zip(entries, hashes):
+            rows.append({
+                "Email": email,
+                "Password": pwd_hash,
+                "Salt": salt_hex,
+                "Role": role,
+                "Iterations": self.iters
+            })
+        if not rows:
+            return 0
+        if self.repo is not None:
+            return self.repo.insert(rows)
+        # the hashing above runs unlocked; only the header check and the append hold the lock
+        with write_lock(self.file):
+            header = self._file_header()
+            if "Iterations" not in header:
+                if self.iters == LEGACY_ITERS:
+                    for row in rows:
+                        del row["Iterations"]  # the old layout implies this cost
+                else:
+                    self._write_rows(self.csv_to_json(self.file))  # one-off migration to the new layout
+                    header = CREDENTIAL_HEADER
+            with open(self.file, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=header)
+                writer.writerows(rows)
+        return len(rows)
+
+    def _file_header(self):
+        if not os.path.exists(self.file) or os.path.getsize(self.file) == 0:
+            with open(self.file, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(CREDENTIAL_HEADER)
+            return CREDENTIAL_HEADER
+        with open(self.file, "r", newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None) or CREDENTIAL_HEADER
+
+    # rewrites login.csv in the current layout; rows without a cost get the legacy one.
+    # Callers hold write_lock(csv_file) across the read this rewrite is based on.
+    def _write_rows(self, users, csv_file=None):
+        csv_file = csv_file or self.file
+        for user in users:
+            user["Iterations"] = row_iterations(user)
+        with atomic_write(csv_file) as f:
+            writer = csv.DictWriter(f, fieldnames=CREDENTIAL_HEADER, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(users)
+
+    # ---- credential index ----
+    def _refresh(self):
+        sig = file_signature(self.file)
+        if self._by_email is not None and sig == self._signature:
+            return
+        by_email = {}
+        header = []
+        if sig[0] is not None:
+            with open(self.file, "r", newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                header = next(reader, None) or []
+                email_idx = header.index("Email") if "Email" in header else 0
+                # compact rows (see records.py) when the file has the standard layout
+                pack = CredentialRecord.pack_row if header == CREDENTIAL_HEADER else list
+                for row in reader:
+                    # the first row for an email wins, as in a top-down scan
+                    if row and row[email_idx] not in by_email:
+                        by_email[row[email_idx]] = pack(row)
+        self._header = header
+        self._by_email = by_email
+        self._signature = sig
+        self._recent.clear()
+
+    def get_credential(self, email):
+        if self.repo is not None:
+            return self.repo.find_one("Email", email)
+        with self._lock:
+            return self._cached_credential(email)
+
+    def _cached_credential(self, email):
+        self._refresh()
+        record = self._recent.get(email)
+        if record is not None:
+            self._recent.move_to_end(email)
+            return record
+        row = self._by_email.get(email)
+        if row is None:
+            return None
+        record = dict(zip(self._header, row))
+        self._recent[email] = record
+        if len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+        return record
+
     # It's simpler to work with json that csv. Creating helper functions for this purpose
     def csv_to_json(self, csv_file):
         with open(csv_file, "r", newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f)
-            return list(reader)
+            return [CredentialRecord.intern_dict(row) for row in reader]
     def json_to_csv(self, json_data, csv_file):
         if not json_data:
             return
         with open(csv_file, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=[json_data[0].keys()])
+            writer = csv.DictWriter(f, fieldnames=list(json_data[0].keys()))
             writer.writeheader()
             writer.writerows(json_data)
         
-    def login(self,email, password):
-        users = self.csv_to_json(self.file)
-        if not users:
+    # Returns a Session (role + the user's resolved rows) or None. Pass the Student, Professor
+    # and Course objects to have the session resolve the user's rows up front.
+    def login(self,email, password, students=None, profs=None, courses=None):
+        with self._lock:
+            user = self.get_credential(email)
+            if user is None:
+                return None
+            stored_password = user.get("Password")
+            salt_hex = user.get("Salt", "")
+            role = user.get("Role")
+            iters = row_iterations(user)
+
+        if not self.decrypt_password(password, salt_hex, stored_password, iters):
             return None
-        
-        for user in users:
-            if user.get("Email") == email:
-                stored_password = user.get("Password")
-                salt_hex = user.get("Salt", "")
-                role = user.get("Role")
-                
-                if self.decrypt_password(password, salt_hex, stored_password):
-                    return role
-                else:
-                    return None
-                
-        return None
-    
+        # only upgrades: a row hashed at a higher cost than ours is left as it is
+        if iters < self.iters and email not in self._pending:
+            self._queue_rehash(user, password)
+        return Session(email, role).resolve(students, profs, courses)
+
+    # ---- transparent rehash ----
+    def _queue_rehash(self, user, password):
+        new_salt_hex = os.urandom(16).hex()
+        new_hash = self.encrypt_password(password, new_salt_hex)
+        with self._lock:
+            if user["Email"] in self._pending or row_iterations(user) >= self.iters:
+                return  # another thread got there first
+            self._pending[user["Email"]] = (new_hash, new_salt_hex, self.iters, user.get("Password"), user.get("Salt"))
+            # the cached record moves to the new hash right away; the file still holds the old,
+            # equally valid one until the batch is flushed
+            user.update({"Password": new_hash, "Salt": new_salt_hex, "Iterations": str(self.iters)})
+            full = len(self._pending) >= self.rehash_batch
+        if full:
+            self.flush_rehashes()
+
+    # A rehash is written only if the row still holds the hash the password was verified
+    # against; a password changed elsewhere in the meantime is left alone.
+    def flush_rehashes(self):
+        # the queue is taken under the lock, the write happens outside it
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        if self.repo is not None:
+            return self.repo.update_many({email: {"Password": h, "Salt": salt, "Iterations": it}
+                                          for email, (h, salt, it, _, _) in pending.items()}, "Email",
+                                         expected={email: {"Password": old, "Salt": old_salt}
+                                                   for email, (_, _, _, old, old_salt) in pending.items()})
+        with write_lock(self.file):
+            users = self.csv_to_json(self.file)
+            seen, done = set(), 0
+            for user in users:
+                email = user.get("Email")
+                if email in pending and email not in seen:
+                    seen.add(email)
+                    new_hash, new_salt, iters, old, old_salt = pending[email]
+                    if (user.get("Password"), user.get("Salt")) == (old, old_salt):
+                        user["Password"], user["Salt"], user["Iterations"] = new_hash, new_salt, iters
+                        done += 1
+            if done:
+                self._write_rows(users)
+        return done
+
     def logout(self):
+        self.flush_rehashes()
         return True
     def change_password(self, file, email, old_password, new_password):
-        users = self.csv_to_json(file)
-        if not users:
-            return False
+        # csv: the lock covers read, verify and rewrite so a concurrent change is never lost
+        with (nullcontext() if self.repo is not None else write_lock(file)):
+            if self.repo is not None:
+                user = self.repo.find_one("Email", email)
+                users = [user] if user else []
+            else:
+                users = self.csv_to_json(file)
+            if not users:
+                return False
         
-        for user in users:
-            if user.get("Email") == email:
-                stored_password = user.get("Password")
-                salt_hex = user.get("Salt")
-                if not (salt_hex and stored_password and self.decrypt_password(old_password, salt_hex, stored_password)):
-                    return False
-                new_salt_hex = os.urandom(16).hex()
-                new_hash = self.encrypt_password(new_password, new_salt_hex)
-                user["Password"] = new_hash
-                user["Salt"] = new_salt_hex
-
-                self.json_to_csv(users, file)
+            for user in users:
+                if user.get("Email") == email:
+                    stored_password = user.get("Password")
+                    salt_hex = user.get("Salt")
+                    if not (salt_hex and stored_password and self.decrypt_password(old_password, salt_hex, stored_password, row_iterations(user))):
+                        return False
+                    new_salt_hex = os.urandom(16).hex()
+                    new_hash = self.encrypt_password(new_password, new_salt_hex)
+                    user["Password"] = new_hash
+                    user["Salt"] = new_salt_hex
+                    user["Iterations"] = self.iters
+
+                    if self.repo is not None:
+                        self.repo.update(email, {"Password": new_hash, "Salt": new_salt_hex, "Iterations": self.iters}, "Email")
+                    else:
+                        self._write_rows(users, file)
+                    with self._lock:
+                        self._pending.pop(email, None)
+                    return True
 
         return False
@@ -0,0 +1,259 @@
+import functools, inspect, json, sys, threading, time
+from bisect import bisect_left
+
+'''Opt-in instrumentation of the hot paths. enable() replaces every public method of Student,
+Professor, Course, GradeScale and LoginCredential with a timing wrapper, and puts a counting
+`open` into the globals of the modules that do their file I/O. Per operation
+("Student.add_new_student", ...) it records:
+ - calls, errors and a latency histogram (Prometheus style buckets, seconds)
+ - file opens, bytes read/written (characters for text files) and rows scanned (lines read)
+   by the call and everything it calls
+disable() puts the original methods and the builtin open back, so when instrumentation is off
+there is no wrapper left on any call path.
+
+    import metrics
+    metrics.enable()
+    ...
+    print(metrics.to_prometheus())      # or metrics.to_json(), metrics.display()
+
+checkMyGrade.py enables it at startup when CHECKMYGRADE_METRICS=1 is set, and admin menu 17
+shows and dumps the numbers.'''
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TARGETS = [("student", "Student"), ("professor", "Professor"), ("course", "Course"),
+           ("grade_scale", "GradeScale"), ("login", "LoginCredential")]
+# modules whose `open` calls are counted
+IO_MODULES = ["student", "professor", "course", "grade_scale", "login", "student_index", "safe_io",
+              "storage", "grade_stream", "listing", "relations"]
+
+
+class OpStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.opens = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.rows = 0
+
+    def observe(self, seconds, failed):
+        self.calls += 1
+        self.errors += failed
+        self.seconds += seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    # upper bound of the bucket holding the q-quantile
+    def quantile(self, q):
+        if not self.calls:
+            return None
+        seen = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += count
+            if seen >= q * self.calls:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        # p50_le / p99_le: bucket bounds in seconds, None past the last bucket
+        bound = lambda q: None if self.quantile(q) == float("inf") else self.quantile(q)
+        return {"calls": self.calls, "errors": self.errors, "seconds": self.seconds,
+                "mean_ms": 1000 * self.seconds / self.calls if self.calls else None,
+                "p50_le": bound(0.5), "p99_le": bound(0.99),
+                "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.buckets)),
+                "file_opens": self.opens, "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written, "rows_scanned": self.rows}
+
+
+_ops = {}                       # operation name -> OpStats
+_lock = threading.Lock()
+_local = threading.local()      # per thread: stack of the OpStats of the calls in progress
+_patched = []                   # (owner, attribute, original or None)
+
+
+def _active():
+    stack = getattr(_local, "stack", None)
+    return list(dict.fromkeys(stack)) if stack else []
+
+
+class _CountingFile:
+    # Wraps a file object and adds its traffic to every operation that was running when it was opened.
+    def __init__(self, f, ops):
+        self._f = f
+        self._ops = ops
+        self._newline = b"\n" if "b" in getattr(f, "mode", "") else "\n"
+
+    def _count(self, data, read=True):
+        n = len(data)
+        rows = data.count(self._newline) if read else 0
+        with _lock:
+            for s in self._ops:
+                if read:
+                    s.bytes_read += n
+                    s.rows += rows
+                else:
+                    s.bytes_written += n
+        return data
+
+    def read(self, *args):
+        return self._count(self._f.read(*args))
+
+    def readline(self, *args):
+        return self._count(self._f.readline(*args))
+
+    def readlines(self, *args):
+        lines = self._f.readlines(*args)
+        for line in lines:
+            self._count(line)
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._count(next(self._f))
+
+    def write(self, data):
+        self._count(data, read=False)
+        return self._f.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._f.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def _counting_open(*args, **kwargs):
+    f = open(*args, **kwargs)
+    ops = _active()
+    if not ops:
+        return f
+    with _lock:
+        for s in ops:
+            s.opens += 1
+    return _CountingFile(f, ops)
+
+
+def _wrap(name, fn):
+    with _lock:
+        stats = _ops.setdefault(name, OpStats())
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(stats)
+        failed = True
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - t0
+            stack.pop()
+            with _lock:
+                stats.observe(elapsed, failed)
+    return timed
+
+
+def enabled():
+    return bool(_patched)
+
+
+def enable():
+    if _patched:
+        return False
+    for module_name, class_name in TARGETS:
+        cls = getattr(__import__(module_name), class_name)
+        for attr, value in list(vars(cls).items()):
+            # plain public methods only; properties, static/class methods and class attributes
+            # such as Student.record (a class, callable but not a method) are left alone
+            if attr.startswith("_") or not inspect.isfunction(value):
+                continue
+            _patched.append((cls, attr, value))
+            setattr(cls, attr, _wrap(f"{class_name}.{attr}", value))
+    for module_name in IO_MODULES:
+        module = sys.modules.get(module_name) or __import__(module_name)
+        if "open" not in vars(module):
+            _patched.append((module, "open", None))
+            module.open = _counting_open
+    return True
+
+
+def disable():
+    if not _patched:
+        return False
+    for owner, attr, original in reversed(_patched):
+        if original is None:
+            delattr(owner, attr)
+        else:
+            setattr(owner, attr, original)
+    _patched.clear()
+    return True
+
+
+def reset():
+    # the wrappers hold on to their OpStats, so they are cleared in place
+    with _lock:
+        for s in _ops.values():
+            s.__init__()
+
+
+def snapshot():
+    with _lock:
+        return {name: s.to_dict() for name, s in sorted(_ops.items()) if s.calls}
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2)
+
+
+def to_prometheus(prefix="checkmygrade"):
+    data = snapshot()
+    out = []
+    def family(name, kind, help_text, values):
+        out.append(f"# HELP {prefix}_{name} {help_text}")
+        out.append(f"# TYPE {prefix}_{name} {kind}")
+        for op, value in values:
+            out.append(f'{prefix}_{name}{{op="{op}"}} {value}')
+    family("calls_total", "counter", "Calls per operation.", [(op, d["calls"]) for op, d in data.items()])
+    family("errors_total", "counter", "Calls that raised.", [(op, d["errors"]) for op, d in data.items()])
+    out.append(f"# HELP {prefix}_latency_seconds Call latency.")
+    out.append(f"# TYPE {prefix}_latency_seconds histogram")
+    for op, d in data.items():
+        cumulative = 0
+        for le, count in d["buckets"].items():
+            cumulative += count
+            out.append(f'{prefix}_latency_seconds_bucket{{op="{op}",le="{le}"}} {cumulative}')
+        out.append(f'{prefix}_latency_seconds_sum{{op="{op}"}} {d["seconds"]}')
+        out.append(f'{prefix}_latency_seconds_count{{op="{op}"}} {d["calls"]}')
+    family("file_opens_total", "counter", "Files opened.", [(op, d["file_opens"]) for op, d in data.items()])
+    family("read_bytes_total", "counter", "Bytes read (characters for text files).", [(op, d["bytes_read"]) for op, d in data.items()])
+    family("written_bytes_total", "counter", "Bytes written (characters for text files).", [(op, d["bytes_written"]) for op, d in data.items()])
+    family("rows_scanned_total", "counter", "Lines read from files.", [(op, d["rows_scanned"]) for op, d in data.items()])
+    return "\n".join(out) + "\n"
+
+
+def display():
+    data = snapshot()
+    if not data:
+        print("No calls recorded." if enabled() else "Instrumentation is off.")
+        return False
+    print(f"{'operation':<42}{'calls':>8}{'mean ms':>10}{'p99 <=':>9}{'opens':>8}{'rows':>10}{'read':>12}{'written':>12}")
+    for op, d in data.items():
+        p99 = "inf" if d["p99_le"] is None else f"{d['p99_le'] * 1000:g}ms"
+        print(f"{op:<42}{d['calls']:>8}{d['mean_ms']:>10.3f}{p99:>9}{d['file_opens']:>8}{d['rows_scanned']:>10}"
+              f"{d['bytes_read']:>12}{d['bytes_written']:>12}")
+    return True
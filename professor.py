@@ -1,132 +1,155 @@
-import csv, os, json
+import csv, json
 from user import User
-from login import LoginCredential
+from login import LEGACY_ITERS, LoginCredential
+from listing import print_page
+from safe_io import iter_snapshot
+from relations import Relations
+from records import ProfessorRecord
+from storage import PROFESSOR_HEADER, CsvRepository
 
 class Professor:
-    def __init__(self, file_path):
+    record = ProfessorRecord  # repeated columns of the rows it reads are interned (see records.py)
+
+    # All reads and writes go through a repository (see storage.py): storage.professors when a
+    # storage is given, otherwise a CsvRepository over file_path.
+    # integrity (see integrity.py) checks course ids on writes and deletes login rows with professors
+    # iters is the PBKDF2 cost the login rows of new professors are hashed with (see login.py)
+    # enrolments (see enrolment.py) adds the store's enrolments to rosters and students lists
+    def __init__(self, file_path, storage=None, integrity=None, iters=LEGACY_ITERS, enrolments=None):
         self.file = file_path
+        self.iters = iters
+        self.enrolments = enrolments
+        self.storage = storage
+        self.integrity = integrity
+        if storage is not None:
+            self.repo = storage.professors
+        else:
+            self.repo = CsvRepository(file_path, PROFESSOR_HEADER, "professor_id", ProfessorRecord)
+        self._relations = {}  # sources -> Relations
+
+    # writers hold the repository's lock for the whole read-check-write cycle (for the csv file
+    # that is <file>.lock, see safe_io.py)
+    def _write_lock(self):
+        return self.repo.lock()
+
+    # Cached professor/course/student joins (see relations.py), one per set of files.
+    def relations(self, courses_csv, students_csv=None, professors_csv=None):
+        if self.storage is not None:
+            key = ("storage", students_csv is not None)
+            sources = (self.repo, self.storage.courses, self.storage.students if students_csv else None)
+        else:
+            key = sources = (professors_csv or self.file, courses_csv, students_csv)
+        if key not in self._relations:
+            self._relations[key] = Relations(*sources, enrolments=self.enrolments)
+        return self._relations[key]
 
     def csv_to_json(self, csv_file):
-        with open(csv_file, "r", newline="", encoding="utf-8") as f:
-            return list(csv.DictReader(f))
+        return [ProfessorRecord.intern_dict(row) for row in iter_snapshot(csv_file, dicts=True)]
+
+    def find_professor(self, professor_id):
+        return self.repo.get(professor_id)
+
+    def find_by_email(self, email):
+        return self.repo.find_one("email_address", email)
+
+    # ---- paged listing (see listing.py) ----
+    def list_professors(self, cursor=0, size=20, filters=None):
+        return self.repo.page(cursor, size, filters)
+
+    def display_page(self, cursor=0, size=20, filters=None):
+        rows, next_cursor = self.list_professors(cursor, size, filters)
+        print_page(rows, next_cursor)
+        return next_cursor
 
     def display_professors(self):
-        with open(self.file, 'r', newline='') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                            print(row)
+        # csv: a lock-free snapshot, a concurrent rewrite or append is never seen half done
+        print(self.repo.columns)
+        for row in self.repo.all():
+            print(list(row.values()))
 
     def add_new_professor(self, login_csv, user: User, password, c_id, rank = None):
         exists = False
-        with open(self.file, "r", newline="", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                header = next(reader, None)
-
-                id_idx = 0
-                if header and "professor_id" in header:
-                    id_idx = header.index("professor_id")
-
-                for row in reader:
-                    if row and row[id_idx] == str(user.user_id):
-                            exists = True
-                            break
-                    
-        if exists:
-                print(f"Professor ID {user.user_id} already exists. No record added.")
-                return False
-        with open(self.file, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([user.user_id, user.email_address, user.first_name, user.last_name, c_id, rank if rank is not None else ""])
-                    print(f"Professor {user.first_name} added successfully!")
-
-        salt_hex = os.urandom(16).hex()
-        lc = LoginCredential(login_csv)
-        pwd_hash = lc.encrypt_password(password, salt_hex)
-
-        with open(login_csv, "a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["Email", "Password", "Salt", "Role"])
-            writer.writerow({
-                "Email": user.email_address,
-                "Password": pwd_hash,
-                "Salt": salt_hex,
-                "Role": "professor"
-            })
+        if self.integrity is not None and not self.integrity.check_courses(c_id):
+            return False
+        new_row = [user.user_id, user.email_address, user.first_name, user.last_name, c_id, rank if rank is not None else ""]
+        with self._write_lock():
+            exists = self.repo.get(user.user_id) is not None
+            if exists:
+                    print(f"Professor ID {user.user_id} already exists. No record added.")
+                    return False
+            self.repo.insert([dict(zip(self.repo.columns, new_row))])
+            print(f"Professor {user.first_name} added successfully!")
+
+        LoginCredential(login_csv, iters=self.iters, storage=self.storage).add_credentials([(user.email_address, password, "professor")])
 
         print(f"Professor {user.first_name} added successfully!")
         return True
 
-    def delete_professor(self, professor_id):
-        with open(self.file, 'r', newline='', encoding='utf-8') as f:
-            rows = list(csv.reader(f))
-
-        idx_to_delete = None
-        for i in range(1, len(rows)):
-            if rows[i] and rows[i][0] == str(professor_id):
-                idx_to_delete = i
-                break
+    # Same contract as Student.add_students_bulk, for rows laid out like professors.csv.
+    # Returns (accepted, rejected).
+    def add_professors_bulk(self, login_csv, records, password=None, workers=1):
+        if isinstance(records, str):
+            with open(records, "r", newline="", encoding="utf-8") as f:
+                return self.add_professors_bulk(login_csv, csv.DictReader(f), password, workers)
+
+        with self._write_lock():
+            records = list(records)
+            seen = self.repo.existing_keys(str(r.get("professor_id") or "").strip() for r in records)
+
+            new_rows, accounts = [], []
+            rejected = 0
+            for rec in records:
+                pid = str(rec.get("professor_id") or "").strip()
+                if not pid or pid in seen or (self.integrity is not None and self.integrity.missing_courses(rec.get("course_id"))):
+                    rejected += 1
+                    continue
+                seen.add(pid)
+                new_rows.append([pid, rec.get("email_address") or "", rec.get("first_name") or "", rec.get("last_name") or "",
+                                 rec.get("course_id") or "", rec.get("rank") or ""])
+                accounts.append((rec.get("email_address") or "", rec.get("password") or password or "", "professor"))
 
-        if idx_to_delete is None:
-            print(f"No professor found with ID {professor_id}. Delete aborted.")
-            return False 
+            if new_rows:
+                self.repo.insert(dict(zip(self.repo.columns, row)) for row in new_rows)
+        if new_rows:
+            LoginCredential(login_csv, iters=self.iters, workers=workers, storage=self.storage).add_credentials(accounts)
 
-        # Remove the row and write back
-        del rows[idx_to_delete]
-        with open(self.file, 'w', newline='', encoding='utf-8') as f:
-            csv.writer(f).writerows(rows)
+        print(f"Bulk import: {len(new_rows)} professors added, {rejected} rejected.")
+        return len(new_rows), rejected
 
+    def delete_professor(self, professor_id):
+        if self.integrity is not None:
+            if not self.integrity.delete_professors([professor_id])[0]:
+                print(f"No professor found with ID {professor_id}. Delete aborted.")
+                return False
+            print("Professor deleted successfully!")
+            return True
+        if not self.repo.delete([professor_id]):
+            print(f"No professor found with ID {professor_id}. Delete aborted.")
+            return False
         print("Professor deleted successfully!")
         return True
 
     def modify_professor_details(self, user: User, c_id= None, rank=None):
-        rows = []
-        found = False
-
-        with open(self.file, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if row and row[0] == "professor_id":
-                    rows.append(row)
-                    continue
-
-                if row and row[0] == str(user.user_id):
-                    row[1] = user.email_address or row[1]
-                    row[2] = user.first_name or row[2]
-                    row[3] = user.last_name or row[3]
-                    if c_id is not None:
-                        row[4] = c_id       
-                    if rank is not None:
-                        row[5] = rank  
-                    found = True
-
-                rows.append(row)
-
-        if not found:
-            print(f"No professor found with ID {user.user_id}. Update skipped.")
+        if c_id is not None and self.integrity is not None and not self.integrity.check_courses(c_id):
             return False
-
-        with open(self.file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerows(rows)
-
+        fields = {k: v for k, v in (("email_address", user.email_address), ("first_name", user.first_name),
+                                    ("last_name", user.last_name)) if v}
+        if c_id is not None:
+            fields["course_id"] = c_id
+        if rank is not None:
+            fields["rank"] = rank
+        with self._write_lock():
+            if self.repo.get(user.user_id) is None:
+                print(f"No professor found with ID {user.user_id}. Update skipped.")
+                return False
+            if fields:
+                self.repo.update(user.user_id, fields)
         print("Professor record updated successfully!")
         return True
 
     def show_course_details_by_professor(self, professors_csv, courses_csv, professor_id):
-        profs   = self.csv_to_json(professors_csv)
-        courses = self.csv_to_json(courses_csv)
-
-        course_by_id = {}
-        for c in courses:
-            key = c.get("course_id")
-            if key is not None:
-                course_by_id[key] = c
-
-        prof = None
-        for p in profs:
-            if p.get("professor_id") == str(professor_id):
-                prof = p
-                break
-
+        rel = self.relations(courses_csv, professors_csv=professors_csv)
+        prof = rel.professor(professor_id)
         if prof is None:
             print(f"No professor found with ID {professor_id}.")
             return False
@@ -137,10 +160,44 @@ class Professor:
 
         cid = (prof.get("course_id") or "").strip()
         print("Matching course:")
-        if cid and cid in course_by_id:
-            print(json.dumps(course_by_id[cid], indent=2))
+        if cid and rel.course(cid) is not None:
+            print(json.dumps(rel.course(cid), indent=2))
         elif cid:
             print(f"No course found with course_id = {cid}")
         else:
             print("Professor has no course id.")
-        return True
\ No newline at end of file
+        return True
+
+    def show_course_teachers(self, courses_csv, course_id):
+        profs = self.relations(courses_csv).teachers_of(course_id)
+        if not profs:
+            print(f"No professor teaches {course_id}.")
+            return False
+        print(f"{course_id} is taught by:")
+        for p in profs:
+            print(f"  {p['professor_id']} {p['first_name']} {p['last_name']} ({p['email_address']})")
+        return True
+
+    def show_course_roster(self, students_csv, courses_csv, course_id):
+        students = self.relations(courses_csv, students_csv).roster(course_id)
+        if not students:
+            print(f"No students enrolled in {course_id}.")
+            return False
+        print(f"Roster for {course_id} ({len(students)} students):")
+        for r in students:
+            print(f"  {r['student_id']} {r['first_name']} {r['last_name']}: {r['grade']} ({r['marks']})")
+        return True
+
+    def show_my_students(self, students_csv, courses_csv, professor_id):
+        rel = self.relations(courses_csv, students_csv)
+        if rel.professor(professor_id) is None:
+            print(f"No professor found with ID {professor_id}.")
+            return False
+        students = rel.students_of(professor_id)
+        if not students:
+            print(f"No students enrolled in the courses of {professor_id}.")
+            return False
+        print(f"Students of {professor_id} ({len(students)}):")
+        for r in students:
+            print(f"  {r['student_id']} {r['first_name']} {r['last_name']} [{r['courses']}]: {r['grade']} ({r['marks']})")
+        return True
@@ -0,0 +1,149 @@
+import sys
+
+'''Compact in-memory rows. A csv.reader list or DictReader dict costs a container plus one
+string object per column, and every repeated value (course id, grade, marks, rank, role) is
+another copy. The record classes here keep a row in one __slots__ object with a slot per column:
+ - the values that are unique per row (ids, names, emails, hashes) are stored as they are
+ - the repeated values go through intern(), so a million rows share one "C101" and one "A"
+A record reads like the row it came from: record[i] and iteration follow the csv column order
+(csv.writer can write it back), record["marks"] / record.get("marks") follow the header, and
+attributes (record.first_name) work for every column. as_dict() gives the DictReader form.
+Records are read-only; a change is a new record (Class.from_row(edited list)). Readers that
+hand out editable dicts still intern the repeated columns with Class.intern_dict(row).
+The field tuples match STUDENT_HEADER, PROFESSOR_HEADER, COURSE_HEADER and CREDENTIAL_HEADER.
+bench_memory.py measures the footprint against lists and dicts.'''
+
+def intern(value):
+    if type(value) is str:
+        return sys.intern(value)
+    return sys.intern(str(value) if value is not None else "")
+
+# Interns the given columns of a list row in place (for loaders that keep plain lists).
+def intern_row(row, positions):
+    for i in positions:
+        if i < len(row):
+            row[i] = intern(row[i])
+    return row
+
+# the courses column normally holds one id; ';' separates several
+def split_course_ids(value):
+    return [c.strip() for c in (value or "").split(";") if c.strip()]
+
+
+class Record:
+    __slots__ = ()
+    FIELDS = ()          # column order, as in the csv; each subclass has a slot per field
+    UNIQUE = ()          # per-row values, stored as given; the others are interned
+
+    def __init_subclass__(cls):
+        cls._getters = tuple(getattr(cls, name).__get__ for name in cls.FIELDS)  # the slot descriptors
+        cls._setters = tuple((getattr(cls, name).__set__, name in cls.UNIQUE) for name in cls.FIELDS)
+        cls._position = {name: i for i, name in enumerate(cls.FIELDS)}
+        cls.SHARED = tuple(name for name in cls.FIELDS if name not in cls.UNIQUE)
+
+    # values in FIELDS order; missing trailing values are empty
+    def __init__(self, *values):
+        if len(values) < len(self.FIELDS):
+            values += ("",) * (len(self.FIELDS) - len(values))
+        for (set_slot, unique), value in zip(self._setters, values):
+            if not unique:
+                value = intern(value)
+            elif type(value) is not str:
+                value = "" if value is None else str(value)
+            set_slot(self, value)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    # a record for a list row laid out like FIELDS, or the row itself (with its repeated
+    # columns interned) when it does not fit one
+    @classmethod
+    def pack_row(cls, row):
+        if len(row) == len(cls.FIELDS):
+            return cls(*row)
+        return intern_row(list(row), [cls._position[n] for n in cls.SHARED])
+
+    # the same for a DictReader / repository dict row
+    @classmethod
+    def pack_dict(cls, row):
+        if len(row) == len(cls.FIELDS) and all(name in row for name in cls.FIELDS):
+            return cls(*(row[name] for name in cls.FIELDS))
+        return cls.intern_dict(row)
+
+    # interns the repeated columns of a dict row in place, for readers that hand out (and may
+    # edit) plain dicts
+    @classmethod
+    def intern_dict(cls, row):
+        for name in cls.SHARED:
+            if name in row:
+                row[name] = intern(row[name])
+        return row
+
+    def __iter__(self):
+        return (get(self) for get in self._getters)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __getitem__(self, key):
+        if type(key) is str:
+            return self._getters[self._position[key]](self)
+        if type(key) is slice:
+            return list(self)[key]
+        return self._getters[key](self)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._position else default
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def as_dict(self):
+        return dict(zip(self.FIELDS, self))
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(repr(v) for v in self)})"
+
+
+class StudentRecord(Record):
+    FIELDS = ("student_id", "email_address", "first_name", "last_name", "courses", "grade", "marks")
+    UNIQUE = ("student_id", "email_address", "first_name", "last_name")
+    __slots__ = FIELDS
+
+    # the whole roster goes through here, so the common all-strings case skips the generic loop
+    def __init__(self, student_id="", email_address="", first_name="", last_name="", courses="", grade="", marks=""):
+        if type(email_address) is not str or type(student_id) is not str or type(first_name) is not str or type(last_name) is not str:
+            return Record.__init__(self, student_id, email_address, first_name, last_name, courses, grade, marks)
+        self.student_id = student_id
+        self.email_address = email_address
+        self.first_name = first_name
+        self.last_name = last_name
+        self.courses = intern(courses)
+        self.grade = intern(grade)
+        self.marks = intern(marks)
+
+
+class ProfessorRecord(Record):
+    FIELDS = ("professor_id", "email_address", "first_name", "last_name", "course_id", "rank")
+    UNIQUE = ("professor_id", "email_address", "first_name", "last_name")
+    __slots__ = FIELDS
+
+
+class CourseRecord(Record):
+    FIELDS = ("course_id", "course_name", "credits", "description")
+    UNIQUE = ("course_id", "course_name", "description")
+    __slots__ = FIELDS
+
+
+class CredentialRecord(Record):
+    FIELDS = ("Email", "Password", "Salt", "Role", "Iterations")
+    UNIQUE = ("Email", "Password", "Salt")
+    __slots__ = FIELDS
@@ -0,0 +1,111 @@
+from file_cache import file_signature
+from safe_io import iter_snapshot
+from records import CourseRecord, ProfessorRecord, StudentRecord, split_course_ids
+
+'''Cached joins between professors, courses and students. The three tables are read once into
+hash maps plus the relationship lists
+    professor_id -> [course_id]   (professors.csv course_id)
+    course_id -> [professor_id]
+    course_id -> [student_id]     (students.csv courses)
+so "who teaches C101", "roster for C101" and "a professor's students" are dictionary lookups
+plus the size of the answer. Every lookup first checks the signature of its sources: the
+professor/course maps are rebuilt only when professors.csv or courses.csv changed, the rosters
+only when students.csv changed, so a marks update does not reload the other two tables.
+A source is a csv path or a storage repository (see storage.py), which reports its own
+signature. Rows are held as compact records (see records.py) and handed out as dicts.
+With an enrolment store (see enrolment.py) the rosters also hold its enrolments, and a roster
+row carries the grade and marks of that course; the store's signature is part of the rosters'.'''
+
+def _rows(source):
+    return iter_snapshot(source, dicts=True) if isinstance(source, str) else source.all()
+
+def _dict(row):
+    return row.as_dict() if hasattr(row, "as_dict") else dict(row)
+
+def _signature(source):
+    return file_signature(source) if isinstance(source, str) else source.signature()
+
+class Relations:
+    def __init__(self, professors, courses, students=None, enrolments=None):
+        self.sources = {"professors": professors, "courses": courses, "students": students}
+        self.enrolments = enrolments
+        self.teaching_signature = None
+        self.roster_signature = None
+        self.professors = {}   # professor_id -> row
+        self.courses = {}      # course_id -> row
+        self.teaches = {}      # professor_id -> [course_id]
+        self.taught_by = {}    # course_id -> [professor_id]
+        self.students = {}     # student_id -> row
+        self.rosters = {}      # course_id -> [student_id]
+        self.enrolled = {}     # (student_id, course_id) -> (grade, marks) where they differ from the row
+
+    def refresh(self):
+        sig = (_signature(self.sources["professors"]), _signature(self.sources["courses"]))
+        if sig != self.teaching_signature:
+            self.courses = {r["course_id"]: CourseRecord.pack_dict(r) for r in _rows(self.sources["courses"]) if r.get("course_id")}
+            self.professors, self.teaches, self.taught_by = {}, {}, {}
+            for r in _rows(self.sources["professors"]):
+                pid = r.get("professor_id")
+                if not pid:
+                    continue
+                self.professors[pid] = ProfessorRecord.pack_dict(r)
+                self.teaches[pid] = split_course_ids(r.get("course_id"))
+                for cid in self.teaches[pid]:
+                    self.taught_by.setdefault(cid, []).append(pid)
+            self.teaching_signature = sig
+        if self.sources["students"] is not None:
+            sig = _signature(self.sources["students"])
+            if self.enrolments is not None:
+                sig = (sig, self.enrolments.current_signature())
+            if sig != self.roster_signature:
+                self.students, self.rosters, self.enrolled = {}, {}, {}
+                for r in _rows(self.sources["students"]):
+                    sid = r.get("student_id")
+                    if not sid:
+                        continue
+                    self.students[sid] = StudentRecord.pack_dict(r)
+                    if self.enrolments is None:
+                        for cid in split_course_ids(r.get("courses")):
+                            self.rosters.setdefault(cid, []).append(sid)
+                        continue
+                    for cid, grade, marks in self.enrolments.merged_courses(r, fresh=False):
+                        self.rosters.setdefault(cid, []).append(sid)
+                        if (grade, marks) != (r.get("grade"), r.get("marks")):
+                            self.enrolled[(sid, cid)] = (grade, marks)
+                self.roster_signature = sig
+        return self
+
+    def professor(self, professor_id):
+        row = self.refresh().professors.get(str(professor_id))
+        return _dict(row) if row is not None else None
+
+    def course(self, course_id):
+        row = self.refresh().courses.get(course_id)
+        return _dict(row) if row is not None else None
+
+    # course ids as listed on the professor's row, including ones missing from courses.csv
+    def course_ids_of(self, professor_id):
+        return list(self.refresh().teaches.get(str(professor_id), []))
+
+    def teachers_of(self, course_id):
+        self.refresh()
+        return [_dict(self.professors[pid]) for pid in self.taught_by.get(course_id, [])]
+
+    def roster(self, course_id):
+        self.refresh()
+        out = []
+        for sid in self.rosters.get(course_id, []):
+            row = _dict(self.students[sid])
+            if (sid, course_id) in self.enrolled:
+                row["grade"], row["marks"] = self.enrolled[(sid, course_id)]
+            out.append(row)
+        return out
+
+    # everyone enrolled in any of the professor's courses, each student once
+    def students_of(self, professor_id):
+        self.refresh()
+        seen = {}
+        for cid in self.teaches.get(str(professor_id), []):
+            for sid in self.rosters.get(cid, []):
+                seen.setdefault(sid, self.students[sid])
+        return [_dict(r) for r in seen.values()]
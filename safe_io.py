@@ -0,0 +1,81 @@
+import csv, os, tempfile, threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+'''Multi-process safety for the csv files.
+ - Writers take an exclusive advisory lock on <file>.lock for their whole read-modify-write
+   cycle, so two admin sessions cannot interleave and lose each other's changes. The lock
+   lives in a side file because the data file itself is replaced on commit. A thread that
+   holds the lock can take it again (a check-then-insert around a repository insert, say);
+   the nested block just runs.
+ - Rewrites go to a temp file in the same directory, are fsync'd and then os.replace'd over
+   the original. The rename is atomic, so the file is always either the old or the new
+   version, never truncated.
+ - Readers take no lock: opening the path gives them a consistent snapshot of whichever
+   version is current (an open handle keeps the version it opened even if a writer commits
+   meanwhile). iter_snapshot also stops before a row another process is still appending.'''
+
+_held = threading.local()  # per thread: lock file -> nesting depth
+
+@contextmanager
+def write_lock(path):
+    key = os.path.abspath(path + ".lock")
+    held = _held.__dict__.setdefault("depth", {})
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+    with open(key, "a+b") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def atomic_write(path):
+    # yields a text file; the original is replaced only if the block completes
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with open(fd, "w", newline="", encoding="utf-8") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def snapshot_lines(f):
+    # Lines of a file opened in binary mode, as they stood when it was opened: bytes appended
+    # later and a half-written last line are left out. Feed it to csv.reader / DictReader.
+    remaining = os.fstat(f.fileno()).st_size
+    for line in f:
+        if len(line) > remaining or not line.endswith(b"\n"):
+            return
+        remaining -= len(line)
+        yield line.decode("utf-8")
+
+def iter_snapshot(path, dicts=False):
+    with open(path, "rb") as f:
+        yield from (csv.DictReader if dicts else csv.reader)(snapshot_lines(f))
@@ -0,0 +1,410 @@
+import argparse, asyncio, json, os, re, secrets, time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from login import LoginCredential
+from student import Student
+from professor import Professor
+from course import Course
+from user import User
+from safe_io import iter_snapshot
+from storage import SqliteStorage
+from enrolment import EnrolmentStore
+
+'''HTTP/JSON front end for the grade system, stdlib asyncio only, so one process serves many
+users at once. The event loop only parses requests and routes them; everything that blocks runs
+in executors:
+ - PBKDF2 (login, password changes, new accounts) on a thread pool; hashlib releases the GIL
+   while hashing, so logins really run in parallel
+ - reads on a second thread pool
+ - writes on one thread, so writes from this process are applied in order; other processes are
+   kept out by the file locks (safe_io.py)
+
+    POST   /login                  {"email", "password"} -> {"token", "role", "user_id"}
+    POST   /logout
+    POST   /password               {"old_password", "new_password"}
+    GET    /me/grades  /me/marks   student
+    GET    /me/courses             professor: own row and course details
+    GET    /courses                any signed-in user
+    GET    /students[/<id>]   POST /students   PATCH|DELETE /students/<id>       admin
+    GET    /professors[/<id>] POST /professors PATCH|DELETE /professors/<id>     admin
+    POST   /courses           DELETE /courses/<id>                                admin
+
+Send the token as "Authorization: Bearer <token>". Admin calls take the --admin-token value
+(CHECKMYGRADE_ADMIN_TOKEN; a random one is printed at startup when unset) or the token of a
+login.csv account with the admin role. Login tokens expire --session-ttl seconds after the login
+(8 hours by default); the admin token does not.
+
+    python server.py --port 8080'''
+
+MAX_BODY = 1 << 20
+SESSION_TTL = 8 * 3600  # seconds a login token stays valid
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class GradeServer:
+    def __init__(self, students_csv="students.csv", professors_csv="professors.csv", courses_csv="courses.csv",
+                 login_csv="login.csv", storage=None, admin_token=None, hash_workers=4, read_workers=8, iters=None,
+                 session_ttl=SESSION_TTL, enrolments=None):
+        self.login_csv = login_csv
+        # PBKDF2 cost for new accounts, logins and password changes; the saved one for login_csv
+        # unless given (see LoginCredential.configured_iterations). Accounts hashed at a lower
+        # cost are rehashed to it as they log in.
+        self.iters = iters or LoginCredential.configured_iterations(login_csv)
+        self.storage = storage
+        # enrolments (see enrolment.py): /me/grades and /me/marks list every enrolled course
+        self.students = Student(students_csv, indexed=True, storage=storage, iters=self.iters, enrolments=enrolments)
+        self.profs = Professor(professors_csv, storage=storage, iters=self.iters, enrolments=enrolments)
+        self.courses = Course(courses_csv, storage=storage)
+        self.admin_token = admin_token or secrets.token_urlsafe(24)
+        self.session_ttl = session_ttl
+        self.sessions = {}  # token -> (Session, expiry on time.monotonic()), in login order
+        self.hashing = ThreadPoolExecutor(hash_workers, thread_name_prefix="hash")
+        self.reads = ThreadPoolExecutor(read_workers, thread_name_prefix="read")
+        self.writes = ThreadPoolExecutor(1, thread_name_prefix="write")
+        # one login index, LRU and rehash queue for all hashing threads (LoginCredential guards
+        # them with a lock); only the PBKDF2 work runs in parallel
+        self.credentials = LoginCredential(login_csv, iters=self.iters, storage=storage)
+        self.routes = [
+            ("POST", r"/login", self.login),
+            ("POST", r"/logout", self.logout),
+            ("POST", r"/password", self.change_password),
+            ("GET", r"/me/grades", self.my_grades),
+            ("GET", r"/me/marks", self.my_grades),
+            ("GET", r"/me/courses", self.my_courses),
+            ("GET", r"/courses", self.list_courses),
+            ("POST", r"/courses", self.add_course),
+            ("DELETE", r"/courses/(?P<id>[^/]+)", self.delete_course),
+            ("GET", r"/students", self.list_students),
+            ("GET", r"/students/(?P<id>[^/]+)", self.get_student),
+            ("POST", r"/students", self.add_student),
+            ("PATCH", r"/students/(?P<id>[^/]+)", self.update_student),
+            ("DELETE", r"/students/(?P<id>[^/]+)", self.delete_student),
+            ("GET", r"/professors", self.list_professors),
+            ("GET", r"/professors/(?P<id>[^/]+)", self.get_professor),
+            ("POST", r"/professors", self.add_professor),
+            ("PATCH", r"/professors/(?P<id>[^/]+)", self.update_professor),
+            ("DELETE", r"/professors/(?P<id>[^/]+)", self.delete_professor),
+        ]
+        self.routes = [(m, re.compile(p + r"/?\Z"), h) for m, p, h in self.routes]
+
+    # ---- executors ----
+    async def _run(self, pool, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    def _rows(self, obj):
+        if obj.repo is not None:
+            return list(obj.repo.all())
+        return [obj.record.intern_dict(row) for row in iter_snapshot(obj.file, dicts=True)]
+
+    # ---- auth ----
+    def _session(self, req, *roles):
+        auth = req["headers"].get("authorization", "")
+        token = auth[7:].strip() if auth.lower().startswith("bearer ") else ""
+        if token and secrets.compare_digest(token, self.admin_token):
+            session, role = None, "admin"
+        else:
+            entry = self.sessions.get(token)
+            if entry is None:
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "Missing or unknown token")
+            session, expiry = entry
+            if expiry <= time.monotonic():
+                self.sessions.pop(token, None)
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "Token expired, log in again")
+            role = session.role
+        if roles and role not in roles:
+            raise HttpError(HTTPStatus.FORBIDDEN, f"Needs role {' or '.join(roles)}")
+        return session, token
+
+    # every token gets the same ttl, so the expired ones are the oldest entries
+    def _drop_expired(self):
+        now = time.monotonic()
+        while self.sessions:
+            token = next(iter(self.sessions))
+            if self.sessions[token][1] > now:
+                break
+            del self.sessions[token]
+
+    @staticmethod
+    def _fields(body, *names, required=()):
+        missing = [n for n in required if not str(body.get(n) or "").strip()]
+        if missing:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Missing fields: {', '.join(missing)}")
+        return {n: body.get(n) for n in names}
+
+    # ---- handlers: (request, match) -> (status, payload) ----
+    async def login(self, req, m):
+        f = self._fields(req["body"], "email", "password", required=("email", "password"))
+        session = await self._run(self.hashing, lambda: self.credentials.login(f["email"], f["password"]))
+        if session is None:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Invalid email or password")
+        await self._run(self.reads, session.resolve, self.students, self.profs, self.courses)
+        token = secrets.token_urlsafe(24)
+        self._drop_expired()
+        self.sessions[token] = session, time.monotonic() + self.session_ttl
+        return HTTPStatus.OK, {"token": token, "role": session.role, "user_id": session.user_id}
+
+    async def logout(self, req, m):
+        _, token = self._session(req)
+        self.sessions.pop(token, None)
+        return HTTPStatus.OK, {"ok": True}
+
+    async def change_password(self, req, m):
+        session, _ = self._session(req, "student", "professor", "admin")
+        if session is None:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "The admin token has no password")
+        f = self._fields(req["body"], "old_password", "new_password", required=("old_password", "new_password"))
+        ok = await self._run(self.hashing, lambda: self.credentials.change_password(
+            self.login_csv, session.email, f["old_password"], f["new_password"]))
+        if not ok:
+            raise HttpError(HTTPStatus.FORBIDDEN, "Old password does not match")
+        return HTTPStatus.OK, {"ok": True}
+
+    async def my_grades(self, req, m):
+        session, _ = self._session(req, "student")
+        # fresh read: grades may have changed since login
+        row = await self._run(self.reads, self.students.find_by_email, session.email)
+        if row is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Student record not found")
+        key = "marks" if req["path"].endswith("marks") else "grade"
+        out = {"student_id": row["student_id"], "first_name": row["first_name"],
+               "last_name": row["last_name"], "courses": row["courses"], key: row[key]}
+        if self.students.enrolments is not None:
+            rows = await self._run(self.reads, self.students.enrolled_rows, row)
+            out["enrolments"] = [{"course_id": r["courses"], key: r[key]} for r in rows]
+        return HTTPStatus.OK, out
+
+    async def my_courses(self, req, m):
+        session, _ = self._session(req, "professor")
+        await self._run(self.reads, session.resolve, self.students, self.profs, self.courses)
+        if not session.records:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No professor found with email {session.email}")
+        return HTTPStatus.OK, {"professor": session.records[0], "courses": list(session.courses.values())}
+
+    async def list_courses(self, req, m):
+        self._session(req)
+        return HTTPStatus.OK, {"courses": await self._run(self.reads, self._rows, self.courses)}
+
+    async def add_course(self, req, m):
+        self._session(req, "admin")
+        f = self._fields(req["body"], "course_id", "course_name", "credits", "description",
+                         required=("course_id", "course_name", "credits"))
+        ok = await self._run(self.writes, self.courses.add_new_course, f["course_id"], f["course_name"],
+                             f["credits"], f["description"])
+        if ok is False:
+            raise HttpError(HTTPStatus.CONFLICT, f"Course with ID: {f['course_id']} already exists")
+        return HTTPStatus.CREATED, {"ok": True}
+
+    async def delete_course(self, req, m):
+        self._session(req, "admin")
+        if not await self._run(self.writes, self.courses.delete_new_course, m["id"]):
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No course found with ID {m['id']}")
+        return HTTPStatus.OK, {"ok": True}
+
+    async def list_students(self, req, m):
+        self._session(req, "admin")
+        return HTTPStatus.OK, {"students": await self._run(self.reads, self._rows, self.students)}
+
+    async def get_student(self, req, m):
+        self._session(req, "admin")
+        row = await self._run(self.reads, self.students.find_student, m["id"])
+        if row is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No student found with ID {m['id']}")
+        return HTTPStatus.OK, row
+
+    async def add_student(self, req, m):
+        self._session(req, "admin")
+        f = self._fields(req["body"], "student_id", "email_address", "first_name", "last_name", "password",
+                         "courses", "grade", "marks", required=("student_id", "email_address", "password"))
+        u = User(f["student_id"], f["email_address"], f["first_name"] or "", f["last_name"] or "", "student")
+        # the new account's password is hashed inside add_new_student, so this runs on the write thread
+        ok = await self._run(self.writes, self.students.add_new_student, self.login_csv, u, f["password"],
+                             f["courses"], f["grade"], f["marks"])
+        if not ok:
+            raise HttpError(HTTPStatus.CONFLICT, f"Student ID {f['student_id']} already exists")
+        return HTTPStatus.CREATED, {"ok": True}
+
+    async def update_student(self, req, m):
+        self._session(req, "admin")
+        f = self._fields(req["body"], "email_address", "first_name", "last_name", "courses", "grade", "marks")
+        def update():
+            if self.students.find_student(m["id"]) is None:
+                return False
+            u = User(m["id"], f["email_address"] or "", f["first_name"] or "", f["last_name"] or "", "student")
+            self.students.update_student_record(u, f["courses"], f["grade"], f["marks"])
+            return True
+        if not await self._run(self.writes, update):
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No student found with ID {m['id']}")
+        return HTTPStatus.OK, {"ok": True}
+
+    async def delete_student(self, req, m):
+        self._session(req, "admin")
+        def delete():
+            if self.students.find_student(m["id"]) is None:
+                return False
+            self.students.delete_new_student(m["id"])
+            return True
+        if not await self._run(self.writes, delete):
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No student found with ID {m['id']}")
+        return HTTPStatus.OK, {"ok": True}
+
+    async def list_professors(self, req, m):
+        self._session(req, "admin")
+        return HTTPStatus.OK, {"professors": await self._run(self.reads, self._rows, self.profs)}
+
+    async def get_professor(self, req, m):
+        self._session(req, "admin")
+        row = await self._run(self.reads, self.profs.find_professor, m["id"])
+        if row is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No professor found with ID {m['id']}")
+        return HTTPStatus.OK, row
+
+    async def add_professor(self, req, m):
+        self._session(req, "admin")
+        f = self._fields(req["body"], "professor_id", "email_address", "first_name", "last_name", "password",
+                         "course_id", "rank", required=("professor_id", "email_address", "password"))
+        u = User(f["professor_id"], f["email_address"], f["first_name"] or "", f["last_name"] or "", "professor")
+        ok = await self._run(self.writes, self.profs.add_new_professor, self.login_csv, u, f["password"],
+                             f["course_id"] or "", f["rank"])
+        if not ok:
+            raise HttpError(HTTPStatus.CONFLICT, f"Professor ID {f['professor_id']} already exists")
+        return HTTPStatus.CREATED, {"ok": True}
+
+    async def update_professor(self, req, m):
+        self._session(req, "admin")
+        f = self._fields(req["body"], "email_address", "first_name", "last_name", "course_id", "rank")
+        u = User(m["id"], f["email_address"] or "", f["first_name"] or "", f["last_name"] or "", "professor")
+        if not await self._run(self.writes, self.profs.modify_professor_details, u, f["course_id"], f["rank"]):
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No professor found with ID {m['id']}")
+        return HTTPStatus.OK, {"ok": True}
+
+    async def delete_professor(self, req, m):
+        self._session(req, "admin")
+        if not await self._run(self.writes, self.profs.delete_professor, m["id"]):
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No professor found with ID {m['id']}")
+        return HTTPStatus.OK, {"ok": True}
+
+    # ---- HTTP ----
+    async def dispatch(self, req):
+        allowed = False
+        for method, pattern, handler in self.routes:
+            m = pattern.match(req["path"])
+            if m is None:
+                continue
+            if method != req["method"]:
+                allowed = True
+                continue
+            try:
+                return await handler(req, m.groupdict())
+            except HttpError as e:
+                return e.status, {"error": str(e)}
+        if allowed:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Method not allowed"}
+        return HTTPStatus.NOT_FOUND, {"error": "Not found"}
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length header")
+        if length > MAX_BODY:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+        body = {}
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+            if not isinstance(body, dict):
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        return {"method": method.upper(), "path": target.split("?", 1)[0], "headers": headers,
+                "body": body, "keep_alive": keep_alive}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    req = await self._read_request(reader)
+                except HttpError as e:
+                    req, (status, payload) = None, (e.status, {"error": str(e)})
+                else:
+                    if req is None:
+                        break
+                    try:
+                        status, payload = await self.dispatch(req)
+                    except Exception as e:  # a bug in one handler must not take the server down
+                        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload).encode("utf-8")
+                keep_alive = req is not None and req["keep_alive"]
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}"
+                             f"\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.credentials.flush_rehashes()
+        for pool in (self.hashing, self.reads, self.writes):
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CheckMyGrade JSON API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=os.environ.get("CHECKMYGRADE_DB"), help="sqlite database instead of the csv files")
+    parser.add_argument("--admin-token", default=os.environ.get("CHECKMYGRADE_ADMIN_TOKEN"))
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--iters", type=int, help="PBKDF2 iterations (default: the saved cost, calibrated to about 50 ms on first use)")
+    parser.add_argument("--session-ttl", type=int, default=SESSION_TTL, help="seconds a login token stays valid")
+    parser.add_argument("--enrolments", default="enrolments.csv" if os.path.exists("enrolments.csv") else None,
+                        help="enrolment store (default: enrolments.csv when it exists)")
+    args = parser.parse_args()
+    storage = SqliteStorage(args.db) if args.db else None
+    enrolments = EnrolmentStore(args.enrolments) if args.enrolments else None
+    app = GradeServer(storage=storage, admin_token=args.admin_token, hash_workers=args.hash_workers, iters=args.iters,
+                     session_ttl=args.session_ttl, enrolments=enrolments)
+    if not args.admin_token:
+        print("Admin token:", app.admin_token)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.close()
+        if storage is not None:
+            storage.close()
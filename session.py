@@ -0,0 +1,72 @@
+import json
+from records import split_course_ids
+
+'''A logged-in user. LoginCredential.login returns one of these holding the role and the
+rows that belong to the user: their students.csv / professors.csv row(s) and the matching
+courses.csv rows. The menus answer "my grades", "my marks" and "my course details" from
+here, so repeat actions inside a session do not go back to disk.'''
+class Session:
+    def __init__(self, email, role, records=None, courses=None):
+        self.email = email
+        self.role = role
+        self.records = records or []   # the user's own row(s), as dicts
+        self.courses = courses or {}   # course_id -> courses.csv row
+
+    # Looks up everything the menus need for this user, once.
+    def resolve(self, students=None, profs=None, courses=None):
+        if self.role == "student" and students is not None:
+            # one record per enrolled course when students has an enrolment store
+            self.records = students.enrolled_rows(students.find_by_email(self.email))
+            key = "courses"
+        elif self.role == "professor" and profs is not None:
+            row = profs.find_by_email(self.email)
+            self.records = [row] if row else []
+            key = "course_id"
+        else:
+            return self
+        if courses is not None:
+            wanted = set()
+            for r in self.records:
+                wanted.update(split_course_ids(r.get(key)))
+            self.courses = courses.find_courses(wanted) if wanted else {}
+        return self
+
+    @property
+    def user_id(self):
+        if not self.records:
+            return None
+        r = self.records[0]
+        return r.get("student_id") or r.get("professor_id")
+
+    # ---- student views (same output as Student.check_my_grades / check_my_marks) ----
+    def print_grades(self):
+        if not self.records:
+            print("Student record not found")
+        for row in self.records:
+            print(f"Grade for {row['first_name']} {row['last_name']} ({row['courses']}): {row['grade']}")
+
+    def print_marks(self):
+        if not self.records:
+            print("Student not found.")
+        for row in self.records:
+            print(f"Marks for {row['first_name']} {row['last_name']} ({row['courses']}): {row['marks']}")
+
+    # ---- professor view (same output as Professor.show_course_details_by_professor) ----
+    def print_course_details(self):
+        if not self.records:
+            print(f"No professor found with email {self.email}.")
+            return False
+        prof = self.records[0]
+        print("Professor details:")
+        print(json.dumps(prof, indent=2))
+        print()
+
+        cid = (prof.get("course_id") or "").strip()
+        print("Matching course:")
+        if cid and cid in self.courses:
+            print(json.dumps(self.courses[cid], indent=2))
+        elif cid:
+            print(f"No course found with course_id = {cid}")
+        else:
+            print("Professor has no course id.")
+        return True
@@ -0,0 +1,397 @@
+import argparse, csv, os, sqlite3, threading
+from contextlib import contextmanager, nullcontext
+from student_index import STUDENT_HEADER
+from login import CREDENTIAL_HEADER
+from safe_io import atomic_write, iter_snapshot, write_lock
+from listing import csv_page, iter_page
+from file_cache import file_signature
+from records import CourseRecord, CredentialRecord, ProfessorRecord, StudentRecord
+
+'''Storage repositories. A repository is one table behind a small interface that works on dict
+rows: all, get, find_one, find_many, existing_keys, count, insert, update, delete, plus
+pop_many (delete and return the rows), rewrite (one pass that keeps, edits or drops every row),
+signature (changes whenever the table may have changed, for caches), page (a listing page, see
+listing.py) and lock (held by callers across a read-check-write cycle).
+A storage's transaction() groups writes to several tables: on sqlite they commit or roll back
+together; the csv files are separate files, each write there is atomic on its own.
+Two backends implement it:
+ - CsvRepository: the csv files, with the same full-scan / rewrite behaviour as before, writers
+   locked and rewrites committed atomically (safe_io.py)
+ - SqliteRepository: one stdlib sqlite3 table with indexes on the id and email columns,
+   WAL journaling, fixed parameterised statements (sqlite3 caches them as prepared
+   statements) and one transaction per multi-row write
+A storage object bundles the four tables (.students, .professors, .courses, .login). Student,
+Professor, Course and LoginCredential take one through their `storage` argument and route
+their CRUD through it, so the menus run unchanged on either backend.
+
+    python storage.py migrate grades.db     # import the csv files into sqlite'''
+
+PROFESSOR_HEADER = ["professor_id", "email_address", "first_name", "last_name", "course_id", "rank"]
+COURSE_HEADER = ["course_id", "course_name", "credits", "description"]
+
+# table -> (columns, key column, indexed lookup columns, record class whose repeated columns
+# are interned in the rows read back, see records.py)
+TABLES = {
+    "students": (STUDENT_HEADER, "student_id", ["email_address"], StudentRecord),
+    "professors": (PROFESSOR_HEADER, "professor_id", ["email_address"], ProfessorRecord),
+    "courses": (COURSE_HEADER, "course_id", [], CourseRecord),
+    "login": (CREDENTIAL_HEADER, "Email", [], CredentialRecord),
+}
+
+
+class CsvRepository:
+    def __init__(self, path, columns, key, record=None):
+        self.path = path
+        self.columns = list(columns)
+        self.key = key
+        self.record = record
+
+    def _header(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(self.columns)
+            return self.columns
+        with open(self.path, "r", newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None) or self.columns
+
+    # held across a read-check-write cycle; the repository's own writes take it again
+    def lock(self):
+        return write_lock(self.path)
+
+    def page(self, cursor=0, size=20, filters=None):
+        self._header()
+        return csv_page(self.path, cursor, size, filters)
+
+    def all(self):
+        self._header()
+        if self.record is None:
+            yield from iter_snapshot(self.path, dicts=True)
+        else:
+            yield from map(self.record.intern_dict, iter_snapshot(self.path, dicts=True))
+
+    def find_one(self, column, value):
+        for row in self.all():
+            if row.get(column) == str(value):
+                return row
+        return None
+
+    def get(self, key):
+        return self.find_one(self.key, key)
+
+    def find_many(self, column, values):
+        values = {str(v) for v in values}
+        return [row for row in self.all() if row.get(column) in values]
+
+    def existing_keys(self, keys):
+        keys = {str(k) for k in keys}
+        return {row[self.key] for row in self.all() if row.get(self.key) in keys}
+
+    def count(self):
+        return sum(1 for _ in self.all())
+
+    # the file's header plus those of our columns it lacks (an older layout, e.g. login.csv
+    # before Iterations) that the rows being written fill in; such a write moves the file to
+    # the wider header instead of dropping the values
+    def _write_header(self, rows):
+        header = self._header()
+        return header + [c for c in self.columns if c not in header and any(r.get(c) not in (None, "") for r in rows)]
+
+    def insert(self, rows):
+        rows = list(rows)
+        with write_lock(self.path):
+            header = self._header()
+            if self._write_header(rows) != header:
+                self._rewrite(list(self.all()) + rows)  # one-off migration to the new layout
+                return len(rows)
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                csv.DictWriter(f, fieldnames=header, extrasaction="ignore").writerows(rows)
+        return len(rows)
+
+    # callers hold write_lock(self.path) across the read the new rows are based on
+    def _rewrite(self, rows):
+        header = self._write_header(rows)
+        with atomic_write(self.path) as f:
+            writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+    # changes: {key value: {column: new value}}; one rewrite for the whole batch.
+    # expected: {key value: {column: value}}; such a row is only changed while it still holds
+    # those values (a compare-and-set).
+    def update_many(self, changes, column=None, expected=None):
+        column = column or self.key
+        changes = {str(k): v for k, v in changes.items()}
+        expected = {str(k): v for k, v in (expected or {}).items()}
+        rows, hit = [], 0
+        with write_lock(self.path):
+            for row in self.all():
+                c = changes.get(row.get(column))
+                if c and all(row.get(k) == ("" if v is None else str(v)) for k, v in expected.get(row.get(column), {}).items()):
+                    row.update({k: "" if v is None else str(v) for k, v in c.items()})
+                    hit += 1
+                rows.append(row)
+            if hit:
+                self._rewrite(rows)
+        return hit
+
+    def update(self, key, changes, column=None):
+        return self.update_many({key: changes}, column) > 0
+
+    def delete(self, keys, column=None):
+        column = column or self.key
+        keys = {str(k) for k in keys}
+        with write_lock(self.path):
+            rows = list(self.all())
+            kept = [r for r in rows if r.get(column) not in keys]
+            if len(kept) != len(rows):
+                self._rewrite(kept)
+        return len(rows) - len(kept)
+
+    def pop_many(self, keys, column=None):
+        column = column or self.key
+        keys = {str(k) for k in keys}
+        with write_lock(self.path):
+            kept, popped = [], []
+            for r in self.all():
+                (popped if r.get(column) in keys else kept).append(r)
+            if popped:
+                self._rewrite(kept)
+        return popped
+
+    # fn(row) returns the row (edited or not) to keep it, or None to drop it.
+    # Returns (dropped, changed); the file is rewritten once, and only if something changed.
+    def rewrite(self, fn):
+        rows, dropped, changed = [], 0, 0
+        with write_lock(self.path):
+            for r in self.all():
+                new = fn(dict(r))
+                if new is None:
+                    dropped += 1
+                    continue
+                changed += new != r
+                rows.append(new)
+            if dropped or changed:
+                self._rewrite(rows)
+        return dropped, changed
+
+    def signature(self):
+        return file_signature(self.path)
+
+
+class SqliteRepository:
+    # lock serialises every statement on the shared connection (the server reads from a thread
+    # pool and writes from another thread); SqliteStorage passes one lock to all four tables
+    def __init__(self, conn, table, columns, key, indexed=(), record=None, lock=None):
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.key = key
+        self.record = record
+        self._lock = lock or threading.RLock()
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        defs = ", ".join(f'"{c}" TEXT' for c in self.columns)
+        self._create = [f'CREATE TABLE IF NOT EXISTS "{table}" ({defs})',
+                        f'CREATE INDEX IF NOT EXISTS "{table}_{key}" ON "{table}" ("{key}")']
+        self._create += [f'CREATE INDEX IF NOT EXISTS "{table}_{c}" ON "{table}" ("{c}")' for c in indexed]
+        # statements are built once so sqlite3's statement cache reuses the prepared form
+        self._select = f'SELECT {cols} FROM "{table}"'
+        self._insert = f'INSERT INTO "{table}" ({cols}) VALUES ({", ".join("?" for _ in self.columns)})'
+        with self._lock, conn:
+            for stmt in self._create:
+                conn.execute(stmt)
+
+    def _dict(self, row):
+        if row is None:
+            return None
+        row = dict(zip(self.columns, row))
+        return self.record.intern_dict(row) if self.record is not None else row
+
+    def _check(self, column):
+        if column not in self.columns:
+            raise ValueError(f"Unknown column {column} for {self.table}")
+        return column
+
+    # held across a read-check-write cycle (see Student/Professor/Course); statements inside
+    # take it again
+    def lock(self):
+        return self._lock
+
+    # a write runs in its own transaction, or in the one SqliteStorage.transaction() has open
+    @contextmanager
+    def _write(self, begin=False):
+        with self._lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            with self.conn:
+                if begin:
+                    self.conn.execute("BEGIN IMMEDIATE")  # nobody writes between a scan and its changes
+                yield
+
+    def all(self):
+        # fetched in full under the lock: a cursor left open on the shared connection would
+        # see the write thread's commits half way through
+        with self._lock:
+            rows = self.conn.execute(self._select + " ORDER BY rowid").fetchall()
+        yield from map(self._dict, rows)
+
+    def page(self, cursor=0, size=20, filters=None):
+        return iter_page(self.all(), cursor, size, filters)
+
+    def find_one(self, column, value):
+        with self._lock:
+            row = self.conn.execute(f'{self._select} WHERE "{self._check(column)}" = ? ORDER BY rowid LIMIT 1', (str(value),)).fetchone()
+        return self._dict(row)
+
+    def get(self, key):
+        return self.find_one(self.key, key)
+
+    def find_many(self, column, values):
+        out = []
+        values = [str(v) for v in values]
+        with self._lock:
+            for i in range(0, len(values), 500):  # stay under sqlite's host-parameter limit
+                chunk = values[i:i + 500]
+                sql = f'{self._select} WHERE "{self._check(column)}" IN ({", ".join("?" for _ in chunk)}) ORDER BY rowid'
+                out.extend(self._dict(r) for r in self.conn.execute(sql, chunk))
+        return out
+
+    def existing_keys(self, keys):
+        return {row[self.key] for row in self.find_many(self.key, keys)}
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]
+
+    def insert(self, rows):
+        data = [tuple("" if r.get(c) is None else str(r.get(c)) for c in self.columns) for r in rows]
+        with self._write():
+            self.conn.executemany(self._insert, data)
+        return len(data)
+
+    def update_many(self, changes, column=None, expected=None):
+        column = self._check(column or self.key)
+        expected = {str(k): v for k, v in (expected or {}).items()}
+        hit = 0
+        with self._write():
+            for key, c in changes.items():
+                sets = ", ".join(f'"{self._check(k)}" = ?' for k in c)
+                where = expected.get(str(key), {})
+                conds = "".join(f' AND "{self._check(k)}" = ?' for k in where)
+                cur = self.conn.execute(f'UPDATE "{self.table}" SET {sets} WHERE "{column}" = ?{conds}',
+                                        [("" if v is None else str(v)) for v in c.values()] + [str(key)]
+                                        + [("" if v is None else str(v)) for v in where.values()])
+                hit += cur.rowcount > 0
+        return hit
+
+    def update(self, key, changes, column=None):
+        return self.update_many({key: changes}, column) > 0
+
+    def delete(self, keys, column=None):
+        column = self._check(column or self.key)
+        with self._write():
+            cur = self.conn.executemany(f'DELETE FROM "{self.table}" WHERE "{column}" = ?', [(str(k),) for k in keys])
+        return cur.rowcount
+
+    def pop_many(self, keys, column=None):
+        column = self._check(column or self.key)
+        keys = [str(k) for k in keys]
+        with self._write():
+            rows = self.find_many(column, keys)
+            self.conn.executemany(f'DELETE FROM "{self.table}" WHERE "{column}" = ?', [(k,) for k in keys])
+        return rows
+
+    def rewrite(self, fn):
+        names = ", ".join(f'"{c}"' for c in self.columns)
+        sets = ", ".join(f'"{c}" = ?' for c in self.columns)
+        drops, edits = [], []
+        with self._write(begin=True):
+            for rowid, *values in self.conn.execute(f'SELECT rowid, {names} FROM "{self.table}" ORDER BY rowid').fetchall():
+                row = self._dict(values)
+                new = fn(dict(row))
+                if new is None:
+                    drops.append((rowid,))
+                elif new != row:
+                    edits.append(tuple("" if new.get(c) is None else str(new.get(c)) for c in self.columns) + (rowid,))
+            self.conn.executemany(f'DELETE FROM "{self.table}" WHERE rowid = ?', drops)
+            self.conn.executemany(f'UPDATE "{self.table}" SET {sets} WHERE rowid = ?', edits)
+        return len(drops), len(edits)
+
+    # total_changes moves with this connection's writes, data_version with other connections' commits
+    def signature(self):
+        with self._lock:
+            return self.conn.total_changes, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+class CsvStorage:
+    def __init__(self, students_csv="students.csv", professors_csv="professors.csv",
+                 courses_csv="courses.csv", login_csv="login.csv"):
+        paths = {"students": students_csv, "professors": professors_csv, "courses": courses_csv, "login": login_csv}
+        for table, (columns, key, _, record) in TABLES.items():
+            setattr(self, table, CsvRepository(paths[table], columns, key, record))
+
+    def transaction(self):
+        return nullcontext()
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    # One connection shared by the four tables and, in server.py, by several threads; the lock
+    # makes its statements and transactions take turns.
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table, (columns, key, indexed, record) in TABLES.items():
+            setattr(self, table, SqliteRepository(self.conn, table, columns, key, indexed, record, self.lock))
+
+    # the tables' writes inside commit together when the block ends, or not at all if it raises
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                yield
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# Copies the four csv tables into the sqlite database; tables that already have rows are skipped.
+def migrate(db_path, students_csv="students.csv", professors_csv="professors.csv",
+            courses_csv="courses.csv", login_csv="login.csv"):
+    src = CsvStorage(students_csv, professors_csv, courses_csv, login_csv)
+    dst = SqliteStorage(db_path)
+    counts = {}
+    try:
+        for table in TABLES:
+            target = getattr(dst, table)
+            if target.count():
+                print(f"{table}: already has rows, skipped")
+                continue
+            counts[table] = target.insert(getattr(src, table).all())
+            print(f"{table}: {counts[table]} rows imported")
+    finally:
+        dst.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CheckMyGrade storage tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="import the csv files into a sqlite database")
+    m.add_argument("db")
+    m.add_argument("--students", default="students.csv")
+    m.add_argument("--professors", default="professors.csv")
+    m.add_argument("--courses", default="courses.csv")
+    m.add_argument("--login", default="login.csv")
+    args = parser.parse_args()
+    migrate(args.db, args.students, args.professors, args.courses, args.login)
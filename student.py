@@ -1,114 +1,530 @@
-import csv, os
+import csv, json, os
+from contextlib import nullcontext
 from user import User
-from login import LoginCredential
+from login import LEGACY_ITERS, LoginCredential
+from file_cache import file_signature
+from student_index import StudentIndex
+from listing import csv_page, iter_page, print_page
+from safe_io import atomic_write, iter_snapshot, write_lock
+from records import StudentRecord, split_course_ids
+from grade_scale import parse_marks
 
 class Student:
-    def __init__(self, file_path):
+    record = StudentRecord  # repeated columns of the rows it reads are interned (see records.py)
+
+    # indexed=True keeps the table in memory (see student_index.py) and serves lookups from it.
+    # log_writes=True turns updates/deletes into appends to <file>.log; it implies the index,
+    # which is where the log gets merged over the base file. Once compact_threshold entries
+    # have piled up the log is folded back into the csv.
+    # storage (see storage.py) routes all reads and writes through storage.students instead of
+    # the csv file; the index and log modes do not apply then.
+    # integrity (see integrity.py) checks course ids on writes and makes deletes take the
+    # student's login row with them.
+    # enrolments (see enrolment.py) holds every (student, course) pair with its grade and marks;
+    # the courses/grade/marks columns then only carry the latest write, and the grade/marks
+    # views list all of the student's courses.
+    # iters is the PBKDF2 cost the login rows of new students are hashed with (see login.py).
+    def __init__(self, file_path, indexed=False, log_writes=False, compact_threshold=1000, storage=None, integrity=None,
+                 enrolments=None, iters=LEGACY_ITERS):
             self.file = file_path
+            self.storage = storage
+            self.repo = storage.students if storage is not None else None
+            self.log_file = file_path + ".log"
+            self.indexed = indexed or log_writes
+            self.log_writes = log_writes
+            self.compact_threshold = compact_threshold
+            self._index = None
+            self.integrity = integrity
+            self.enrolments = enrolments
+            self.iters = iters
+
+    # ---- in-memory index ----
+    def _signature(self):
+        if self.log_writes:
+            return file_signature(self.file, self.log_file)
+        return file_signature(self.file)
+
+    # force=True builds the index even when the instance is not `indexed` (the ranking queries
+    # below need it); once built it is cached, checked against the file signature and kept in
+    # step by the writes like any other, so _index_synced never marks a stale one current
+    def _get_index(self, force=False):
+        if not (self.indexed or force or self._index is not None) or self.repo is not None:
+            return None
+        sig = self._signature()
+        if self._index is None or self._index.signature != sig:
+            self._index = StudentIndex.load(self.file, self.log_file if self.log_writes else None)
+            self._index.signature = sig
+        return self._index
+
+    # called after this instance wrote the file so the index does not reload its own change
+    def _index_synced(self):
+        if self._index is not None:
+            self._index.signature = self._signature()
+
+    # Writers from any process serialise on <file>.lock (see safe_io.py) for the whole
+    # read-check-write cycle, log appends included; readers never lock. The repository
+    # backends handle their own concurrency.
+    def _write_lock(self):
+        if self.repo is not None:
+            return nullcontext()
+        return write_lock(self.file)
+
+    # ---- mutation log ----
+    # Callers hold _write_lock(): the refresh, the append and the replay into the index happen
+    # under one lock, so the index never skips entries another process appended in between.
+    def _append_log(self, *entries):
+        index = self._get_index()  # pick up entries other processes appended since our last read
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        for entry in entries:
+            index.replay(entry)
+        index.log_entries += len(entries)
+        self._index_synced()
+        if index.log_entries >= self.compact_threshold:
+            self._compact()
+
+    def compact(self):
+        with write_lock(self.file):
+            return self._compact()
+
+    def _compact(self):
+        # Folds the log into a clean csv. The csv is replaced first and the log removed after,
+        # so a crash in between only means replaying (idempotent) entries again.
+        index = self._get_index()
+        if index is None or not os.path.exists(self.log_file):
+            return False
+        with atomic_write(self.file) as f:
+            writer = csv.writer(f)
+            writer.writerow(index.header)
+            writer.writerows(index.rows.values())
+        os.remove(self.log_file)
+        index.log_entries = 0
+        self._index_synced()
+        return True
+
+    def find_student(self, student_id):
+        if self.repo is not None:
+            return self.repo.get(student_id)
+        index = self._get_index()
+        if index is not None:
+            return index.as_dict(index.get(student_id))
+        with open(self.file, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if str(row.get("student_id", "")).strip() == str(student_id):
+                    return StudentRecord.intern_dict(row)
+        return None
+
+    def find_by_email(self, email):
+        if self.repo is not None:
+            return self.repo.find_one("email_address", email)
+        index = self._get_index()
+        if index is not None:
+            return index.as_dict(index.find_by_email(email))
+        with open(self.file, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get("email_address") == email:
+                    return StudentRecord.intern_dict(row)
+        return None
+
+    # ---- enrolments ----
+    # The row once per enrolled course, with that course's grade and marks in the usual columns;
+    # just [row] without an enrolment store or enrolments. The courses/grade/marks on the row are
+    # the latest write, possibly by a writer without the store, so its own courses keep the
+    # row's grade and marks rather than the store's (see EnrolmentStore.merged_courses).
+    def enrolled_rows(self, row):
+        if row is None:
+            return []
+        if self.enrolments is None:
+            return [row]
+        return list(self.enrolments.expand([row]))
+
+    # writes to the courses/grade/marks columns go to the store as well; a course named without
+    # a grade or marks keeps the ones it already has there
+    def _sync_enrolments(self, student_id, courses, grade=None, marks=None):
+        if self.enrolments is None:
+            return
+        entries = []
+        for cid in split_course_ids(courses):
+            old_grade, old_marks = self.enrolments.get(student_id, cid) or ("", "")
+            entries.append((student_id, cid, old_grade if grade is None else grade, old_marks if marks is None else marks))
+        self.enrolments.enrol_many(entries)
+
+    # an update without a course id applies its grade/marks to the course on the student's row
+    def _sync_updated_enrolments(self, student_id, courses, grade, marks):
+        if self.enrolments is None or (courses is None and grade is None and marks is None):
+            return
+        if courses is None:
+            row = self.find_student(student_id)
+            courses = row.get("courses") if row else ""
+        self._sync_enrolments(str(student_id), courses, grade, marks)
+
+    def enrol_in_course(self, student_id, course_id, grade=None, marks=None):
+        if self.enrolments is None:
+            print("No enrolment store configured.")
+            return False
+        if self.find_student(student_id) is None:
+            print("Student not found.")
+            return False
+        if self.integrity is not None and not self.integrity.check_courses(course_id):
+            return False
+        self._sync_enrolments(str(student_id), course_id, grade, marks)
+        print(f"Student {student_id} enrolled in {course_id}.")
+        return True
+
+    # ---- ranking queries (sorted secondary indexes, see student_index.py) ----
+    def _ranked_index(self):
+        if self.repo is None:
+            return self._get_index(force=True)
+        # the repository has no sorted index of its own; build a throwaway one
+        index = StudentIndex(self.repo.columns)
+        for row in self.repo.all():
+            index.put([row[c] for c in self.repo.columns])
+        return index
+
+    # With an enrolment store a course's ranking covers its roster there as well as the rows
+    # naming it: (-marks, student_id, row dict for that course) for each, highest first. The
+    # cost is the course's size, not the table's.
+    def _course_ranking(self, index, course):
+        index.build_sorted()
+        own = index.course_marks.get(course)
+        sids = {sid for sid, _, _ in self.enrolments.roster(course)}.union(own.ids if own is not None else ())
+        ranking = []
+        for sid in sids:
+            row = index.as_dict(index.get(sid))
+            if row is None:
+                continue
+            for r in self.enrolled_rows(row):
+                m = parse_marks(r.get("marks") or "") if r["courses"] == course else None
+                if m is not None:
+                    ranking.append((-m, sid, r))
+        ranking.sort(key=lambda e: e[:2])
+        return ranking
+
+    # the k students with the highest marks, overall or in one course, as dicts
+    def top_students(self, k=10, course=None):
+        index = self._ranked_index()
+        if course is not None and self.enrolments is not None:
+            return [r for _, _, r in self._course_ranking(index, course)[:k]]
+        return [index.as_dict(row) for row in index.top(k, course)]
+
+    # students with lo <= marks <= hi, highest first
+    def students_in_range(self, lo, hi, course=None):
+        index = self._ranked_index()
+        if course is not None and self.enrolments is not None:
+            return [r for key, _, r in self._course_ranking(index, course) if -float(hi) <= key <= -float(lo)]
+        return [index.as_dict(row) for row in index.marks_range(lo, hi, course)]
+
+    # (rank, out of, percentile) of the student's marks, or None
+    def rank_of(self, student_id, course=None):
+        index = self._ranked_index()
+        if course is None or self.enrolments is None:
+            return index.rank(student_id, course)
+        ranking = self._course_ranking(index, course)
+        mine = next((key for key, sid, _ in ranking if sid == str(student_id)), None)
+        if mine is None:
+            return None
+        above = sum(1 for key, _, _ in ranking if key < mine)
+        return above + 1, len(ranking), 100.0 * (len(ranking) - above) / len(ranking)
+
+    # students in email order; `prefix` narrows to e.g. one domain-less name range
+    def students_by_email(self, start="", prefix="", limit=None):
+        index = self._ranked_index()
+        return [index.as_dict(row) for row in index.by_email_order(start, prefix, limit)]
+
+    def print_class_rank(self, student_id):
+        index = self._ranked_index()
+        row = index.as_dict(index.get(student_id))
+        if row is None:
+            return False
+        courses = [r["courses"] for r in self.enrolled_rows(row)] if self.enrolments is not None else split_course_ids(row.get("courses"))
+        for cid in courses:
+            r = self.rank_of(student_id, cid) if self.enrolments is not None else index.rank(student_id, cid)
+            if r is not None:
+                print(f"Class rank in {cid}: {r[0]} of {r[1]} ({r[2]:.0f}th percentile)")
+        return True
+
+    # ---- paged listing (see listing.py) ----
+    def list_records(self, cursor=0, size=20, filters=None):
+        if self.repo is not None:
+            return iter_page(self.repo.all(), cursor, size, filters)
+        if self.log_writes:
+            index = self._get_index()
+            return iter_page((index.as_dict(r) for r in index.rows.values()), cursor, size, filters)
+        return csv_page(self.file, cursor, size, filters)
+
+    # prints one formatted page and returns the cursor of the next one (None at the end)
+    def display_page(self, cursor=0, size=20, filters=None):
+        rows, next_cursor = self.list_records(cursor, size, filters)
+        print_page(rows, next_cursor)
+        return next_cursor
 
     def display_records(self):
-            with open(self.file, 'r', newline='') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                            print(row)
+            if self.repo is not None:
+                  print(self.repo.columns)
+                  for row in self.repo.all():
+                        print(list(row.values()))
+                  return
+            if self.log_writes:
+                  index = self._get_index()
+                  print(index.header)
+                  for row in index.rows.values():
+                        print(list(row))
+                  return
+            # lock-free snapshot: a concurrent rewrite or append is never seen half done
+            for row in iter_snapshot(self.file):
+                    print(row)
     
     def add_new_student(self, login_csv, u:User, password, courses=None,grade=None, marks=None):
             exists = False
-            with open(self.file, "r", newline="", encoding="utf-8") as f:
-                  reader = csv.reader(f)
-                  header = next(reader, None)
+            if self.integrity is not None and not self.integrity.check_courses(courses):
+                  return False
+            with self._write_lock():
+                  index = self._get_index()
+                  if self.repo is not None:
+                        exists = self.repo.get(u.user_id) is not None
+                  elif index is not None:
+                        exists = str(u.user_id) in index
+                  else:
+                        with open(self.file, "r", newline="", encoding="utf-8") as f:
+                              reader = csv.reader(f)
+                              header = next(reader, None)
 
-                  id_idx = 0
-                  if header and "student_id" in header:
-                        id_idx = header.index("student_id")
+                              id_idx = 0
+                              if header and "student_id" in header:
+                                    id_idx = header.index("student_id")
 
-                  for row in reader:
-                        if row and row[id_idx] == str(u.user_id):
-                              exists = True
-                              break
+                              for row in reader:
+                                    if row and row[id_idx] == str(u.user_id):
+                                          exists = True
+                                          break
 
-            if exists:
-                  print(f"Student ID {u.user_id} already exists. No record added.")
-                  return False
-            with open(self.file, 'a', newline='') as f:
-                        writer = csv.writer(f)
-                        writer.writerow([u.user_id, u.email_address, u.first_name, u.last_name, courses if courses is not None else "", grade or "", marks if marks is not None else ""])
+                  if exists:
+                        print(f"Student ID {u.user_id} already exists. No record added.")
+                        return False
+                  new_row = [u.user_id, u.email_address, u.first_name, u.last_name, courses if courses is not None else "", grade or "", marks if marks is not None else ""]
+                  if self.repo is not None:
+                        self.repo.insert([dict(zip(self.repo.columns, new_row))])
+                        print(f"{u.first_name} added successfully!")
+                  elif self.log_writes:
+                        # adds go through the log too so they stay ordered with later deletes
+                        self._append_log({"op": "add", "row": [str(v) for v in new_row]})
                         print(f"{u.first_name} added successfully!")
-            if not os.path.exists(self.file) or os.path.getsize(self.file) == 0:
+                  else:
+                        with open(self.file, 'a', newline='') as f:
+                              writer = csv.writer(f)
+                              writer.writerow(new_row)
+                              print(f"{u.first_name} added successfully!")
+                  if index is not None and not self.log_writes:
+                        index.put([str(v) for v in new_row])
+                        self._index_synced()
+            if self.repo is None and (not os.path.exists(self.file) or os.path.getsize(self.file) == 0):
                   with open(self.file, "w", newline="", encoding="utf-8") as f:
                         csv.writer(f).writerow(["Email", "Password", "Salt", "Role"])
 
-            # encrypt using LoginCredential
-            salt_hex = os.urandom(16).hex()
-            lc = LoginCredential(self.file)  # we just need its encrypt_password method
-            pwd_hash = lc.encrypt_password(password, salt_hex)
-
-            # append to login.csv
-            with open(login_csv, "a", newline="", encoding="utf-8") as f:
-                  writer = csv.DictWriter(f, fieldnames=["Email", "Password", "Salt", "Role"])
-                  writer.writerow({
-                        "Email": u.email_address,
-                        "Password": pwd_hash,
-                        "Salt": salt_hex,
-                        "Role": "student"
-                  })
+            self._sync_enrolments(str(u.user_id), courses, grade, marks)
+            # encrypt and append to login.csv using LoginCredential
+            LoginCredential(login_csv, iters=self.iters, storage=self.storage).add_credentials([(u.email_address, password, "student")])
             print(f"{u.first_name} added successfully!")
             return True
         
     
+    # Adds many students in one pass. records is either the path of a csv laid out like
+    # students.csv or an iterable of dicts with those keys; a "password" column/key is used
+    # when present, otherwise `password`. Ids already in the table or repeated inside the
+    # batch are rejected. workers > 1 hashes the passwords on a thread pool.
+    # Returns (accepted, rejected).
+    def add_students_bulk(self, login_csv, records, password=None, workers=1):
+        if isinstance(records, str):
+            with open(records, "r", newline="", encoding="utf-8") as f:
+                return self.add_students_bulk(login_csv, csv.DictReader(f), password, workers)
+
+        with self._write_lock():
+            index = self._get_index()
+            if self.repo is not None:
+                records = list(records)
+                seen = self.repo.existing_keys(str(r.get("student_id") or "").strip() for r in records)
+            elif index is not None:
+                seen = set(index.rows)
+            else:
+                with open(self.file, "r", newline="", encoding="utf-8") as f:
+                    reader = csv.reader(f)
+                    header = next(reader, None)
+                    id_idx = header.index("student_id") if header and "student_id" in header else 0
+                    seen = {row[id_idx] for row in reader if row}
+
+            new_rows, accounts = [], []
+            rejected = 0
+            for rec in records:
+                sid = str(rec.get("student_id") or "").strip()
+                if not sid or sid in seen or (self.integrity is not None and self.integrity.missing_courses(rec.get("courses"))):
+                    rejected += 1
+                    continue
+                seen.add(sid)
+                marks = rec.get("marks")
+                new_rows.append([sid, rec.get("email_address") or "", rec.get("first_name") or "", rec.get("last_name") or "",
+                                 rec.get("courses") or "", rec.get("grade") or "", marks if marks is not None else ""])
+                accounts.append((rec.get("email_address") or "", rec.get("password") or password or "", "student"))
+
+            if new_rows:
+                if self.repo is not None:
+                    self.repo.insert(dict(zip(self.repo.columns, row)) for row in new_rows)
+                elif self.log_writes:
+                    self._append_log(*({"op": "add", "row": [str(v) for v in row]} for row in new_rows))
+                else:
+                    with open(self.file, 'a', newline='') as f:
+                        csv.writer(f).writerows(new_rows)
+                    if index is not None:
+                        for row in new_rows:
+                            index.put([str(v) for v in row])
+                        self._index_synced()
+        if new_rows and self.enrolments is not None:
+            self.enrolments.enrol_many((row[0], cid, row[5], row[6]) for row in new_rows for cid in split_course_ids(row[4]))
+        # hashing is the slow part, so it runs after the students file is unlocked
+        if new_rows:
+            LoginCredential(login_csv, iters=self.iters, workers=workers, storage=self.storage).add_credentials(accounts)
+
+        print(f"Bulk import: {len(new_rows)} students added, {rejected} rejected.")
+        return len(new_rows), rejected
+
     def delete_new_student(self, student_id):
+        if self.enrolments is not None:
+            self.enrolments.remove([student_id])
+        if self.integrity is not None and self.repo is None and self.log_writes:
+            self.compact()  # the integrity layer rewrites students.csv, so fold the log in first
+        if self.integrity is not None:
+            # one pass over students and one over login; the index notices the new signature
+            if not self.integrity.delete_students([student_id])[0]:
+                print(f"No student found with ID {student_id}. Delete aborted.")
+                return False
+            print("Student deleted successfully!")
+            return True
+        self._get_index()  # refresh a stale index before we patch it below
+        if self.repo is not None:
+            self.repo.delete([student_id])
+            print(f"Student deleted successfully!")
+            return
+        if self.log_writes:
+            with write_lock(self.file):
+                self._append_log({"op": "delete", "student_id": str(student_id)})
+            print(f"Student deleted successfully!")
+            return
         rows = []
-        with open(self.file, 'r', newline='') as f:
-                reader = csv.reader(f)
-                for row in reader:
-                        if row[0] != student_id:
-                                rows.append(row)
-        with open(self.file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(rows)
+        with write_lock(self.file):
+            self._get_index()  # another process may have written since the refresh above
+            with open(self.file, 'r', newline='') as f:
+                    reader = csv.reader(f)
+                    for row in reader:
+                            if row[0] != student_id:
+                                    rows.append(row)
+            with atomic_write(self.file) as f:
+                writer = csv.writer(f)
+                writer.writerows(rows)
+        if self._index is not None:
+            self._index.drop(student_id)
+            self._index_synced()
         print(f"Student deleted successfully!")
         
     
     def update_student_record(self, u:User, courses=None, grade=None, marks=None):
+        if courses is not None and self.integrity is not None and not self.integrity.check_courses(courses):
+            return False
+        self._get_index()
+        if self.repo is not None or self.log_writes:
+            fields = {}
+            if u.email_address:
+                fields["email_address"] = u.email_address
+            if u.first_name:
+                fields["first_name"] = u.first_name
+            if u.last_name:
+                fields["last_name"] = u.last_name
+            if courses is not None:
+                fields["courses"] = courses
+            if grade is not None:
+                fields["grade"] = grade
+            if marks is not None:
+                fields["marks"] = marks
+            if self.repo is not None:
+                found = self.repo.update(u.user_id, fields) if fields else self.repo.get(u.user_id) is not None
+            else:
+                with write_lock(self.file):
+                    found = str(u.user_id) in self._get_index()
+                    if found:
+                        self._append_log({"op": "update", "student_id": str(u.user_id), "fields": fields})
+            if found:
+                self._sync_updated_enrolments(u.user_id, courses, grade, marks)
+            print("Student record updated successfully!")
+            return
         rows = []
-        with open(self.file, 'r', newline='') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                  if row and row[0] == u.user_id:
-                        row[1] = u.email_address or row[1]
-                        row[2] = u.first_name or row[2]
-                        row[3] = u.last_name or row[3]
-                        if courses is not None:
-                              row[4] = courses
-                        if grade is not None:
-                              row[5] = grade
-                        if marks is not None:
-                              row[6] = marks
-                  rows.append(row)
-            with open(self.file, 'w', newline='') as f:
+        updated = None
+        with write_lock(self.file):
+            self._get_index()  # another process may have written since the refresh above
+            with open(self.file, 'r', newline='') as f:
+                reader = csv.reader(f)
+                for row in reader:
+                      if row and row[0] == u.user_id:
+                            row[1] = u.email_address or row[1]
+                            row[2] = u.first_name or row[2]
+                            row[3] = u.last_name or row[3]
+                            if courses is not None:
+                                  row[4] = courses
+                            if grade is not None:
+                                  row[5] = grade
+                            if marks is not None:
+                                  row[6] = marks
+                            updated = row
+                      rows.append(row)
+            with atomic_write(self.file) as f:
                   writer = csv.writer(f)
                   writer.writerows(rows)
-            print("Student record updated successfully!")
+        if self._index is not None:
+              if updated is not None:
+                    self._index.put([str(v) for v in updated])
+              self._index_synced()
+        if updated is not None:  # an unknown id leaves the enrolments alone too
+              self._sync_updated_enrolments(u.user_id, courses, grade, marks)
+        print("Student record updated successfully!")
     
     def check_my_grades(self, student_id):
+          if self.repo is not None or self._get_index() is not None:
+                row = self.find_student(student_id)
+                if row is None:
+                      print("Student record not found")
+                else:
+                      for r in self.enrolled_rows(row):
+                            print(f"Grade for {r['first_name']} {r['last_name']} ({r['courses']}): {r['grade']}")
+                      # only an indexed instance has the table in memory already; a repository
+                      # would need a full read per request to rank
+                      if self.repo is None and self.indexed:
+                            self.print_class_rank(student_id)
+                return
           with open(self.file, 'r', newline='') as f:
             reader = csv.DictReader(f)  # columns: student_id,email_address,first_name,last_name,courses,grade,marks
             found = False
             for row in reader:
                   if str(row.get("student_id", "")).strip() == str(student_id):
                   # Show grade (letter) for this student (optionally include course)
-                        print(f"Grade for {row['first_name']} {row['last_name']} ({row['courses']}): {row['grade']}")
+                        for r in self.enrolled_rows(row):
+                              print(f"Grade for {r['first_name']} {r['last_name']} ({r['courses']}): {r['grade']}")
                   found = True
             if not found:
                   print("Student record not found")
 
     def check_my_marks(self, student_id):
+          if self.repo is not None or self._get_index() is not None:
+                row = self.find_student(student_id)
+                if row is None:
+                      print("Student not found.")
+                else:
+                      for r in self.enrolled_rows(row):
+                            print(f"Marks for {r['first_name']} {r['last_name']} ({r['courses']}): {r['marks']}")
+                return
           with open(self.file, 'r', newline='') as f:
             reader = csv.DictReader(f)
             found = False
             for row in reader:
                   if str(row.get("student_id", "")).strip() == str(student_id):
-                        print(f"Marks for {row['first_name']} {row['last_name']} ({row['courses']}): {row['marks']}")
+                        for r in self.enrolled_rows(row):
+                              print(f"Marks for {r['first_name']} {r['last_name']} ({r['courses']}): {r['marks']}")
                   found = True
             if not found:
                   print("Student not found.")
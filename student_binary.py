@@ -0,0 +1,237 @@
+import csv, math, mmap, os, struct
+from student_index import STUDENT_HEADER
+
+'''Optional binary storage for the student table. Every student is a fixed-width record in a
+memory-mapped file, so a record lives at HEADER.size + slot * RECORD.size and never moves:
+ - lookups go through an id -> slot map loaded from <path>.idx, then read one record
+ - grade/marks updates are in-place writes of a few bytes
+ - deletes clear the record's live flag
+The .idx file is a list of fixed (student_id, slot) pairs, appended on insert; a later pair for
+the same id wins. It is rebuilt from the records when it is missing or holds fewer pairs than
+there are slots (e.g. a crash between the two writes of an add). Marks are a double, so
+fractional marks survive. import_csv/export_csv convert to
+and from the students.csv layout; import_csv skips rows that do not fit a record and reports them.
+The methods mirror Student's (update_student_record, delete_new_student, check_my_grades, ...).'''
+
+MAGIC = b"CMGSTU02"
+HEADER = struct.Struct("<8sI4x")            # magic, number of slots used
+RECORD = struct.Struct("<B16s64s32s32s32s4sd")  # live, id, email, first, last, courses, grade, marks
+IDX = struct.Struct("<16sI")
+NO_MARKS = math.nan
+# byte offsets of the fields we patch in place
+FIELD_WIDTH = {"student_id": 16, "email_address": 64, "first_name": 32, "last_name": 32, "courses": 32, "grade": 4}
+OFFSET = {"live": 0, "student_id": 1, "email_address": 17, "first_name": 81, "last_name": 113,
+          "courses": 145, "grade": 177, "marks": 181}
+
+def _enc(field, value):
+    raw = str(value if value is not None else "").encode("utf-8")
+    if len(raw) > FIELD_WIDTH[field]:
+        raise ValueError(f"{field} '{value}' is longer than {FIELD_WIDTH[field]} bytes")
+    return raw
+
+def _dec(raw):
+    return raw.rstrip(b"\x00").decode("utf-8")
+
+def _marks(value):
+    if value is None or str(value).strip() == "":
+        return NO_MARKS
+    marks = float(value)
+    if math.isnan(marks):
+        raise ValueError(f"marks '{value}' is not a number")
+    return marks
+
+# whole marks print without the ".0", as they were written
+def _marks_text(marks):
+    if math.isnan(marks):
+        return ""
+    return str(int(marks)) if marks.is_integer() else repr(marks)
+
+# the packed record for a students.csv-style row; ValueError if it does not fit
+def _pack(row):
+    return RECORD.pack(1, *(_enc(f, v) for f, v in zip(STUDENT_HEADER[:6], row[:6])), _marks(row[6]))
+
+class BinaryStudentStore:
+    def __init__(self, path, grow_by=1024):
+        self.path = path
+        self.idx_path = path + ".idx"
+        self.grow_by = grow_by
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, 0))
+                f.write(b"\x00" * RECORD.size * grow_by)
+            open(self.idx_path, "wb").close()
+        self._f = open(path, "r+b")
+        self._mm = mmap.mmap(self._f.fileno(), 0)
+        magic, self.slots = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a binary student file")
+        self.slot_of = {}
+        pairs = 0
+        if os.path.exists(self.idx_path):
+            with open(self.idx_path, "rb") as f:
+                data = f.read()
+            for sid, slot in IDX.iter_unpack(data[:len(data) - len(data) % IDX.size]):
+                self.slot_of[_dec(sid)] = slot
+                pairs += 1
+        if pairs < self.slots:
+            self._rebuild_index()
+        self._idx = open(self.idx_path, "ab")
+
+    # every add appends one pair, so an index with fewer pairs than slots has lost some. The
+    # records hold their ids, deleted ones included; in slot order a re-added id's live slot
+    # comes last and wins, as it would in the appended index.
+    def _rebuild_index(self):
+        self.slot_of = {}
+        with open(self.idx_path, "wb") as f:
+            for slot in range(self.slots):
+                pos = self._pos(slot) + OFFSET["student_id"]
+                sid = self._mm[pos:pos + FIELD_WIDTH["student_id"]]
+                self.slot_of[_dec(sid)] = slot
+                f.write(IDX.pack(sid, slot))
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+        if getattr(self, "_idx", None):
+            self._idx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _pos(self, slot):
+        return HEADER.size + slot * RECORD.size
+
+    def _live_slot(self, student_id):
+        slot = self.slot_of.get(str(student_id))
+        if slot is None or not self._mm[self._pos(slot)]:
+            return None
+        return slot
+
+    def _row(self, slot):
+        live, sid, email, first, last, courses, grade, marks = RECORD.unpack_from(self._mm, self._pos(slot))
+        return [_dec(sid), _dec(email), _dec(first), _dec(last), _dec(courses), _dec(grade),
+                _marks_text(marks)]
+
+    def __len__(self):
+        return sum(1 for slot in set(self.slot_of.values()) if self._mm[self._pos(slot)])
+
+    def __iter__(self):
+        for slot in range(self.slots):
+            if self._mm[self._pos(slot)]:
+                yield dict(zip(STUDENT_HEADER, self._row(slot)))
+
+    def get(self, student_id):
+        slot = self._live_slot(student_id)
+        return dict(zip(STUDENT_HEADER, self._row(slot))) if slot is not None else None
+
+    # ---- writes ----
+    def add(self, row):
+        if isinstance(row, dict):
+            row = [row.get(c) for c in STUDENT_HEADER]
+        sid = str(row[0])
+        if self._live_slot(sid) is not None:
+            return False
+        packed = _pack(row)  # before anything is written, so a row that does not fit changes nothing
+        if self._pos(self.slots + 1) > len(self._mm):
+            self._grow()
+        slot = self.slots
+        self._mm[self._pos(slot):self._pos(slot + 1)] = packed
+        self.slots += 1
+        HEADER.pack_into(self._mm, 0, MAGIC, self.slots)
+        self._idx.write(IDX.pack(_enc("student_id", sid), slot))
+        self._idx.flush()
+        self.slot_of[sid] = slot
+        return True
+
+    def _grow(self):
+        self._mm.flush()
+        self._mm.close()
+        self._f.seek(0, os.SEEK_END)
+        self._f.write(b"\x00" * RECORD.size * max(self.grow_by, self.slots))
+        self._f.flush()
+        self._mm = mmap.mmap(self._f.fileno(), 0)
+
+    def _put(self, slot, field, value):
+        pos = self._pos(slot) + OFFSET[field]
+        if field == "marks":
+            struct.pack_into("<d", self._mm, pos, _marks(value))
+        else:
+            raw = _enc(field, value)
+            self._mm[pos:pos + FIELD_WIDTH[field]] = raw.ljust(FIELD_WIDTH[field], b"\x00")
+
+    def update_student_record(self, u, courses=None, grade=None, marks=None):
+        slot = self._live_slot(u.user_id)
+        if slot is None:
+            print(f"No student found with ID {u.user_id}. Update skipped.")
+            return False
+        changes = [(f, v) for f, v in (("email_address", u.email_address), ("first_name", u.first_name), ("last_name", u.last_name)) if v]
+        changes += [(f, v) for f, v in (("courses", courses), ("grade", grade), ("marks", marks)) if v is not None]
+        for field, value in changes:  # every value is checked before the first one is written
+            _marks(value) if field == "marks" else _enc(field, value)
+        for field, value in changes:
+            self._put(slot, field, value)
+        print("Student record updated successfully!")
+        return True
+
+    def delete_new_student(self, student_id):
+        slot = self._live_slot(student_id)
+        if slot is None:
+            print(f"No student found with ID {student_id}. Delete aborted.")
+            return False
+        self._mm[self._pos(slot)] = 0
+        print("Student deleted successfully!")
+        return True
+
+    # ---- views (same output as Student) ----
+    def display_records(self):
+        print(STUDENT_HEADER)
+        for slot in range(self.slots):
+            if self._mm[self._pos(slot)]:
+                print(self._row(slot))
+
+    def check_my_grades(self, student_id):
+        row = self.get(student_id)
+        if row is None:
+            print("Student record not found")
+        else:
+            print(f"Grade for {row['first_name']} {row['last_name']} ({row['courses']}): {row['grade']}")
+
+    def check_my_marks(self, student_id):
+        row = self.get(student_id)
+        if row is None:
+            print("Student not found.")
+        else:
+            print(f"Marks for {row['first_name']} {row['last_name']} ({row['courses']}): {row['marks']}")
+
+    # ---- conversion ----
+    # Adds every row that fits; a row with a too-long field or non-numeric marks is skipped
+    # (each add checks the whole row before writing it), so the import never stops halfway.
+    # Returns the number added.
+    def import_csv(self, csv_path):
+        added, rejected = 0, []
+        with open(csv_path, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    added += self.add(row)
+                except ValueError as e:
+                    rejected.append(f"{row.get('student_id')}: {e}")
+        if rejected:
+            print(f"Binary import: {added} students added, {len(rejected)} rejected.")
+            for reason in rejected:
+                print(f"  {reason}")
+        return added
+
+    def export_csv(self, csv_path):
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(STUDENT_HEADER)
+            for slot in range(self.slots):
+                if self._mm[self._pos(slot)]:
+                    writer.writerow(self._row(slot))
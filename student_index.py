@@ -0,0 +1,240 @@
+import csv, json, math, os
+from array import array
+from bisect import bisect_left, bisect_right
+from grade_scale import parse_marks
+from records import StudentRecord, intern_row, split_course_ids
+
+STUDENT_HEADER = ["student_id", "email_address", "first_name", "last_name", "courses", "grade", "marks"]
+
+'''In-memory index over students.csv. The table is parsed once and kept in two hash maps:
+student_id -> row and email_address -> student_id, so point lookups are O(1).
+Student keeps one of these when it is created with indexed=True and reloads it
+whenever the file signature (mtime, size) changes.
+With a mutation log (Student(..., log_writes=True)) the log is replayed over the
+base csv on load, so the index always reflects base file + log.
+The first marks/email query also builds sorted secondary indexes: (-marks, student_id) for the
+whole table and per course, and (email, student_id). Queries bisect into them, so top-k, range
+scans and rank are O(log n + k); put/drop keep them in step by bisecting out the old entry and
+inserting the new one.
+Rows with the standard header are held as StudentRecords (see records.py), with repeated
+values interned; any other layout stays a list with its courses/grade/marks interned. The
+student_id and email strings are created once per row and shared by the maps and the sorted
+indexes, which keep their pairs as two parallel sequences (an array of -marks, a list of ids)
+rather than one tuple per pair.'''
+
+class SortedPairs:
+    # (key, student_id) pairs in ascending order; typecode "d" keeps float keys in an array
+    def __init__(self, pairs=(), typecode=None):
+        pairs = sorted(pairs)
+        self.keys = array(typecode, [k for k, _ in pairs]) if typecode else [k for k, _ in pairs]
+        self.ids = [sid for _, sid in pairs]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # position of the first pair whose key is >= key
+    def bisect(self, key):
+        return bisect_left(self.keys, key)
+
+    def _find(self, key, sid):
+        lo = bisect_left(self.keys, key)
+        return bisect_left(self.ids, sid, lo, bisect_right(self.keys, key, lo))
+
+    def insert(self, key, sid):
+        i = self._find(key, sid)
+        self.keys.insert(i, key)
+        self.ids.insert(i, sid)
+
+    def remove(self, key, sid):
+        i = self._find(key, sid)
+        if i < len(self.ids) and self.ids[i] == sid and self.keys[i] == key:
+            del self.keys[i]
+            del self.ids[i]
+
+
+class StudentIndex:
+    def __init__(self, header=None):
+        self.header = list(header) if header else list(STUDENT_HEADER)
+        self.id_idx = self.header.index("student_id") if "student_id" in self.header else 0
+        self.email_idx = self.header.index("email_address") if "email_address" in self.header else 1
+        self.rows = {}      # student_id -> row (list, same layout as the csv)
+        self.by_email = {}  # email_address -> student_id
+        self.signature = None
+        self.log_entries = 0  # entries replayed from / appended to the mutation log
+        self.courses_idx = self.header.index("courses") if "courses" in self.header else 4
+        self.marks_idx = self.header.index("marks") if "marks" in self.header else 6
+        self.sorted_marks = None   # SortedPairs of (-marks, student_id), built on first use
+        self.course_marks = None   # course_id -> SortedPairs of (-marks, student_id)
+        self.sorted_emails = None  # SortedPairs of (email, student_id)
+        self.compact = self.header == STUDENT_HEADER
+        self.shared_idx = [i for i, c in enumerate(self.header) if c in ("courses", "grade", "marks")]
+
+    @classmethod
+    def load(cls, csv_file, log_file=None):
+        with open(csv_file, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            index = cls(next(reader, None))
+            for row in reader:
+                if row:
+                    index.put(row)
+        if log_file and os.path.exists(log_file):
+            with open(log_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        index.replay(json.loads(line))
+                        index.log_entries += 1
+        return index
+
+    # one entry of the mutation log; every op is idempotent so a replay after a crash is safe
+    def replay(self, entry):
+        op = entry.get("op")
+        if op == "add":
+            self.put([str(v) for v in entry["row"]])
+        elif op == "update":
+            self.update(entry["student_id"], entry["fields"])
+        elif op == "delete":
+            self.drop(entry["student_id"])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, student_id):
+        return str(student_id) in self.rows
+
+    def get(self, student_id):
+        return self.rows.get(str(student_id))
+
+    def find_by_email(self, email):
+        sid = self.by_email.get(email)
+        return self.rows.get(sid) if sid is not None else None
+
+    def as_dict(self, row):
+        return dict(zip(self.header, row)) if row is not None else None
+
+    # ---- sorted secondary indexes ----
+    def _marks_key(self, row):
+        m = parse_marks(row[self.marks_idx]) if len(row) > self.marks_idx else None
+        return None if m is None else -m
+
+    def _row_courses(self, row):
+        return split_course_ids(row[self.courses_idx]) if len(row) > self.courses_idx else []
+
+    def build_sorted(self):
+        if self.sorted_marks is not None:
+            return
+        marks, courses, emails = [], {}, []
+        for sid, row in self.rows.items():
+            key = self._marks_key(row)
+            if key is not None:
+                marks.append((key, sid))
+                for cid in self._row_courses(row):
+                    courses.setdefault(cid, []).append((key, sid))
+        # the by_email keys are the email strings already held; a row whose email another row
+        # took over in by_email brings its own
+        for email, sid in self.by_email.items():
+            emails.append((email, sid))
+        if len(emails) < len(self.rows):
+            emails += [(row[self.email_idx], sid) for sid, row in self.rows.items() if self.by_email.get(row[self.email_idx]) != sid]
+        self.sorted_marks = SortedPairs(marks, "d")
+        self.course_marks = {cid: SortedPairs(keys, "d") for cid, keys in courses.items()}
+        self.sorted_emails = SortedPairs(emails)
+
+    def _unsort(self, row, sid, email):
+        key = self._marks_key(row)
+        if key is not None:
+            self.sorted_marks.remove(key, sid)
+            for cid in self._row_courses(row):
+                keys = self.course_marks.get(cid)
+                if keys is not None:
+                    keys.remove(key, sid)
+                    if not keys:
+                        del self.course_marks[cid]
+        self.sorted_emails.remove(email, sid)
+
+    def _sort_in(self, row, sid, email):
+        key = self._marks_key(row)
+        if key is not None:
+            self.sorted_marks.insert(key, sid)
+            for cid in self._row_courses(row):
+                if cid not in self.course_marks:
+                    self.course_marks[cid] = SortedPairs(typecode="d")
+                self.course_marks[cid].insert(key, sid)
+        self.sorted_emails.insert(email, sid)
+
+    def _marks_keys(self, course=None):
+        self.build_sorted()
+        return self.sorted_marks if course is None else self.course_marks.get(course, SortedPairs())
+
+    # the k highest marks (ties by student_id), overall or in one course
+    def top(self, k, course=None):
+        return [self.rows[sid] for sid in self._marks_keys(course).ids[:k]]
+
+    # rows with lo <= marks <= hi, highest first
+    def marks_range(self, lo, hi, course=None):
+        keys = self._marks_keys(course)
+        start = keys.bisect(-float(hi))
+        end = keys.bisect(math.nextafter(-float(lo), math.inf))
+        return [self.rows[sid] for sid in keys.ids[start:end]]
+
+    # (rank, out of, percentile) by marks, rank 1 = highest; ties share the better rank and the
+    # percentile is the share of students with marks <= this one's. None without numeric marks.
+    def rank(self, student_id, course=None):
+        row = self.rows.get(str(student_id))
+        key = self._marks_key(row) if row is not None else None
+        if key is None:
+            return None
+        keys = self._marks_keys(course)
+        if not keys:
+            return None
+        above = keys.bisect(key)
+        return above + 1, len(keys), 100.0 * (len(keys) - above) / len(keys)
+
+    # rows in email order, starting at the first email >= start, optionally only those with a prefix
+    def by_email_order(self, start="", prefix="", limit=None):
+        self.build_sorted()
+        emails = self.sorted_emails
+        out = []
+        for i in range(emails.bisect(max(start, prefix)), len(emails)):
+            if not emails.keys[i].startswith(prefix) or (limit is not None and len(out) >= limit):
+                break
+            out.append(self.rows[emails.ids[i]])
+        return out
+
+    # ---- maintenance (kept in step with the writes Student makes) ----
+    def put(self, row):
+        row = StudentRecord.pack_row(row) if self.compact else intern_row(list(row), self.shared_idx)
+        sid = row[self.id_idx]
+        email = row[self.email_idx]
+        old = self.rows.get(sid)
+        if old is not None:
+            old_email = old[self.email_idx]
+            if self.by_email.get(old_email) == sid:
+                sid = self.by_email.pop(old_email)  # the id object the maps already hold
+            if self.sorted_marks is not None:
+                self._unsort(old, sid, old_email)
+        if self.sorted_marks is not None:
+            self._sort_in(row, sid, email)
+        self.rows[sid] = row
+        self.by_email[email] = sid
+
+    def update(self, student_id, fields):
+        row = self.rows.get(str(student_id))
+        if row is None:
+            return None
+        row = list(row)
+        for col, value in fields.items():
+            row[self.header.index(col)] = str(value)
+        self.put(row)
+        return row
+
+    def drop(self, student_id):
+        sid = str(student_id)
+        row = self.rows.pop(sid, None)
+        if row is None:
+            return None
+        email = row[self.email_idx]
+        if self.by_email.get(email) == sid:
+            del self.by_email[email]
+        if self.sorted_marks is not None:
+            self._unsort(row, sid, email)
+        return row
@@ -1,9 +1,25 @@
-import os, csv, time, random, unittest
+import asyncio, contextlib, csv, io, json, multiprocessing, os, random, shutil, sqlite3, sys, tempfile, time, unittest
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean, median, pstdev, quantiles
+from unittest import mock
 from student import Student
 from professor import Professor
 from course import Course
 from user import User
 from login import LoginCredential
+from grade_scale import TAIL_BLOCK, GradeScale, RunningStats
+from grade_columns import ColumnarGradeScale
+from grade_stream import iter_grade_rows, stream_grade_report
+from grade_sketch import CourseDistributions
+from student_binary import BinaryStudentStore
+from storage import CsvStorage, SqliteStorage, migrate
+from integrity import Integrity
+from enrolment import EnrolmentStore
+from records import StudentRecord, CredentialRecord
+from student_index import StudentIndex
+from safe_io import atomic_write, iter_snapshot
+from server import GradeServer
+import bench_memory, bench_suite, gen_dataset, grade_columns, loadgen, metrics
 
 # === CSV file paths (current folder) ===
 STUDENTS_CSV   = "students.csv"
@@ -21,7 +37,22 @@ def read_all(path):
     with open(path, "r", newline="", encoding="utf-8") as f:
         return list(csv.reader(f))
 
+# one admin session in its own process (module level so it can be started with spawn too)
+def update_marks_worker(path, ids, marks):
+    students = Student(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for sid in ids:
+            students.update_student_record(User(sid, "", "", "", "student"), marks=marks)
+
 class BasicTests(unittest.TestCase):
+    # every test gets its own temp directory; copy() puts a file (e.g. one of the csvs above) in it
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def copy(self, src, name=None):
+        return shutil.copy(src, os.path.join(self.tmp, name or os.path.basename(src)))
+
     @classmethod
     def setUpClass(cls):
         # Make sure CSVs exist with the expected columns
@@ -47,14 +78,13 @@ class BasicTests(unittest.TestCase):
         rows = read_all(STUDENTS_CSV)
         have = max(0, len(rows) - 1)
         need = 1010 - have
+        seed = []
         for i in range(have + 1, have + need + 1):
-            sid = str(i)
-            email = f"student{i}@example.edu"
-            first, last = f"FN{i}", f"LN{i}"
             marks = random.randint(0, 100)
-            u = User(sid, email, first, last, "student")
-            cls.students.add_new_student(LOGIN_CSV, u, password="pw", courses="C101",
-                                         grade=("A" if marks > 90 else "B"), marks=marks)
+            seed.append({"student_id": str(i), "email_address": f"student{i}@example.edu",
+                         "first_name": f"FN{i}", "last_name": f"LN{i}", "courses": "C101",
+                         "grade": ("A" if marks > 90 else "B"), "marks": marks})
+        cls.students.add_students_bulk(LOGIN_CSV, seed, password="pw")
             
         # Seed for courses (I am considering 50)
         rows = read_all(COURSES_CSV)
@@ -76,22 +106,12 @@ class BasicTests(unittest.TestCase):
         course_ids = [r[0] for r in course_rows[1:] if r] or ["C101"]
 
         # seed for profs ( I am taking 100)
-        rows = read_all(PROFESSORS_CSV)
-        existing_prof_ids = {r[0] for r in rows[1:] if r}
-
-        for i in range(1, 101):
-            pid = f"P{i}"
-            if pid in existing_prof_ids:
-                continue
-            # cycling through available courses so each prof teaches at least one course
-            c_id = course_ids[(i - 1) % len(course_ids)]
-            u = User(pid, f"prof{i}@example.edu", f"Prof{i}", "LN", "professor")
-            try:
-                cls.profs.add_new_professor(
-                    LOGIN_CSV, u, password="pw", c_id=c_id, rank="Assistant"
-                )
-            except Exception:
-                pass
+        # cycling through available courses so each prof teaches at least one course;
+        # ids that already exist are rejected by the bulk import
+        seed = [{"professor_id": f"P{i}", "email_address": f"prof{i}@example.edu", "first_name": f"Prof{i}",
+                 "last_name": "LN", "course_id": course_ids[(i - 1) % len(course_ids)], "rank": "Assistant"}
+                for i in range(1, 101)]
+        cls.profs.add_professors_bulk(LOGIN_CSV, seed, password="pw")
 
     # 1) Students add/delete/modify (file must have >= 1000 records)
     def test_students_crud_basic(self):
@@ -215,5 +235,1019 @@ class BasicTests(unittest.TestCase):
 
         self.assertTrue(self.profs.delete_professor("P1"))
 
+    def test_indexed_student_lookup(self):
+        # work on a copy so the shared csv files are not touched
+        path = self.copy(STUDENTS_CSV)
+        indexed = Student(path, indexed=True)
+        plain = Student(path)
+
+        rows = read_all(path)
+        sample = rows[1:][:50]
+        for r in sample:
+            self.assertEqual(indexed.find_student(r[0]), plain.find_student(r[0]))
+            self.assertEqual(indexed.find_by_email(r[1])["student_id"], r[0])
+
+        sid = sample[0][0]
+        indexed.update_student_record(User(sid, "moved@example.edu", "", "", "student"), grade="C", marks=70)
+        self.assertEqual(indexed.find_student(sid)["grade"], "C")
+        self.assertEqual(indexed.find_by_email("moved@example.edu")["student_id"], sid)
+        self.assertIsNone(indexed.find_by_email(sample[0][1]))
+
+        indexed.delete_new_student(sid)
+        self.assertIsNone(indexed.find_student(sid))
+
+        # a write made through another instance is picked up via the file signature
+        plain.update_student_record(User(sample[1][0], "", "", "", "student"), grade="F")
+        self.assertEqual(indexed.find_student(sample[1][0])["grade"], "F")
+
+    def test_logged_student_writes(self):
+        logged_path = self.copy(STUDENTS_CSV, "logged.csv")
+        plain_path = self.copy(STUDENTS_CSV, "plain.csv")
+        logged = Student(logged_path, log_writes=True, compact_threshold=10**6)
+        plain = Student(plain_path)
+        size_before = os.path.getsize(logged_path)
+
+        ids = [r[0] for r in read_all(plain_path)[1:]][:20]
+        for s in (logged, plain):
+            for sid in ids[:10]:
+                s.update_student_record(User(sid, "", f"LOG{sid}", "", "student"), courses="C102", marks=55)
+            for sid in ids[10:15]:
+                s.delete_new_student(sid)
+            s.add_new_student(os.path.join(self.tmp, "login.csv"), User(ids[10], "back@example.edu", "Back", "Again", "student"),
+                              "pw", courses="C101", grade="B", marks=80)
+
+        # base file untouched, everything went to the log
+        self.assertEqual(os.path.getsize(logged_path), size_before)
+        self.assertTrue(os.path.exists(logged.log_file))
+
+        # a fresh instance replays the log
+        reopened = Student(logged_path, log_writes=True)
+        for sid in ids:
+            self.assertEqual(reopened.find_student(sid), plain.find_student(sid))
+
+        self.assertTrue(reopened.compact())
+        self.assertFalse(os.path.exists(reopened.log_file))
+        self.assertEqual(read_all(logged_path), read_all(plain_path))
+
+    def test_bulk_import(self):
+        path = self.copy(STUDENTS_CSV)
+        login_path = os.path.join(self.tmp, "login.csv")
+        ensure_header(login_path, ["Email", "Password", "Salt", "Role"])
+        students = Student(path)
+        existing = read_all(path)[1][0]
+
+        batch = [{"student_id": f"B{i}", "email_address": f"bulk{i}@example.edu", "first_name": "B",
+                  "last_name": "L", "courses": "C101", "grade": "B", "marks": 70} for i in range(200)]
+        batch.append({"student_id": "B0", "email_address": "dup@example.edu"})      # duplicate inside the batch
+        batch.append({"student_id": existing, "email_address": "old@example.edu"})  # already in the table
+        self.assertEqual(students.add_students_bulk(login_path, batch, password="pw"), (200, 2))
+
+        ids = [r[0] for r in read_all(path)[1:]]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(read_all(login_path)) - 1, 200)
+        self.assertEqual(LoginCredential(login_path).login("bulk7@example.edu", "pw").role, "student")
+
+        # same rows again from a csv source: all rejected
+        src = os.path.join(self.tmp, "src.csv")
+        with open(src, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(batch[0]))
+            w.writeheader()
+            w.writerows(batch[:200])
+        self.assertEqual(students.add_students_bulk(login_path, src, password="pw"), (0, 200))
+
+    def test_parallel_hashing_keeps_order(self):
+        lc = LoginCredential(self.copy(LOGIN_CSV))
+        passwords = [f"pw{i}" for i in range(40)]
+        hashes = lc.hash_passwords(passwords, workers=4)
+        self.assertEqual(len(hashes), len(passwords))
+        for pw, (salt_hex, pwd_hash) in zip(passwords, hashes):
+            self.assertTrue(lc.decrypt_password(pw, salt_hex, pwd_hash))
+
+    def test_login_index_reloads_on_change(self):
+        login_path = os.path.join(self.tmp, "login.csv")
+        ensure_header(login_path, ["Email", "Password", "Salt", "Role"])
+        lc = LoginCredential(login_path, cache_size=3)
+        lc.add_credentials([(f"user{i}@example.edu", "pw", "student") for i in range(10)])
+
+        for i in range(10):
+            self.assertEqual(lc.login(f"user{i}@example.edu", "pw").role, "student")
+        self.assertIsNone(lc.login("user1@example.edu", "wrong"))
+        self.assertIsNone(lc.login("nobody@example.edu", "pw"))
+        self.assertLessEqual(len(lc._recent), 3)
+
+        # another writer appends an account: picked up without re-creating the object
+        LoginCredential(login_path).add_credentials([("late@example.edu", "pw2", "professor")])
+        self.assertEqual(lc.login("late@example.edu", "pw2").role, "professor")
+
+    def test_rehash_on_login(self):
+        login_path = os.path.join(self.tmp, "login.csv")
+        ensure_header(login_path, ["Email", "Password", "Salt", "Role"])  # legacy layout, no Iterations
+        LoginCredential(login_path).add_credentials([(f"old{i}@example.edu", "pw", "student") for i in range(3)])
+
+        lc = LoginCredential(login_path, iters=2000, rehash_batch=2)
+        self.assertEqual(lc.login("old0@example.edu", "pw").role, "student")
+        self.assertEqual(len(read_all(login_path)[0]), 4)  # queued, not written yet
+        self.assertEqual(lc.login("old1@example.edu", "pw").role, "student")  # batch full -> written back
+
+        rows = {r["Email"]: r for r in lc.csv_to_json(login_path)}
+        self.assertEqual(rows["old0@example.edu"]["Iterations"], "2000")
+        self.assertEqual(rows["old1@example.edu"]["Iterations"], "2000")
+        self.assertEqual(rows["old2@example.edu"]["Iterations"], "1000")
+
+        # both generations keep working, and change_password writes the current cost
+        fresh = LoginCredential(login_path, iters=2000)
+        self.assertEqual(fresh.login("old0@example.edu", "pw").role, "student")
+        self.assertEqual(fresh.login("old2@example.edu", "pw").role, "student")
+        self.assertTrue(fresh.change_password(login_path, "old2@example.edu", "pw", "new"))
+        self.assertEqual(LoginCredential(login_path, iters=2000).login("old2@example.edu", "new").role, "student")
+
+        # a rehash queued before the password changed elsewhere is not written over the new hash
+        stale = LoginCredential(login_path, iters=3000, rehash_batch=10)
+        stale.login("old2@example.edu", "new")
+        self.assertTrue(LoginCredential(login_path, iters=2000).change_password(login_path, "old2@example.edu", "new", "newer"))
+        self.assertEqual(stale.flush_rehashes(), 0)
+        self.assertEqual(LoginCredential(login_path).login("old2@example.edu", "newer").role, "student")
+
+        self.assertGreaterEqual(LoginCredential.calibrate_iterations(target_ms=5), 1000)
+
+        # one instance shared by several threads queues each rehash once
+        LoginCredential(login_path).add_credentials([(f"par{i}@example.edu", "pw", "student") for i in range(8)])
+        shared = LoginCredential(login_path, iters=2000, rehash_batch=100)
+        emails = [f"par{i % 8}@example.edu" for i in range(32)]
+        with ThreadPoolExecutor(4) as pool:
+            roles = list(pool.map(lambda e: shared.login(e, "pw").role, emails))
+        self.assertEqual(roles, ["student"] * 32)
+        self.assertEqual(shared.flush_rehashes(), 8)
+
+        # a row hashed above our cost is not rehashed down to it
+        low = LoginCredential(login_path, rehash_batch=10)
+        self.assertEqual(low.login("old0@example.edu", "pw").role, "student")
+        self.assertEqual(low._pending, {})
+
+        # the calibrated cost is saved next to login.csv and reused, so restarts do not rehash
+        with mock.patch.dict(os.environ, {"CHECKMYGRADE_ITERS": ""}):
+            saved = LoginCredential.configured_iterations(login_path, target_ms=5)
+            self.assertEqual(LoginCredential.configured_iterations(login_path, target_ms=500), saved)
+        with mock.patch.dict(os.environ, {"CHECKMYGRADE_ITERS": "4000"}):
+            self.assertEqual(LoginCredential.configured_iterations(login_path), 4000)
+
+        # new accounts are hashed at the configured cost
+        with contextlib.redirect_stdout(io.StringIO()):
+            Student(self.copy(STUDENTS_CSV), iters=2000).add_new_student(
+                login_path, User("N1", "new1@example.edu", "N", "One", "student"), "pw", "C101", "A", 90)
+        rows = {r["Email"]: r for r in lc.csv_to_json(login_path)}
+        self.assertEqual(rows["new1@example.edu"]["Iterations"], "2000")
+
+    def test_rehash_through_csv_storage_keeps_the_cost(self):
+        login_path = os.path.join(self.tmp, "login.csv")
+        ensure_header(login_path, ["Email", "Password", "Salt", "Role"])  # legacy layout, no Iterations
+        LoginCredential(login_path).add_credentials([("old@example.edu", "pw", "student")])
+        storage = CsvStorage(*[os.path.join(self.tmp, f"{t}.csv") for t in ("students", "professors", "courses")], login_path)
+
+        lc = LoginCredential(login_path, iters=2000, storage=storage)
+        lc.add_credentials([("new@example.edu", "pw", "student")])
+        self.assertEqual(read_all(login_path)[0], ["Email", "Password", "Salt", "Role", "Iterations"])
+        self.assertEqual(lc.login("new@example.edu", "pw").role, "student")
+        self.assertEqual(lc.login("old@example.edu", "pw").role, "student")
+        self.assertEqual(lc.flush_rehashes(), 1)
+        fresh = LoginCredential(login_path, iters=2000, storage=storage)
+        self.assertEqual(fresh.login("old@example.edu", "pw").role, "student")
+        self.assertEqual(storage.login.get("old@example.edu")["Iterations"], "2000")
+
+    def test_login_session_resolves_rows(self):
+        paths = {os.path.basename(src): self.copy(src) for src in (STUDENTS_CSV, PROFESSORS_CSV, COURSES_CSV)}
+        login_path = os.path.join(self.tmp, "login.csv")
+        students, profs, courses = Student(paths["students.csv"]), Professor(paths["professors.csv"]), Course(paths["courses.csv"])
+        students.add_new_student(login_path, User("S1", "s1@example.edu", "Sam", "One", "student"), "pw", courses="C101", grade="A", marks=95)
+        profs.add_new_professor(login_path, User("PS1", "ps1@example.edu", "Pat", "S", "professor"), "pw", "C001", "Assistant")
+
+        lc = LoginCredential(login_path)
+        s = lc.login("s1@example.edu", "pw", students, profs, courses)
+        self.assertEqual((s.role, s.user_id), ("student", "S1"))
+        self.assertEqual(s.records[0]["grade"], "A")
+        self.assertIn("C101", s.courses)
+
+        p = lc.login("ps1@example.edu", "pw", students, profs, courses)
+        self.assertEqual((p.role, p.user_id), ("professor", "PS1"))
+        self.assertEqual(p.courses["C001"]["course_name"], "Course 1")
+
+        # the menus' views are served from the session, not the files
+        for path in paths.values():
+            os.remove(path)
+        s.print_grades(); s.print_marks()
+        self.assertTrue(p.print_course_details())
+
+    def test_grade_scale_running_stats(self):
+        rnd = random.Random(7)
+        gs = GradeScale()
+        for i in range(300):
+            gs.add_grade(f"S{i % 60}", f"C{i % 5}", rnd.randint(0, 100))
+        for i in range(0, 60, 7):
+            gs.modify_grade(f"S{i}", f"C{i % 5}", rnd.randint(0, 100))
+        for i in range(0, 60, 11):
+            gs.delete_grade(f"S{i}", f"C{(i + 1) % 5}")
+
+        def expected(course=None):
+            g = [r["grade"] for r in gs.records.values() if course is None or r["course"] == course]
+            return round(mean(g), 2), round(median(g), 2)
+
+        for course in [None, "C0", "C1", "C2", "C3", "C4"]:
+            self.assertEqual((gs.avg(course), gs.med(course)), expected(course))
+        self.assertIsNone(gs.avg("nope"))
+
+        # the two-heap median under many duplicate adds and removes
+        stats, live = RunningStats(), []
+        for _ in range(3000):
+            if live and rnd.random() < 0.45:
+                stats.remove(live.pop(rnd.randrange(len(live))))
+            else:
+                live.append(float(rnd.randint(0, 20)))
+                stats.add(live[-1])
+            self.assertEqual(stats.median(), median(live) if live else None)
+        self.assertLessEqual(len(stats.low) + len(stats.high), 2 * len(live) + 64)
+
+    def test_columnar_grade_scale_matches(self):
+        def build(cls):
+            rnd = random.Random(3)
+            gs = cls()
+            for i in range(400):
+                gs.add_grade(f"S{i % 80}", f"C{i % 7}", float(rnd.randint(0, 100)))
+            gs.modify_grade("S5", "C5", 12.0)
+            gs.delete_grade("S3", "C3")
+            for _ in range(300):  # deletes move rows around, upserts must still find them
+                sid, course = f"S{rnd.randint(0, 79)}", f"C{rnd.randint(0, 6)}"
+                if rnd.random() < 0.5:
+                    gs.delete_grade(sid, course)
+                else:
+                    gs.add_grade(sid, course, float(rnd.randint(0, 100)))
+            return gs
+
+        def report(gs, by):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                gs.display_grade_report(by)
+            return out.getvalue()
+
+        ref = build(GradeScale)
+        numpy_mod = grade_columns.np
+        for np_mod in ([numpy_mod, None] if numpy_mod is not None else [None]):
+            grade_columns.np = np_mod
+            try:
+                col = build(ColumnarGradeScale)
+                key = lambda r: (r["student_id"], r["course"])
+                self.assertEqual(sorted(col.records, key=key), sorted(ref.records.values(), key=key))
+                for course in [None, "C0", "C3", "C6", "missing"]:
+                    self.assertEqual((col.avg(course), col.med(course)), (ref.avg(course), ref.med(course)))
+                for by in ("student_id", "course"):
+                    self.assertEqual(report(col, by), report(ref, by))
+            finally:
+                grade_columns.np = numpy_mod
+
+    def test_grade_scale_sync_is_incremental(self):
+        path = self.copy(STUDENTS_CSV)
+        students = Student(path)
+
+        def expected():
+            g = GradeScale()
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    g.add_grade(row["student_id"], row["courses"], float(row["marks"]))
+            return g
+
+        for cls in (GradeScale, ColumnarGradeScale):
+            gs = cls()
+            n = gs.sync_students(path)
+            self.assertEqual(n, len(expected().records))
+            self.assertEqual(gs.sync_students(path), 0)  # nothing changed: no double counting
+            self.assertEqual(len(gs.records), n)
+
+        gs = GradeScale()
+        gs.sync_students(path)
+        students.add_new_student(os.path.join(self.tmp, "login.csv"), User("Z1", "z1@example.edu", "Z", "One", "student"), "pw", "C101", "A", 93)
+        self.assertEqual(gs.sync_students(path), 1)  # appended row only
+        sid = read_all(path)[1][0]
+        students.update_student_record(User(sid, "", "", "", "student"), courses="C007", marks=41)
+        students.delete_new_student(read_all(path)[2][0])
+        self.assertEqual(gs.sync_students(path), 2)
+        ref = expected()
+        self.assertEqual(gs.records, ref.records)
+        self.assertEqual((gs.avg(), gs.med()), (ref.avg(), ref.med()))
+
+    def test_grade_scale_sync_checks_only_the_consumed_tail(self):
+        path = os.path.join(self.tmp, "students.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["student_id", "email_address", "first_name", "last_name", "courses", "grade", "marks"])
+            w.writerows([f"S{i:05d}", f"s{i}@example.edu", "F", "L", "C1", "B", "80"] for i in range(6000))
+        self.assertGreater(os.path.getsize(path), 2 * TAIL_BLOCK)
+        gs = GradeScale()
+        gs.sync_students(path)
+
+        reads = []
+        real_open = open
+        class Counting(io.BufferedReader):
+            def read(self, n=-1):
+                block = super().read(n)
+                reads.append(len(block))
+                return block
+        def counting_open(file, mode="r", *a, **kw):
+            return Counting(io.FileIO(file, "r")) if file == path and mode == "rb" else real_open(file, mode, *a, **kw)
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(["S99999", "z@example.edu", "Z", "Z", "C2", "A", "95"])
+        with mock.patch("grade_scale.open", counting_open, create=True):
+            self.assertEqual(gs.sync_students(path), 1)
+        self.assertLessEqual(sum(reads), TAIL_BLOCK + 100)  # not the whole prefix
+        self.assertEqual(gs.records[("S99999", "C2")]["grade"], 95.0)
+
+        # the consumed tail rewritten in place (same inode, same size): diffed in full
+        with open(path, "r+b") as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b"50\r\n")
+        self.assertEqual(gs.sync_students(path), 1)
+        self.assertEqual(gs.records[("S99999", "C2")]["grade"], 50.0)
+
+    def test_streaming_report_matches_in_memory(self):
+        gs = GradeScale()
+        gs.sync_students(STUDENTS_CSV)
+        for by in ("student_id", "course"):
+            expected, streamed = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(expected):
+                gs.display_grade_report(by)
+            with contextlib.redirect_stdout(streamed):
+                stream_grade_report(iter_grade_rows(STUDENTS_CSV), by, memory_budget=97)  # forces several spilled runs
+            self.assertEqual(streamed.getvalue(), expected.getvalue())
+            merged = io.StringIO()
+            with contextlib.redirect_stdout(merged):
+                stream_grade_report(iter_grade_rows(STUDENTS_CSV), by, memory_budget=97, fan_in=3)  # multi-pass merge
+            self.assertEqual(merged.getvalue(), expected.getvalue())
+
+    def test_course_distribution_sketches(self):
+        rnd = random.Random(11)
+        rows = [(f"S{i}", f"C{i % 3}", rnd.randint(0, 100)) for i in range(3000)]
+        whole = CourseDistributions.from_rows(rows)
+        # two shards, serialised and merged, give the same sketch as one pass
+        left = CourseDistributions.from_rows(rows[:1234])
+        right = CourseDistributions.from_json(CourseDistributions.from_rows(rows[1234:]).to_json())
+        merged = left.merge(right)
+
+        for course in ("C0", "C1", "C2"):
+            marks = [g for _, c, g in rows if c == course]
+            s, m = whole.sketches[course], merged.sketches[course]
+            self.assertEqual(s.counts, m.counts)
+            self.assertEqual((s.count, s.min, s.max), (len(marks), min(marks), max(marks)))
+            self.assertAlmostEqual(s.mean, mean(marks), places=6)
+            self.assertAlmostEqual(m.mean, mean(marks), places=6)
+            self.assertAlmostEqual(m.std(), pstdev(marks), places=6)
+            exact = quantiles(marks, n=20, method="inclusive")  # 5% steps
+            for q, e in ((0.10, exact[1]), (0.25, exact[4]), (0.75, exact[14]), (0.90, exact[17])):
+                self.assertLessEqual(abs(s.quantile(q) - e), 1.0 + 1e-9)  # one bin width
+            self.assertEqual(sum(c for _, _, c in s.histogram()), len(marks))
+
+    def test_binary_student_store(self):
+        bin_path = os.path.join(self.tmp, "students.bin")
+        with BinaryStudentStore(bin_path, grow_by=64) as store:  # small growth step exercises remapping
+            added = store.import_csv(STUDENTS_CSV)
+            self.assertEqual(added, len(read_all(STUDENTS_CSV)) - 1)
+            store.export_csv(os.path.join(self.tmp, "out.csv"))
+        self.assertEqual(read_all(os.path.join(self.tmp, "out.csv")), read_all(STUDENTS_CSV))
+
+        sid, other = read_all(STUDENTS_CSV)[1][0], read_all(STUDENTS_CSV)[2][0]
+        size = os.path.getsize(bin_path)
+        with BinaryStudentStore(bin_path) as store:
+            self.assertTrue(store.update_student_record(User(sid, "", "", "", "student"), grade="C", marks=61))
+            self.assertTrue(store.delete_new_student(other))
+            self.assertFalse(store.add({"student_id": sid}))
+            with self.assertRaises(ValueError):
+                store.add({"student_id": "X" * 40})
+        self.assertEqual(os.path.getsize(bin_path), size)  # updates were in place
+
+        with BinaryStudentStore(bin_path) as store:
+            self.assertEqual((store.get(sid)["grade"], store.get(sid)["marks"]), ("C", "61"))
+            self.assertIsNone(store.get(other))
+            self.assertTrue(store.add({"student_id": other, "email_address": "again@example.edu", "marks": ""}))
+            self.assertEqual(store.get(other)["email_address"], "again@example.edu")
+            self.assertEqual(len(store), added)
+            # fractional marks are kept; a bad value changes none of the fields
+            self.assertTrue(store.update_student_record(User(sid, "", "", "", "student"), marks=99.5))
+            self.assertEqual(store.get(sid)["marks"], "99.5")
+            with self.assertRaises(ValueError):
+                store.update_student_record(User(sid, "", "", "", "student"), grade="B", marks="n/a")
+            self.assertEqual((store.get(sid)["grade"], store.get(sid)["marks"]), ("C", "99.5"))
+
+        # a lost or truncated .idx is rebuilt from the records; the re-added id keeps its new slot
+        for damage in ("remove", "truncate"):
+            if damage == "remove":
+                os.remove(bin_path + ".idx")
+            else:
+                with open(bin_path + ".idx", "r+b") as f:
+                    f.truncate(os.path.getsize(bin_path + ".idx") // 2)
+            with BinaryStudentStore(bin_path) as store:
+                self.assertEqual((len(store), store.get(other)["email_address"], store.get(sid)["marks"]),
+                                 (added, "again@example.edu", "99.5"))
+
+        # rows that do not fit are reported and skipped, the rest are imported
+        bad_csv = os.path.join(self.tmp, "bad.csv")
+        with open(bad_csv, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows([read_all(STUDENTS_CSV)[0], ["B1", "b1@example.edu", "B", "One", "C101", "A", "90.25"],
+                                     ["B2", "x" * 80 + "@example.edu", "B", "Two", "C101", "A", "80"],
+                                     ["B3", "b3@example.edu", "B", "Three", "C101", "A", "70"]])
+        with contextlib.redirect_stdout(io.StringIO()) as out, BinaryStudentStore(os.path.join(self.tmp, "bad.bin")) as store:
+            self.assertEqual(store.import_csv(bad_csv), 2)
+            self.assertEqual((store.get("B1")["marks"], store.get("B2"), store.get("B3")["marks"]), ("90.25", None, "70"))
+        self.assertIn("1 rejected", out.getvalue())
+
+    def test_storage_backends_agree(self):
+        csv_paths = [self.copy(src) for src in (STUDENTS_CSV, PROFESSORS_CSV, COURSES_CSV, LOGIN_CSV)]
+        db = os.path.join(self.tmp, "grades.db")
+        counts = migrate(db, *csv_paths)
+        self.assertEqual(counts["students"], len(read_all(STUDENTS_CSV)) - 1)
+
+        def exercise(storage):
+            students = Student(csv_paths[0], storage=storage)
+            profs = Professor(csv_paths[1], storage=storage)
+            courses = Course(csv_paths[2], storage=storage)
+            login = LoginCredential(csv_paths[3], storage=storage)
+            out = []
+            out.append(students.add_new_student(csv_paths[3], User("DB1", "db1@example.edu", "D", "B", "student"), "pw", "C101", "A", 91))
+            out.append(students.add_new_student(csv_paths[3], User("DB1", "db1@example.edu", "D", "B", "student"), "pw"))
+            students.update_student_record(User("DB1", "", "Dee", "", "student"), grade="B", marks=85)
+            sid = read_all(STUDENTS_CSV)[3][0]
+            students.delete_new_student(sid)
+            out += [students.find_student("DB1"), students.find_student(sid), students.find_by_email("db1@example.edu")["student_id"]]
+            out.append(students.add_students_bulk(csv_paths[3], [{"student_id": "DB1"}, {"student_id": "DB2", "email_address": "db2@example.edu"}], "pw"))
+            out.append(courses.add_new_course("DBC", "Databases", "4", "SQL"))
+            out.append(courses.delete_new_course("DBC"))
+            out.append(courses.delete_new_course("DBC"))
+            out.append(profs.modify_professor_details(User("P2", "", "", "Renamed", "professor"), rank="Full"))
+            out.append(profs.find_by_email("prof2@example.edu"))
+            out.append(profs.delete_professor("P3"))
+            out.append(profs.delete_professor("P3"))
+            session = login.login("db1@example.edu", "pw", students, profs, courses)
+            out += [session.role, session.records, sorted(session.courses)]
+            out.append(login.change_password(csv_paths[3], "db2@example.edu", "pw", "new"))
+            out.append(login.login("db2@example.edu", "new").role)
+            gs = GradeScale()
+            gs.sync_students(students.repo or csv_paths[0])
+            out.append((len(gs.records), gs.avg(), gs.med()))
+            return out
+
+        sqlite_storage = SqliteStorage(db)
+        try:
+            on_sqlite = exercise(sqlite_storage)
+        finally:
+            sqlite_storage.close()
+        on_csv = exercise(CsvStorage(*csv_paths))
+        self.assertEqual(on_sqlite, on_csv)
+
+        # one connection shared by reader threads and a writer thread, as in server.py
+        shared = SqliteStorage(db)
+        self.addCleanup(shared.close)
+        total = shared.students.count()
+        def write():
+            for i in range(200):
+                shared.students.insert([{"student_id": f"T{i}", "email_address": f"t{i}@example.edu"}])
+                shared.students.update(f"T{i}", {"marks": i})
+        def read():
+            return [len(list(shared.students.all())) for _ in range(5)] + [shared.students.find_one("email_address", "t0@example.edu") is not None]
+        with ThreadPoolExecutor(5) as ex:
+            writer = ex.submit(write)
+            readers = [ex.submit(read) for _ in range(4)]
+            writer.result()
+            for r in readers:
+                self.assertTrue(all(total <= n <= total + 200 for n in r.result()[:-1]))
+        self.assertEqual((shared.students.count(), shared.students.get("T199")["marks"]), (total + 200, "199"))
+        # all() is a snapshot taken under the lock: a write made mid-iteration is not seen
+        rows = shared.students.all()
+        first = next(rows)
+        shared.students.insert([{"student_id": "T200", "email_address": "t200@example.edu"}])
+        self.assertEqual(1 + sum(1 for _ in rows), total + 200)
+        self.assertEqual(first["student_id"], next(shared.students.all())["student_id"])
+
+    def test_concurrent_writers_do_not_lose_updates(self):
+        path = self.copy(STUDENTS_CSV)
+        before = read_all(path)
+        ids = [r[0] for r in before[1:]][:40]
+        workers = [multiprocessing.Process(target=update_marks_worker, args=(path, ids[i::4], 60 + i)) for i in range(4)]
+        for w in workers:
+            w.start()
+        # reports keep reading while the sessions write
+        while any(w.is_alive() for w in workers):
+            self.assertEqual(len(list(iter_snapshot(path))), len(before))
+        for w in workers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+
+        after = {r[0]: r for r in read_all(path)[1:]}
+        self.assertEqual(len(after), len(before) - 1)
+        for i in range(4):
+            for sid in ids[i::4]:
+                self.assertEqual(after[sid][6], str(60 + i))
+        self.assertEqual([f for f in os.listdir(self.tmp) if f.endswith(".tmp")], [])
+
+        # a row still being appended is not part of the snapshot
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            f.write("HALF,half@example.edu,Ha")
+        self.assertNotIn("HALF", [r[0] for r in iter_snapshot(path)])
+
+    def test_json_api_server(self):
+        paths = {os.path.basename(src): self.copy(src) for src in (STUDENTS_CSV, PROFESSORS_CSV, COURSES_CSV)}
+        login_path = os.path.join(self.tmp, "login.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            Student(paths["students.csv"]).add_new_student(login_path, User("API1", "api1@example.edu", "Api", "One", "student"), "pw", "C101", "A", 93)
+            Professor(paths["professors.csv"]).add_new_professor(login_path, User("PAPI", "papi@example.edu", "Pat", "Api", "professor"), "pw", "C001")
+        app = GradeServer(paths["students.csv"], paths["professors.csv"], paths["courses.csv"], login_path, admin_token="admintoken")
+        self.addCleanup(app.close)
+
+        async def scenario():
+            started = asyncio.get_running_loop().create_future()
+            task = asyncio.create_task(app.serve("127.0.0.1", 0, started.set_result))
+            port = (await started).sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            call = lambda *a, **k: loadgen.request(reader, writer, *a, **k)
+            out = {}
+            out["bad login"] = (await call("POST", "/login", body={"email": "api1@example.edu", "password": "no"}))[0]
+            status, body = await call("POST", "/login", body={"email": "api1@example.edu", "password": "pw"})
+            student = body["token"]
+            out["login"] = (status, body["role"], body["user_id"])
+            out["grades"] = await call("GET", "/me/grades", student)
+            out["marks"] = (await call("GET", "/me/marks", student))[1]["marks"]
+            out["no token"] = (await call("GET", "/courses"))[0]
+            out["courses"] = len((await call("GET", "/courses", student))[1]["courses"])
+            out["student as admin"] = (await call("DELETE", "/students/API1", student))[0]
+            prof = (await call("POST", "/login", body={"email": "papi@example.edu", "password": "pw"}))[1]["token"]
+            out["prof courses"] = (await call("GET", "/me/courses", prof))[1]["courses"][0]["course_id"]
+            out["get prof"] = (await call("GET", "/professors/PAPI", "admintoken"))[1]["email_address"]
+            out["no prof"] = (await call("GET", "/professors/NOPE", "admintoken"))[0]
+            out["add"] = (await call("POST", "/students", "admintoken", {"student_id": "API2", "email_address": "api2@example.edu", "password": "pw2"}))[0]
+            out["add again"] = (await call("POST", "/students", "admintoken", {"student_id": "API2", "email_address": "api2@example.edu", "password": "pw2"}))[0]
+            out["update"] = (await call("PATCH", "/students/API2", "admintoken", {"grade": "B", "marks": 81}))[0]
+            out["get"] = (await call("GET", "/students/API2", "admintoken"))[1]["marks"]
+            out["delete"] = (await call("DELETE", "/students/API2", "admintoken"))[0]
+            out["delete again"] = (await call("DELETE", "/students/API2", "admintoken"))[0]
+            out["logout"] = (await call("POST", "/logout", student))[0]
+            out["after logout"] = (await call("GET", "/me/grades", student))[0]
+            writer.close()
+            load = await loadgen.run("127.0.0.1", port, "/courses", requests=200, concurrency=8, token=prof)
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST /login HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+            out["bad length"] = int((await reader.readline()).split()[1])
+            writer.close()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            app.sessions[prof] = (app.sessions[prof][0], 0)  # as if the ttl had passed
+            out["expired"] = (await loadgen.request(reader, writer, "GET", "/me/courses", prof))[0]
+            out["expired dropped"] = prof not in app.sessions
+            writer.close()
+            task.cancel()
+            return out, load
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            out, load = asyncio.run(scenario())
+        self.assertEqual(out["bad login"], 401)
+        self.assertEqual(out["login"], (200, "student", "API1"))
+        self.assertEqual(out["grades"], (200, {"student_id": "API1", "first_name": "Api", "last_name": "One", "courses": "C101", "grade": "A"}))
+        self.assertEqual(out["marks"], "93")
+        self.assertEqual((out["no token"], out["student as admin"]), (401, 403))
+        self.assertEqual(out["courses"], len(read_all(paths["courses.csv"])) - 1)
+        self.assertEqual(out["prof courses"], "C001")
+        self.assertEqual((out["get prof"], out["no prof"]), ("papi@example.edu", 404))
+        self.assertEqual((out["add"], out["add again"], out["update"], out["get"]), (201, 409, 200, "81"))
+        self.assertEqual((out["delete"], out["delete again"]), (200, 404))
+        self.assertEqual((out["logout"], out["after logout"]), (200, 401))
+        self.assertEqual((load["requests"], load["errors"]), (200, 0))
+        self.assertEqual((out["bad length"], out["expired"], out["expired dropped"]), (400, 401, True))
+
+    def test_benchmark_suite_and_regression_check(self):
+        report = bench_suite.run([100, 300], repeat=2, ops=["check_my_grades", "check_my_grades (indexed)", "login (warm)", "sort by marks",
+                                                            "display_grade_report (columnar)"], log=lambda *a: None)
+        self.assertEqual(set(report["results"]["check_my_grades"]), {"100", "300"})
+        self.assertEqual(set(report["results"]["display_grade_report (columnar)"]), {"100", "300"})
+        self.assertNotIn(1000000, bench_suite.SIZES)  # the default run stays small
+        r = report["results"]["sort by marks"]["300"]
+        self.assertEqual(r["runs"], 2)
+        self.assertLessEqual(r["min"], r["median"])
+        self.assertLessEqual(r["median"], r["max"])
+        self.assertEqual(bench_suite.regressions(report, report), [])
+        faster = json.loads(json.dumps(report))
+        faster["results"]["check_my_grades"]["300"]["median"] /= 10
+        self.assertEqual([(op, size) for op, size, _, _ in bench_suite.regressions(report, faster)], [("check_my_grades", "300")])
+
+    def test_generated_dataset_is_consistent(self):
+        opts = dict(students=3000, professors=8, courses=12, seed=5, skew=1.5, marks="bimodal")
+        a = gen_dataset.generate(os.path.join(self.tmp, "a"), **opts)
+        b = gen_dataset.generate(os.path.join(self.tmp, "b"), **opts)
+        for name in a:
+            with open(a[name], "rb") as fa, open(b[name], "rb") as fb:
+                self.assertEqual(fa.read(), fb.read(), name)
+
+        courses = {r[0] for r in read_all(a["courses"])[1:]}
+        profs = read_all(a["professors"])[1:]
+        students = read_all(a["students"])[1:]
+        logins = read_all(a["login"])[1:]
+        self.assertEqual((len(courses), len(profs), len(students)), (12, 8, 3000))
+        taught = {p[4] for p in profs}
+        self.assertLessEqual(taught, courses)
+        self.assertLessEqual({s[4] for s in students}, taught)
+        self.assertEqual(sorted(r[0] for r in logins), sorted([p[1] for p in profs] + [s[1] for s in students]))
+        # Zipf skew: the most popular course has far more students than the least popular
+        counts = sorted(sum(1 for s in students if s[4] == c) for c in taught)
+        self.assertGreater(counts[-1], 5 * counts[0])
+        self.assertTrue(all(s[5] == gen_dataset.letter(int(s[6])) for s in students))
+
+        lc = LoginCredential(a["login"])
+        self.assertEqual(lc.login("student2999@example.edu", "pw").role, "student")
+        self.assertEqual(lc.login("prof8@example.edu", "pw").role, "professor")
+        self.assertIsNone(lc.login("prof8@example.edu", "nope"))
+
+    def test_metrics_instrumentation(self):
+        path = self.copy(STUDENTS_CSV)
+        original = Student.update_student_record
+        self.assertTrue(metrics.enable())
+        try:
+            self.assertFalse(metrics.enable())
+            s = Student(path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                s.update_student_record(User("1", "", "", "", "student"), marks=77)
+                s.check_my_grades("1")
+                s.check_my_grades("2")
+                with self.assertRaises(TypeError):
+                    s.check_my_grades()
+            # record classes stay classes: the server's listing interns rows through them
+            self.assertIs(Student.record, StudentRecord)
+            app = GradeServer(path, PROFESSORS_CSV, COURSES_CSV, os.path.join(self.tmp, "login.csv"), admin_token="t", iters=1000)
+            self.addCleanup(app.close)
+            self.assertEqual(len(app._rows(app.students)), len(read_all(path)) - 1)
+            self.assertEqual(len(app._rows(app.profs)), len(read_all(PROFESSORS_CSV)) - 1)
+            data = metrics.snapshot()
+        finally:
+            self.assertTrue(metrics.disable())
+        rows = len(read_all(path))
+        size = os.path.getsize(path)
+        upd = data["Student.update_student_record"]
+        self.assertEqual((upd["calls"], upd["errors"], upd["rows_scanned"]), (1, 0, rows))
+        self.assertEqual((upd["bytes_read"], upd["bytes_written"]), (size, size))
+        self.assertGreaterEqual(upd["file_opens"], 2)
+        grades = data["Student.check_my_grades"]
+        self.assertEqual((grades["calls"], grades["errors"], grades["rows_scanned"]), (3, 1, 2 * rows))
+        self.assertEqual(sum(grades["buckets"].values()), 3)
+
+        text = metrics.to_prometheus()
+        self.assertIn('checkmygrade_calls_total{op="Student.check_my_grades"} 3', text)
+        self.assertIn('checkmygrade_latency_seconds_bucket{op="Student.check_my_grades",le="+Inf"} 3', text)
+        self.assertEqual(json.loads(metrics.to_json())["Student.check_my_grades"]["calls"], 3)
+
+        # disabled: originals back, nothing recorded
+        self.assertIs(Student.update_student_record, original)
+        self.assertNotIn("open", vars(sys.modules[Student.__module__]))
+        Student(path).find_student("1")
+        self.assertNotIn("Student.find_student", metrics.snapshot())
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+
+    def test_sorted_marks_and_email_indexes(self):
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=2000, professors=5, courses=5, seed=9, skew=0.8)
+        students = Student(paths["students"], indexed=True)
+
+        def brute(course=None):
+            rows = [r for r in csv.DictReader(open(paths["students"], newline="", encoding="utf-8"))
+                    if course is None or r["courses"] == course]
+            return sorted(rows, key=lambda r: (-float(r["marks"]), r["student_id"]))
+
+        self.assertEqual(students.top_students(10), brute()[:10])
+        self.assertEqual(students.top_students(5, "C003"), brute("C003")[:5])
+        self.assertEqual(students.students_in_range(60, 70, "C001"), [r for r in brute("C001") if 60 <= float(r["marks"]) <= 70])
+        ranked = brute("C002")
+        rank, total, pct = students.rank_of(ranked[3]["student_id"], "C002")
+        self.assertEqual(total, len(ranked))
+        self.assertEqual(rank, 1 + sum(float(r["marks"]) > float(ranked[3]["marks"]) for r in ranked))
+        self.assertAlmostEqual(pct, 100 * sum(float(r["marks"]) <= float(ranked[3]["marks"]) for r in ranked) / total)
+        emails = sorted(r["email_address"] for r in brute() if r["email_address"].startswith("student19"))
+        self.assertEqual([r["email_address"] for r in students.students_by_email(prefix="student19", limit=3)], emails[:3])
+
+        # incremental maintenance through the writes
+        with contextlib.redirect_stdout(io.StringIO()):
+            students.update_student_record(User(ranked[-1]["student_id"], "", "", "", "student"), marks=100)
+            students.delete_new_student(ranked[0]["student_id"])
+            students.add_new_student(os.path.join(self.tmp, "login.csv"), User("NEW1", "aaa@example.edu", "A", "A", "student"), "pw", "C002", "A", 99.5)
+        self.assertEqual(students.top_students(3, "C002"), brute("C002")[:3])
+        self.assertEqual(students.students_by_email(limit=1)[0]["student_id"], "NEW1")
+        self.assertEqual(students.rank_of(ranked[-1]["student_id"], "C002")[0], 1)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            Student(paths["students"], indexed=True).check_my_grades(ranked[-1]["student_id"])
+            Student(paths["students"]).check_my_grades(ranked[-1]["student_id"])  # no table load, no rank
+        self.assertEqual(out.getvalue().count(f"Class rank in C002: 1 of {len(brute('C002'))}"), 1)
+
+        # the index a plain instance builds for a ranking query follows later writes, another
+        # writer's included
+        plain = Student(paths["students"])
+        plain.top_students(1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            Student(paths["students"]).update_student_record(User(ranked[5]["student_id"], "", "", "", "student"), marks=100)
+            plain.update_student_record(User(ranked[6]["student_id"], "", "", "", "student"), marks=0)
+        self.assertEqual(plain.top_students(3), brute()[:3])
+        self.assertEqual(plain.rank_of(ranked[5]["student_id"])[0], 1)
+
+    def test_paged_listings(self):
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=1234, professors=7, courses=7, seed=4)
+        students = Student(paths["students"])
+        everything = list(csv.DictReader(open(paths["students"], newline="", encoding="utf-8")))
+
+        def all_pages(lister, **kw):
+            rows, cursor, pages = [], 0, 0
+            while cursor is not None:
+                page, cursor = lister(cursor, 100, **kw)
+                rows += page
+                pages += 1
+            return rows, pages
+
+        rows, pages = all_pages(students.list_records)
+        self.assertEqual((rows, pages), (everything, 13))
+        wanted = [r for r in everything if r["courses"] == "C002" and float(r["marks"]) >= 75]
+        rows, _ = all_pages(students.list_records, filters={"courses": "C002", "marks": lambda m: float(m) >= 75})
+        self.assertEqual(rows, wanted)
+
+        # the first page only reads as far as it needs to
+        first, cursor = students.list_records(0, 10)
+        self.assertEqual(first, everything[:10])
+        self.assertLess(cursor, 1000)
+
+        # the same pages from the log-backed index and from a repository
+        logged = Student(paths["students"], log_writes=True)
+        self.assertEqual(all_pages(logged.list_records)[0], everything)
+        storage = CsvStorage(paths["students"], paths["professors"], paths["courses"], paths["login"])
+        self.assertEqual(all_pages(Student(paths["students"], storage=storage).list_records)[0], everything)
+        self.assertEqual(len(all_pages(Professor(paths["professors"]).list_professors)[0]), 7)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertIsNone(Course(paths["courses"]).display_page(0, 20, {"course_id": "C003"}))
+        self.assertIn("C003", out.getvalue())
+        self.assertIn("(1 rows, end of list)", out.getvalue())
+
+    def test_relationship_index(self):
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=500, professors=12, courses=6, seed=8)
+        profs = Professor(paths["professors"])
+        rel = profs.relations(paths["courses"], paths["students"])
+        students = list(csv.DictReader(open(paths["students"], newline="", encoding="utf-8")))
+        prof_rows = list(csv.DictReader(open(paths["professors"], newline="", encoding="utf-8")))
+
+        self.assertEqual(rel.roster("C002"), [r for r in students if r["courses"] == "C002"])
+        self.assertEqual(rel.teachers_of("C002"), [p for p in prof_rows if p["course_id"] == "C002"])
+        self.assertEqual(len(rel.teachers_of("C002")), 2)
+        self.assertEqual(rel.students_of("P3"), [r for r in students if r["courses"] == "C003"])
+        self.assertEqual(rel.roster("C999"), [])
+        self.assertIs(profs.relations(paths["courses"], paths["students"]), rel)
+
+        # a students.csv write refreshes the rosters only
+        teaching = rel.professors
+        sid = rel.roster("C002")[0]["student_id"]
+        Student(paths["students"]).update_student_record(User(sid, "", "", "", "student"), courses="C005")
+        self.assertNotIn(sid, [r["student_id"] for r in rel.roster("C002")])
+        self.assertIn(sid, [r["student_id"] for r in rel.roster("C005")])
+        self.assertIs(rel.professors, teaching)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertTrue(profs.show_course_details_by_professor(paths["professors"], paths["courses"], "P4"))
+            self.assertTrue(profs.show_course_roster(paths["students"], paths["courses"], "C005"))
+            self.assertFalse(profs.show_course_teachers(paths["courses"], "C999"))
+        self.assertIn('"course_id": "C004"', out.getvalue())
+        self.assertIn(f"  {sid} ", out.getvalue())
+
+        # same answers through sqlite, refreshed after a write
+        db = os.path.join(self.tmp, "grades.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate(db, paths["students"], paths["professors"], paths["courses"], paths["login"])
+        storage = SqliteStorage(db)
+        self.addCleanup(storage.close)
+        sql_rel = Professor(paths["professors"], storage=storage).relations(paths["courses"], paths["students"])
+        self.assertEqual([r["student_id"] for r in sql_rel.roster("C005")], [r["student_id"] for r in rel.roster("C005")])
+        storage.students.update(sid, {"courses": "C001"})
+        self.assertIn(sid, [r["student_id"] for r in sql_rel.roster("C001")])
+
+    def test_referential_integrity(self):
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=300, professors=8, courses=4, seed=5)
+        # two students take two courses each
+        with open(paths["students"], "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows([[901, "two1@example.edu", "Two", "One", "C001;C002", "A", 91],
+                                     [902, "two2@example.edu", "Two", "Two", "C002;C003", "B", 85]])
+        paths_order = [paths[t] for t in ("students", "professors", "courses", "login")]
+        integrity = Integrity(CsvStorage(*paths_order))
+        students = Student(paths["students"], integrity=integrity)
+        profs = Professor(paths["professors"], integrity=integrity)
+        courses = Course(paths["courses"], integrity=integrity)
+        read = lambda key: list(csv.DictReader(open(paths[key], newline="", encoding="utf-8")))
+
+        # rewrites per file, counted at the storage layer
+        rewrites = []
+        def counting(path):
+            rewrites.append(os.path.basename(path))
+            return atomic_write(path)
+        patch = mock.patch("storage.atomic_write", counting)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(students.add_new_student(paths["login"], User("999", "x@example.edu", "X", "Y", "student"), "pw", "C404"))
+            self.assertFalse(profs.add_new_professor(paths["login"], User("P99", "p@example.edu", "P", "Q", "professor"), "pw", "C404"))
+            self.assertEqual(students.add_students_bulk(paths["login"], [
+                {"student_id": "998", "email_address": "ok@example.edu", "courses": "C004"},
+                {"student_id": "997", "email_address": "bad@example.edu", "courses": "C004;C404"}], "pw"), (1, 1))
+            self.assertIn("Unknown course id(s): C404", out.getvalue())
+
+            # restrict: a referenced course stays
+            self.assertFalse(courses.delete_new_course("C002"))
+            self.assertIn("C002", [r["course_id"] for r in read("courses")])
+            self.assertEqual(rewrites, [])
+
+            # deleting a student takes the login row with it; an unknown id deletes nothing
+            self.assertTrue(students.delete_new_student("1"))
+            self.assertFalse(students.delete_new_student("no-such-id"))
+            self.assertIn("No student found with ID no-such-id", out.getvalue())
+        self.assertNotIn("1", [r["student_id"] for r in read("students")])
+        self.assertNotIn("student1@example.edu", [r["Email"] for r in read("login")])
+        rewrites.clear()
+
+        before = read("students")
+        enrolled = {r["student_id"] for r in before if "C002" in r["courses"].split(";")}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(courses.delete_new_course("C002", "cascade"))
+        # one pass over each affected table
+        self.assertEqual(sorted(rewrites), ["courses.csv", "login.csv", "professors.csv", "students.csv"])
+        after = {r["student_id"]: r for r in read("students")}
+        self.assertEqual(set(after), {r["student_id"] for r in before} - (enrolled - {"901", "902"}))
+        self.assertEqual((after["901"]["courses"], after["902"]["courses"]), ("C001", "C003"))
+        self.assertEqual([p for p in read("professors") if p["course_id"] == "C002"], [])
+        logins = {r["Email"] for r in read("login")}
+        self.assertFalse(logins & {r["email_address"] for r in before if r["student_id"] in enrolled - {"901", "902"}})
+        self.assertIn("ok@example.edu", logins)
+
+        # set_null keeps the rows and clears the reference; key sets notice the deleted course
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(courses.delete_new_course("C003", "set_null"))
+            self.assertFalse(students.update_student_record(User("901", "", "", "", "student"), courses="C003"))
+        after = {r["student_id"]: r for r in read("students")}
+        self.assertEqual(after["902"]["courses"], "")
+        self.assertEqual(len(after), len(read("students")))
+        self.assertTrue(all(p["course_id"] != "C003" for p in read("professors")))
+
+        # the same cascade through sqlite
+        db = os.path.join(self.tmp, "grades.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate(db, *paths_order)
+        storage = SqliteStorage(db)
+        self.addCleanup(storage.close)
+        sql = Integrity(storage, course_policy="cascade")
+        n = storage.students.count()
+        c001 = len(storage.students.find_many("courses", ["C001"]))
+        # the cascade is one transaction: a failure in its last step leaves every table as it was
+        logins = storage.login.count()
+        def fail(keys, column=None):
+            raise sqlite3.OperationalError("disk I/O error")
+        storage.courses.delete = fail
+        self.assertRaises(sqlite3.OperationalError, sql.delete_courses, ["C001"])
+        del storage.courses.delete
+        self.assertEqual((storage.students.count(), storage.login.count()), (n, logins))
+        self.assertEqual(len(storage.students.find_many("courses", ["C001"])), c001)
+        counts = sql.delete_courses(["C001"])
+        self.assertEqual((counts["students"], counts["courses"]), (c001, 1))
+        self.assertEqual(storage.students.count(), n - c001)
+        self.assertEqual(sql.missing_courses("C001;C004"), ["C001"])
+        self.assertEqual(sql.delete_students(["998"]), (1, 1))
+
+    def test_enrolment_store(self):
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=50, professors=5, courses=5, seed=3)
+        store_path = os.path.join(self.tmp, "enrolments.csv")
+        store = EnrolmentStore(store_path)
+        self.assertEqual(store.import_students(paths["students"]), 50)
+        self.assertEqual(len(store.course_ids), 5)
+        integrity = Integrity(CsvStorage(*[paths[t] for t in ("students", "professors", "courses", "login")]), enrolments=store)
+        students = Student(paths["students"], integrity=integrity, enrolments=store)
+        first = store.courses_of("7")[0]
+        c1, c2 = [c for c in ("C002", "C003", "C004") if c != first[0]][:2]
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(students.enrol_in_course("7", c1, "B", 84))
+            self.assertFalse(students.enrol_in_course("7", "C404"))
+            self.assertFalse(students.enrol_in_course("404", c1))
+            # an update with a course adds / changes that enrolment only
+            students.update_student_record(User("7", "", "", "", "student"), courses=c2, grade="A", marks=97)
+            students.update_student_record(User("7", "", "", "", "student"), marks=98)
+        self.assertEqual(store.courses_of("7"), [first, (c1, "B", "84"), (c2, "A", "98")])
+        self.assertEqual(("7", "A", "98"), store.roster(c2)[-1])
+        row = students.find_student("7")
+        self.assertEqual((row["courses"], row["marks"]), (c2, "98"))
+
+        # every course from one probe, in the views and in a login session
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            students.check_my_grades("7")
+            students.check_my_marks("7")
+        lines = out.getvalue().splitlines()
+        self.assertIn(f"Grade for FN7 LN7 ({c1}): B", lines)
+        self.assertIn(f"Marks for FN7 LN7 ({c2}): 98", lines)
+        self.assertEqual(sum(l.startswith("Grade for") for l in lines), 3)
+        session = LoginCredential(paths["login"]).login("student7@example.edu", "pw", students=students)
+        self.assertEqual([r["courses"] for r in session.records], [first[0], c1, c2])
+
+        # a writer without the store changes the row: the row's own course shows its values,
+        # and an update of an unknown id leaves no orphan enrolment behind
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            Student(paths["students"]).update_student_record(User("7", "", "", "", "student"), grade="F", marks=10)
+            students.check_my_grades("7")
+            students.update_student_record(User("404", "", "", "", "student"), courses=c1, grade="A", marks=90)
+        self.assertIn(f"Grade for FN7 LN7 ({c2}): F", out.getvalue().splitlines())
+        self.assertIn(f"Grade for FN7 LN7 ({c1}): B", out.getvalue().splitlines())
+        self.assertEqual(store.courses_of("404"), [])
+
+        # a fresh store reads the same pairs back; the marks update was appended, not rewritten,
+        # and its row supersedes the earlier one for that pair
+        again = EnrolmentStore(store_path)
+        self.assertEqual(again.courses_of("7"), store.courses_of("7"))
+        self.assertEqual((sum(1 for _ in open(store_path)) - 1, len(again)), (53, 52))
+
+        # deletes take the enrolments with them
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(Course(paths["courses"], integrity=integrity).delete_new_course(c1))
+            students.delete_new_student("7")
+        self.assertIn("enrolments", out.getvalue())
+        self.assertEqual(store.courses_of("7"), [])
+        self.assertNotIn("7", [sid for sid, _, _ in store.roster(c1)])
+        self.assertEqual(len(store), 49)
+
+        # a course and a student in one batch: every posting list is left consistent
+        cid = store.course_ids[0]
+        members = [sid for sid, _, _ in store.roster(cid)]
+        extra = [s for s in store.by_student if s not in members][0]
+        expected = len(members) + len(store.courses_of(extra))
+        self.assertEqual(store.remove(student_ids=[extra], course_ids=[cid]), expected)
+        self.assertEqual((store.roster(cid), store.courses_of(extra)), ([], []))
+        self.assertTrue(all(c != cid for sid in members for c, _, _ in store.courses_of(sid)))
+        self.assertEqual(len(EnrolmentStore(store_path)), 49 - expected)
+
+    def test_enrolments_reach_rosters_ranking_and_reports(self):
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=50, professors=5, courses=5, seed=3)
+        store = EnrolmentStore(os.path.join(self.tmp, "enrolments.csv"))
+        store.import_students(paths["students"])
+        students = Student(paths["students"], indexed=True, enrolments=store)
+        profs = Professor(paths["professors"], enrolments=store)
+        home = students.find_student("7")["courses"]
+        other = next(c for c in store.course_ids if c != home)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(students.enrol_in_course("7", other, "A", 100))
+
+        # the roster shows the enrolment with that course's grade and marks
+        roster = {r["student_id"]: r for r in profs.relations(paths["courses"], paths["students"]).roster(other)}
+        self.assertEqual((roster["7"]["grade"], roster["7"]["marks"]), ("A", "100"))
+        self.assertEqual(set(roster), {sid for sid, _, _ in store.roster(other)})
+
+        # ranking in that course counts it, the student's own course keeps the row's marks
+        perfect = students.students_in_range(100, 100, other)
+        self.assertIn(("7", other, "100"), [(r["student_id"], r["courses"], r["marks"]) for r in perfect])
+        self.assertIn("7", [r["student_id"] for r in students.top_students(len(perfect), other)])
+        self.assertLessEqual(students.rank_of("7", other)[0], len(perfect))
+        self.assertIsNotNone(students.rank_of("7", home))
+
+        # grade table, streamed rows and the per-course distribution rows all see it
+        gs = GradeScale()
+        self.assertEqual(gs.sync_students(paths["students"], store), len(store))
+        self.assertEqual(gs.records[("7", other)]["grade"], 100.0)
+        self.assertEqual(gs.sync_students(paths["students"], store), 0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            students.update_student_record(User("7", "", "", "", "student"), courses=other, marks=55)
+        self.assertEqual(gs.sync_students(paths["students"], store), 1)
+        self.assertEqual(gs.records[("7", other)]["grade"], 55.0)
+        self.assertIn(("7", other, 55.0), list(iter_grade_rows(paths["students"], store)))
+
+    def test_compact_records(self):
+        rec = StudentRecord("7", "seven@example.edu", "Sev", "En", "C101", "A", "91")
+        self.assertEqual(list(rec), ["7", "seven@example.edu", "Sev", "En", "C101", "A", "91"])
+        self.assertEqual((rec[1], rec["marks"], rec.first_name, rec.get("nope", "-")), ("seven@example.edu", "91", "Sev", "-"))
+        self.assertEqual(rec.as_dict()["email_address"], "seven@example.edu")
+        other = StudentRecord.from_row(["8", "eight@example.edu", "Ei", "Ght", "C" + "101", "A", "9" + "1"])
+        self.assertIs(other.courses, rec.courses)
+        self.assertIs(other.marks, rec.marks)
+        self.assertFalse(hasattr(rec, "__dict__"))
+        self.assertFalse(hasattr(User("1", "a@b", "A", "B", "student"), "__dict__"))
+        # unique values are kept as given, a short row stays an (interned) list
+        self.assertEqual(StudentRecord.pack_row(["9", "x\x1fy", "A", "B", "C101", "A", "91"])[1], "x\x1fy")
+        self.assertEqual(StudentRecord.pack_row(["9", "x@y", "A"]), ["9", "x@y", "A"])
+
+        paths = gen_dataset.generate(os.path.join(self.tmp, "data"), students=20000, seed=2, hash_mode="pool")
+        index = StudentIndex.load(paths["students"])
+        self.assertIsInstance(index.get("5"), StudentRecord)
+        self.assertEqual(index.as_dict(index.get("5")), next(r for r in csv.DictReader(open(paths["students"], newline="")) if r["student_id"] == "5"))
+        lc = LoginCredential(paths["login"])
+        self.assertEqual(lc.get_credential("student5@example.edu")["Role"], "student")
+        self.assertIsInstance(lc._by_email["student5@example.edu"], CredentialRecord)
+
+        # the records alone take at least 1.7x less memory than DictReader rows; the index that
+        # holds them (plus the id/email maps, and later the sorted indexes) is what Student keeps
+        dicts = bench_memory.measure(bench_memory.load_dicts, paths["students"])
+        records = bench_memory.measure(bench_memory.loader(StudentRecord), paths["students"])
+        self.assertEqual(dicts["rows"], records["rows"])
+        self.assertGreaterEqual(dicts["bytes"] / records["bytes"], 1.7)
+        self.assertGreaterEqual(dicts["bytes"] / bench_memory.measure(bench_memory.index_records, paths["students"])["bytes"], 1.6)
+        self.assertGreaterEqual(dicts["bytes"] / bench_memory.measure(bench_memory.index_sorted, paths["students"])["bytes"], 1.4)
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -1,7 +1,11 @@
+import sys
+
 class User:
+    __slots__ = ("user_id", "email_address", "first_name", "last_name", "role")
+
     def __init__(self, user_id, email_address, first_name, last_name, role):
         self.user_id = str(user_id)
         self.email_address = email_address
         self.first_name = first_name
         self.last_name = last_name
-        self.role = role 
\ No newline at end of file
+        self.role = sys.intern(role) if type(role) is str else role
\ No newline at end of file